@@ -19,6 +19,8 @@ namespace Bridge.ModelOPS_Connection
         private readonly NotificationService notificationService;
 
         private readonly string baseUrl = "http://127.0.0.1:8000";
+        private readonly TimeSpan jobPollingInterval = TimeSpan.FromSeconds(2);
+        private readonly TimeSpan jobTimeout = TimeSpan.FromHours(2);
         private static ConcurrentDictionary<string, ConfigurationSessionModel> sessions = new ConcurrentDictionary<string, ConfigurationSessionModel>();
 
         public ModelOPSController(HttpClient httpClient, MinioService minioService, NotificationService notificationService)
@@ -100,7 +102,7 @@ namespace Bridge.ModelOPS_Connection
         }
 
         [HttpPost("CleanFiles/{sessionId}")]
-        public async Task<IActionResult> CleanFiles([FromBody] FileCleaningRequestModel request, string sessionId)
+        public async Task<IActionResult> CleanFiles([FromBody] FileCleaningRequestModel request, string sessionId, CancellationToken cancellationToken)
         {
             if (!sessions.TryGetValue(sessionId, out var session))
             {
@@ -127,10 +129,10 @@ namespace Bridge.ModelOPS_Connection
                 var json = JsonSerializer.Serialize(cleaningRequest);
                 var content = new StringContent(json, Encoding.UTF8, "application/json");
 
-                var response = await httpClient.PostAsync(url, content);
-                if (response.IsSuccessStatusCode)
+                var response = await httpClient.PostAsync(url, content, cancellationToken);
+                var responseContent = response.IsSuccessStatusCode ? await WaitForJobResultAsync(response, cancellationToken) : null;
+                if (responseContent != null)
                 {
-                    var responseContent = await response.Content.ReadAsStringAsync();
                     FileCleaningResponseModel? result = JsonSerializer.Deserialize<FileCleaningResponseModel>(responseContent);
 
                     if (result == null)
@@ -151,6 +153,11 @@ namespace Bridge.ModelOPS_Connection
                     return BadRequest("Failed to clean files: " + response.StatusCode);
                 }
             }
+            catch (OperationCanceledException) when (cancellationToken.IsCancellationRequested)
+            {
+                session.State = "Canceled";
+                return StatusCode(StatusCodes.Status499ClientClosedRequest, "Request canceled.");
+            }
             catch (Exception ex)
             {
                 session.State = "Error";
@@ -160,7 +167,7 @@ namespace Bridge.ModelOPS_Connection
         }
 
         [HttpPost("TrainModel/{sessionId}")]
-        public async Task<IActionResult> TrainModel([FromBody] TrainModelRequestModel request, string sessionId)
+        public async Task<IActionResult> TrainModel([FromBody] TrainModelRequestModel request, string sessionId, CancellationToken cancellationToken)
         {
             if (!sessions.TryGetValue(sessionId, out var session))
             {
@@ -184,11 +191,10 @@ namespace Bridge.ModelOPS_Connection
                 var json = JsonSerializer.Serialize(request);
                 var content = new StringContent(json, Encoding.UTF8, "application/json");
 
-                var response = await httpClient.PostAsync(url, content);
-                if (response.IsSuccessStatusCode)
+                var response = await httpClient.PostAsync(url, content, cancellationToken);
+                var responseContent = response.IsSuccessStatusCode ? await WaitForJobResultAsync(response, cancellationToken) : null;
+                if (responseContent != null)
                 {
-                    var responseContent = await response.Content.ReadAsStringAsync();
-
                     session.State = "TrainingCompleted";
                     await SendSuccessNotification(session.UserId, responseContent);
 
@@ -201,6 +207,11 @@ namespace Bridge.ModelOPS_Connection
                     return BadRequest("Failed to train model: " + response.StatusCode);
                 }
             }
+            catch (OperationCanceledException) when (cancellationToken.IsCancellationRequested)
+            {
+                session.State = "Canceled";
+                return StatusCode(StatusCodes.Status499ClientClosedRequest, "Request canceled.");
+            }
             catch (Exception ex)
             {
                 session.State = "Error";
@@ -305,6 +316,45 @@ namespace Bridge.ModelOPS_Connection
             }
         }
 
+        private async Task<string?> WaitForJobResultAsync(HttpResponseMessage queuedResponse, CancellationToken cancellationToken)
+        {
+            using var queuedJob = JsonDocument.Parse(await queuedResponse.Content.ReadAsStringAsync(cancellationToken));
+            var jobId = queuedJob.RootElement.GetProperty("job_id").GetString();
+            var deadline = DateTime.UtcNow + jobTimeout;
+
+            while (true)
+            {
+                if (DateTime.UtcNow >= deadline)
+                {
+                    Console.WriteLine($"Job {jobId} did not finish within {jobTimeout}.");
+                    return null;
+                }
+
+                await Task.Delay(jobPollingInterval, cancellationToken);
+
+                var statusResponse = await httpClient.GetAsync($"{baseUrl}/jobs/{jobId}", cancellationToken);
+                if (!statusResponse.IsSuccessStatusCode)
+                {
+                    return null;
+                }
+
+                using var job = JsonDocument.Parse(await statusResponse.Content.ReadAsStringAsync(cancellationToken));
+                var status = job.RootElement.GetProperty("status").GetString();
+
+                if (status == "failed")
+                {
+                    Console.WriteLine($"Job {jobId} failed: {job.RootElement.GetProperty("error").GetString()}");
+                    return null;
+                }
+
+                if (status == "completed")
+                {
+                    var resultResponse = await httpClient.GetAsync($"{baseUrl}/jobs/{jobId}/result", cancellationToken);
+                    return resultResponse.IsSuccessStatusCode ? await resultResponse.Content.ReadAsStringAsync(cancellationToken) : null;
+                }
+            }
+        }
+
         private string GetUserIdFromToken()
         {
             var principal = HttpContext.User;
@@ -0,0 +1,2 @@
+# The scripts under packages/model_testing generate data and train models when imported, so they are not collected
+collect_ignore = ['packages/model_testing']
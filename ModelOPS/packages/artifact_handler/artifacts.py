@@ -0,0 +1,95 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+ARTIFACT_DIRECTORY = 'artifacts'
+MANIFEST_FILE_NAME = 'manifest.json'
+PLOT_DATA_FILE = 'plot_data.parquet'
+GROUP_STATISTICS_FILE = 'group_statistics.parquet'
+STATISTICS_DATA_FILE = 'statistics_data.parquet'
+SHAP_VALUES_FILE = 'shap_values.npy'
+MEAN_ABS_SHAP_VALUES_FILE = 'mean_abs_shap_values.npy'
+SHAP_DATA_FILE = 'shap_data.parquet'
+
+
+def artifact_directory(output_dir: str) -> str:
+    directory = os.path.join(output_dir, ARTIFACT_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def save_frame(output_dir: str, file_name: str, data: pd.DataFrame) -> None:
+    data.reset_index(drop=True).to_parquet(os.path.join(artifact_directory(output_dir), file_name), index=False)
+
+
+def save_array(output_dir: str, file_name: str, array: np.ndarray) -> None:
+    np.save(os.path.join(artifact_directory(output_dir), file_name), array)
+
+
+def save_group_statistics(output_dir: str, data: pd.DataFrame, target_column: str, features: List[str]) -> None:
+    """
+    Save the count, mean, standard deviation and quartiles of every numerical feature per target category.
+
+    :param output_dir: Directory where the training outputs are saved.
+    :param data: The dataset containing the features and the target column.
+    :param target_column: The name of the target variable column in the dataset.
+    :param features: The features to describe.
+    """
+    numeric_features = [feature for feature in features if pd.api.types.is_numeric_dtype(data[feature])]
+    if not numeric_features:
+        return
+
+    statistics = data.groupby(target_column)[numeric_features].describe().stack(level=0)
+    statistics.index.names = [target_column, 'Feature']
+    statistics = statistics.reset_index()
+    statistics[target_column] = statistics[target_column].astype(str)
+    save_frame(output_dir, GROUP_STATISTICS_FILE, statistics)
+
+
+def register(output_dir: str, artifact_name: str, renderer: str, **arguments) -> None:
+    """
+    Record in the manifest that an artifact can be rendered on demand from the saved data.
+
+    :param output_dir: Directory where the training outputs are saved.
+    :param artifact_name: Path of the rendered file relative to the output directory, e.g. 'graphics/plot_Age.png'.
+    :param renderer: Name of the renderer drawing the artifact.
+    :param arguments: JSON serializable arguments passed to the renderer.
+    """
+    manifest = read_manifest(artifact_directory(output_dir)) or {}
+    manifest[artifact_name] = {'renderer': renderer, 'arguments': arguments}
+    with open(os.path.join(artifact_directory(output_dir), MANIFEST_FILE_NAME), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    """
+    Read the artifact manifest of an artifact directory.
+
+    :param directory: The artifact directory, holding the manifest and the saved data.
+    :return: The manifest mapping artifact names to their renderer, or None if the directory has no manifest.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def is_served(artifact_name: str, manifest: Optional[dict]) -> bool:
+    """
+    Whether an object of a label may be served as an artifact: either an artifact registered in the manifest, or a
+    figure rendered by the training run. The saved data of the artifact directory and the other training outputs are
+    never served.
+
+    :param artifact_name: Name of the object relative to the label, e.g. 'graphics/plot_Age.png'.
+    :param manifest: The artifact manifest of the label, or None if it has none.
+    :return: True if the object may be served.
+    """
+    if manifest and artifact_name in manifest:
+        return True
+    segments = artifact_name.split('/')
+    return (artifact_name.lower().endswith('.png') and segments[0] != ARTIFACT_DIRECTORY
+            and not any(segment in ('', '.', '..') for segment in segments))
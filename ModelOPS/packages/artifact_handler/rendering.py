@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Optional
+from packages.processing import plotting
+from packages.artifact_handler import artifacts
+from packages.statistical_analysis import statistical_analysis
+
+
+def _box_plot(directory: str, path: str, target_column: str, feature: str) -> str:
+    data = pd.read_parquet(os.path.join(directory, artifacts.PLOT_DATA_FILE), columns=[target_column, feature])
+    return plotting.box_plot(data, target_column, feature, os.path.dirname(path))
+
+
+def _violin_plot(directory: str, path: str, target_column: str, feature: str) -> str:
+    data = pd.read_parquet(os.path.join(directory, artifacts.PLOT_DATA_FILE), columns=[target_column, feature])
+    return plotting.violin_plot(data, target_column, feature, os.path.dirname(path))
+
+
+def _shap_importance(directory: str, path: str, features: list, title: str) -> str:
+    mean_abs_shap_values = np.load(os.path.join(directory, artifacts.MEAN_ABS_SHAP_VALUES_FILE))
+    return plotting.shap_importance_bar_plot(features, mean_abs_shap_values, title, path)
+
+
+def _shap_summary(directory: str, path: str, features: list, plot_type: Optional[str]) -> str:
+    shap_values = np.load(os.path.join(directory, artifacts.SHAP_VALUES_FILE))
+    data = pd.read_parquet(os.path.join(directory, artifacts.SHAP_DATA_FILE))
+    return plotting.shap_summary_plot(shap_values, data, features, plot_type, path)
+
+
+def _shap_force(directory: str, path: str, expected_value: float) -> str:
+    shap_values = np.load(os.path.join(directory, artifacts.SHAP_VALUES_FILE), mmap_mode='r')
+    data = pd.read_parquet(os.path.join(directory, artifacts.SHAP_DATA_FILE))
+    return plotting.shap_force_plot(expected_value, np.asarray(shap_values[0, :]), data.iloc[0, :], path)
+
+
+def _statistics_data(directory: str) -> pd.DataFrame:
+    return pd.read_parquet(os.path.join(directory, artifacts.STATISTICS_DATA_FILE))
+
+
+def _health_counts(directory: str, path: str) -> str:
+    return statistical_analysis.plot_health_counts(_statistics_data(directory), path)
+
+
+def _distribution_by_gender(directory: str, path: str, gender_col: str) -> str:
+    return statistical_analysis.plot_distribution_by_gender(_statistics_data(directory), gender_col, path)
+
+
+def _age_distribution(directory: str, path: str, target_column: str, age_col: str) -> str:
+    return statistical_analysis.plot_age_distribution(_statistics_data(directory), target_column, age_col, path)
+
+
+RENDERERS = {
+    'box_plot': _box_plot,
+    'violin_plot': _violin_plot,
+    'shap_importance': _shap_importance,
+    'shap_summary': _shap_summary,
+    'shap_force': _shap_force,
+    'health_counts': _health_counts,
+    'distribution_by_gender': _distribution_by_gender,
+    'age_distribution': _age_distribution
+}
+
+
+def render_artifact(directory: str, output_dir: str, artifact_name: str) -> Optional[str]:
+    """
+    Render a single artifact registered in the manifest of an artifact directory.
+
+    :param directory: The artifact directory, holding the manifest and the saved data.
+    :param output_dir: Directory under which the artifact is written, at its name relative to this directory.
+    :param artifact_name: Name of the artifact in the manifest, e.g. 'graphics/plot_Age.png'.
+    :return: The path of the rendered file, or None if the artifact is not in the manifest.
+    """
+    manifest = artifacts.read_manifest(directory)
+    if not manifest or artifact_name not in manifest:
+        return None
+
+    entry = manifest[artifact_name]
+    path = os.path.join(output_dir, *artifact_name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return RENDERERS[entry['renderer']](directory, path, **entry['arguments'])
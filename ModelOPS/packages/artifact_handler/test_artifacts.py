@@ -0,0 +1,12 @@
+from packages.artifact_handler import artifacts
+
+
+def test_only_registered_artifacts_and_rendered_figures_are_served():
+    manifest = {'shap/force_plot_instance.png': {'renderer': 'shap_force', 'arguments': {}}}
+
+    assert artifacts.is_served('shap/force_plot_instance.png', manifest)
+    assert artifacts.is_served('graphics/plot_Age.png', None)
+    assert not artifacts.is_served('feature_importances.txt', manifest)
+    assert not artifacts.is_served('artifacts/plot_data.parquet', manifest)
+    assert not artifacts.is_served('artifacts/preview.png', manifest)
+    assert not artifacts.is_served('../other_label/graphics/plot_Age.png', manifest)
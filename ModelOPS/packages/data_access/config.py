@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+LOADER_CONFIG = {
+    'remote_engine': 'pandas'
+}
+
+REGISTRY_CONFIG = {
+    'enabled': True,
+    'max_bytes': 2 * 1024 * 1024 * 1024,
+    # Whether files read in chunks with all of their columns are registered. This holds up to max_bytes of chunks while
+    # the file is read, which gives up the bounded memory of the chunked path, so it is off unless memory is plentiful
+    'register_chunked_reads': False
+}
+
+SCHEMA_CONFIG = {
+    'enabled': True,
+    'directory': os.path.join(tempfile.gettempdir(), 'modelops_schema_cache'),
+    'sample_rows': 10000,
+    'category_max_unique_ratio': 0.5,
+    'category_max_unique': 1000
+}
+
+DEDUPLICATION_CONFIG = {
+    # Whether merge_files drops rows repeated across the files of a directory. Off by default, since it runs before
+    # cleaning and the dropped rows would no longer count towards the outlier z-scores
+    'across_files': False,
+    'verify': False,
+    'chunk_size': 100000
+}
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from packages.data_access.config import DEDUPLICATION_CONFIG
+
+
+class RowDeduplicator:
+    """
+    Streaming deduplication of rows, or of the values of key columns, across any number of chunks and files. Every row
+    is reduced to a 64-bit hash and only the sorted array of the hashes seen so far is kept, 8 bytes per distinct row,
+    so a chunk is checked against everything before it without holding the earlier rows in memory.
+
+    Two different rows share a hash with a probability of about n^2 / 2^65 for n distinct rows. When that is not
+    acceptable, verify keeps the values of the first row of every hash as well, and a row is only dropped when its
+    values equal those of a row seen before. This holds the distinct values in memory, so it is best suited to key
+    columns such as a patient identifier.
+    """
+
+    def __init__(self, key_columns: Optional[List[str]] = None, verify: Optional[bool] = None):
+        """
+        :param key_columns: Columns whose values identify a row. If None, whole rows are compared.
+        :param verify: Whether hash collisions are checked against the values of the rows. Defaults to
+                       DEDUPLICATION_CONFIG.
+        """
+        self.key_columns = key_columns
+        self.verify = DEDUPLICATION_CONFIG['verify'] if verify is None else verify
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.values: Dict[int, list] = {}
+        self.duplicate_count = 0
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def first_occurrences(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        Mask of the rows that were not seen in this chunk or in any chunk passed before. The kept rows are recorded as
+        seen.
+
+        :param data: A chunk of rows. Without key columns, chunks with different columns never share a row.
+        :return: A boolean mask with one entry per row.
+        """
+        row_hashes = hash_rows(data, self.key_columns)
+        _, first_positions = np.unique(row_hashes, return_index=True)
+        keep = np.zeros(len(row_hashes), dtype=bool)
+        keep[first_positions] = True
+        keep &= ~self._contains(row_hashes)
+
+        if self.verify:
+            keep = self._verify(data, row_hashes, keep)
+
+        self._add(row_hashes[keep])
+        self.duplicate_count += int(len(keep) - keep.sum())
+        return keep
+
+    def drop_duplicates(self, data: pd.DataFrame) -> pd.DataFrame:
+        return data[self.first_occurrences(data)]
+
+    def _contains(self, row_hashes: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.hashes, row_hashes)
+        found = np.zeros(len(row_hashes), dtype=bool)
+        in_range = positions < len(self.hashes)
+        found[in_range] = self.hashes[positions[in_range]] == row_hashes[in_range]
+        return found
+
+    def _add(self, row_hashes: np.ndarray) -> None:
+        # Insert the new hashes at their sorted positions, which copies the seen hashes once instead of sorting them
+        new_hashes = np.unique(row_hashes)
+        new_hashes = new_hashes[~self._contains(new_hashes)]
+        self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, new_hashes), new_hashes)
+
+    def _verify(self, data: pd.DataFrame, row_hashes: np.ndarray, keep: np.ndarray) -> np.ndarray:
+        """
+        Compare the rows dropped for a matching hash with the rows recorded under that hash, in order, and keep those
+        that differ.
+        """
+        rows = _row_values(data if self.key_columns is None else data.reindex(columns=self.key_columns))
+        for position in np.flatnonzero(keep):
+            self.values[int(row_hashes[position])] = [rows[position]]
+        for position in np.flatnonzero(~keep):
+            seen_rows = self.values.setdefault(int(row_hashes[position]), [])
+            if rows[position] not in seen_rows:
+                seen_rows.append(rows[position])
+                keep[position] = True
+        return keep
+
+
+def hash_rows(data: pd.DataFrame, columns: Optional[List[str]] = None) -> np.ndarray:
+    """
+    64-bit hash of every row of a DataFrame, over the given columns or all of them.
+    Integers are hashed by their int64 value, whether a file was loaded with an integer, compact or float dtype, so
+    identifiers above 2^53 stay distinct while 1 and 1.0 still match. The column names are mixed in so that chunks with
+    different columns never match.
+    """
+    hashable = data if columns is None else data.reindex(columns=columns)
+    column_names = np.array(['\x1f'.join(map(str, hashable.columns))], dtype=object)
+    row_hashes = np.full(len(hashable), pd.util.hash_array(column_names)[0], dtype=np.uint64)
+    for column in hashable.columns:
+        row_hashes = (row_hashes ^ _hash_column(hashable[column])) * np.uint64(1000003)
+    return row_hashes
+
+
+def _hash_column(values: pd.Series) -> np.ndarray:
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+    floats = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    hashes = pd.util.hash_array(floats)
+    if pd.api.types.is_integer_dtype(values):
+        integral = values.notna().to_numpy()
+        integers = values[integral].to_numpy(dtype=np.int64)
+    else:
+        integral = np.isfinite(floats) & (floats == np.round(floats)) & (np.abs(floats) < 2.0 ** 63)
+        integers = floats[integral].astype(np.int64)
+    hashes[integral] = pd.util.hash_array(integers)
+    return hashes
+
+
+def _row_values(data: pd.DataFrame) -> List[tuple]:
+    # Missing values are replaced by None, since NaN is not equal to itself
+    values = data.astype(object).where(data.notna(), None)
+    return list(values.itertuples(index=False, name=None))
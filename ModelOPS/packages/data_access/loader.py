@@ -0,0 +1,412 @@
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from typing import Iterator, List, Optional, Tuple
+from packages.minio_file_handler import client
+from packages.data_access import registry, schema
+from packages.data_access.config import LOADER_CONFIG, REGISTRY_CONFIG, SCHEMA_CONFIG
+
+REMOTE_SCHEME = 'minio://'
+DATA_FILE_EXTENSIONS = ('.csv', '.parquet')
+SPARSE_FILE_SUFFIX = '.sparse.npz'
+
+
+def build_remote_path(bucket_name: str, object_name: str) -> str:
+    return f"{REMOTE_SCHEME}{bucket_name}/{object_name}"
+
+
+def is_remote_path(path: str) -> bool:
+    return path.startswith(REMOTE_SCHEME)
+
+
+def split_remote_path(path: str) -> Tuple[str, str]:
+    """
+    Split a minio:// path into its bucket name and object name.
+
+    :param path: A path of the form minio://bucket/object/name.
+    :return: A tuple of the bucket name and the object name or prefix.
+    """
+    bucket_name, _, object_name = path[len(REMOTE_SCHEME):].partition('/')
+    return bucket_name, object_name
+
+
+def file_name(path: str) -> str:
+    if is_remote_path(path):
+        return path.rstrip('/').rsplit('/', 1)[-1]
+    return os.path.basename(path)
+
+
+def list_csv_files(directory: str) -> List[str]:
+    """
+    List the CSV files directly inside a local directory or a MinIO prefix.
+
+    :param directory: A local directory or a minio://bucket/prefix/ path.
+    :return: Paths of the CSV files, in a form accepted by read_csv.
+    """
+    if not is_remote_path(directory):
+        return [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.csv')]
+
+    bucket_name, prefix = split_remote_path(directory)
+    prefix = prefix.rstrip('/') + '/'
+    objects = client.get_shared_client().client.list_objects(bucket_name, prefix=prefix, recursive=False)
+    return [build_remote_path(bucket_name, obj.object_name) for obj in objects
+            if not obj.is_dir and obj.object_name.endswith('.csv')]
+
+
+def list_data_files(directory: str) -> List[str]:
+    """
+    List the CSV and Parquet files directly inside a local directory. Remote prefixes only hold CSV files.
+
+    :param directory: A local directory or a minio://bucket/prefix/ path.
+    :return: Paths of the data files, in a form accepted by read_data_file.
+    """
+    if is_remote_path(directory):
+        return list_csv_files(directory)
+    return [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(DATA_FILE_EXTENSIONS)]
+
+
+def is_parquet_path(path: str) -> bool:
+    return path.endswith('.parquet')
+
+
+def read_data_file(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a CSV or Parquet file into a DataFrame. Parquet files keep the dtypes they were written with, CSV files are
+    read with compact dtypes inside a schema scope, see read_compact_csv.
+    Inside a registry session scope the file is parsed once and later reads reuse the registered DataFrame. A read of a
+    subset of columns takes them from the registered DataFrame, or otherwise parses only those columns and registers
+    nothing, since the registry holds whole files.
+
+    :param path: A local file path or a minio://bucket/object path.
+    :param columns: Optional subset of columns to read.
+    :return: The loaded DataFrame.
+    """
+    session_directory = registry.active_session()
+    if session_directory is None:
+        return _read_data_file(path, columns)
+
+    if columns is not None:
+        data = registry.get_registry().get(session_directory, path, columns)
+        if data is None:
+            return _read_data_file(path, columns)
+        print(f"Reused {path} from the dataset registry")
+        return data
+    return registry.get_registry().load(session_directory, path, lambda: _read_data_file(path))
+
+
+def _read_data_file(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    if is_parquet_path(path):
+        return _read_parquet(path, columns)
+    return read_compact_csv(path, columns)
+
+
+def _read_parquet(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    sparse_path = sparse_block_path(path)
+    if not os.path.exists(sparse_path):
+        return pd.read_parquet(path, columns=columns)
+
+    sparse_block, column_order = read_sparse_block(sparse_path)
+    columns = column_order if columns is None else columns
+    dense_columns = [column for column in columns if column not in sparse_block.columns]
+    data = pd.concat([pd.read_parquet(path, columns=dense_columns), sparse_block], axis=1)
+    return data[columns]
+
+
+def read_compact_csv(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a CSV file with the compact dtypes cached for the active schema scope: float32, the smallest integer type that
+    holds a column and category for text with few distinct values. Columns the cached schema does not know yet are
+    inferred from the first rows of the file and added to it. Outside a schema scope the file is read as pandas infers.
+
+    :param path: A local file path or a minio://bucket/object path.
+    :param columns: Optional subset of columns to read.
+    :return: The parsed DataFrame.
+    """
+    schema_key = schema.active_schema_key()
+    if schema_key is None:
+        return read_csv(path, usecols=columns)
+
+    schema_cache = schema.get_cache()
+    header = columns if columns is not None else read_header(path)
+    column_dtypes = _cached_schema(path, schema_key, header)
+    try:
+        data = read_csv(path, usecols=columns, dtype=schema.parser_dtypes(column_dtypes, header))
+    except ValueError as e:
+        print(f"{file_name(path)} does not fit the cached schema of {schema_key}, reading it without it: {e}")
+        data = read_csv(path, usecols=columns)
+
+    data, widened_dtypes = schema.apply_schema(data, column_dtypes)
+    if widened_dtypes:
+        schema_cache.update(schema_key, widened_dtypes)
+    return data
+
+
+def _cached_schema(path: str, schema_key: str, header: List[str]) -> schema.Schema:
+    """
+    The schema cached for a key, with the columns of a file it does not know yet inferred from the first rows of the
+    file and added to it.
+    """
+    schema_cache = schema.get_cache()
+    column_dtypes = schema_cache.get(schema_key)
+    unknown_columns = [column for column in header if column not in column_dtypes]
+    if unknown_columns:
+        sample = read_csv(path, usecols=unknown_columns, nrows=SCHEMA_CONFIG['sample_rows'])
+        column_dtypes = schema_cache.update(schema_key, schema.infer_schema(sample))
+    return column_dtypes
+
+
+def write_parquet(data: pd.DataFrame, path: str) -> None:
+    """
+    Write a DataFrame to a local Parquet file and, inside a registry session scope, register it for later reads.
+    Parquet cannot hold sparse columns, so these are written next to it as a CSR matrix, see write_sparse_block, and
+    joined back by read_data_file.
+
+    :param data: The DataFrame to write. Its index is not stored.
+    :param path: Local path of the Parquet file.
+    """
+    sparse_columns = [column for column in data.columns if isinstance(data[column].dtype, pd.SparseDtype)]
+    if sparse_columns:
+        write_sparse_block(sparse_block_path(path), data[sparse_columns].sparse.to_coo().tocsr(), sparse_columns,
+                           data.columns.tolist())
+        data.drop(columns=sparse_columns).to_parquet(path, index=False)
+    else:
+        if os.path.exists(sparse_block_path(path)):
+            os.remove(sparse_block_path(path))
+        data.to_parquet(path, index=False)
+    session_directory = registry.active_session()
+    if session_directory is not None:
+        registry.get_registry().publish(session_directory, path, data.reset_index(drop=True), copy=False)
+
+
+def sparse_block_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}{SPARSE_FILE_SUFFIX}"
+
+
+def write_sparse_block(path: str, matrix: sp.csr_matrix, columns: List[str], column_order: List[str]) -> None:
+    """
+    Save the sparse columns of a processed file as the arrays of a CSR matrix, which only store the non-zero values.
+
+    :param path: Path of the .sparse.npz file, see sparse_block_path.
+    :param matrix: The sparse columns as a CSR matrix.
+    :param columns: Names of the columns of the matrix.
+    :param column_order: Names of every column of the file, dense and sparse, in their original order.
+    """
+    np.savez_compressed(path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=matrix.shape,
+                        columns=np.array(columns, dtype=str), column_order=np.array(column_order, dtype=str))
+
+
+def read_sparse_block(path: str) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Load the sparse columns written by write_sparse_block.
+
+    :param path: Path of the .sparse.npz file.
+    :return: The columns as a DataFrame of sparse columns and the order of every column of the file.
+    """
+    with np.load(path) as arrays:
+        matrix = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+        columns, column_order = arrays['columns'].tolist(), arrays['column_order'].tolist()
+    return pd.DataFrame.sparse.from_spmatrix(matrix, columns=columns), column_order
+
+
+def read_header(path: str) -> List[str]:
+    if is_parquet_path(path):
+        if os.path.exists(sparse_block_path(path)):
+            return read_sparse_block(sparse_block_path(path))[1]
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    return read_csv(path, nrows=0).columns.tolist()
+
+
+def iter_chunks(path: str, chunk_size: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Iterate over a CSV or Parquet file in chunks of at most chunk_size rows.
+    Inside a registry session scope, a file that is already registered is sliced from memory rather than parsed again,
+    one chunk at a time. Chunked reads do not register files by default, which would hold the whole file in memory;
+    with REGISTRY_CONFIG['register_chunked_reads'], a file read with all of its columns is registered once every chunk
+    has been read, unless its chunks outgrow the memory budget of the registry.
+
+    :param path: A local file path or a minio://bucket/object path.
+    :param chunk_size: Number of rows per chunk.
+    :param columns: Optional subset of columns to read.
+    :return: An iterator over the DataFrame chunks.
+    """
+    session_directory = registry.active_session()
+    if session_directory is None:
+        yield from _iter_chunks(path, chunk_size, columns)
+        return
+
+    dataset_registry = registry.get_registry()
+    registered_chunks = dataset_registry.get_chunks(session_directory, path, chunk_size, columns)
+    if registered_chunks is not None:
+        print(f"Reused {path} from the dataset registry")
+        yield from registered_chunks
+        return
+
+    if columns is not None or not REGISTRY_CONFIG['register_chunked_reads']:
+        yield from _iter_chunks(path, chunk_size, columns)
+        return
+
+    # Copies are kept, since callers are free to modify the chunks they are given
+    chunks, size = [], 0
+    for chunk in _iter_chunks(path, chunk_size):
+        if chunks is not None:
+            size += int(chunk.memory_usage(index=True, deep=True).sum())
+            if size <= dataset_registry.max_bytes:
+                chunks.append(chunk.copy())
+            else:
+                chunks = None
+        yield chunk
+    if chunks:
+        dataset_registry.publish(session_directory, path, concat_chunks(chunks), copy=False)
+
+
+def _iter_chunks(path: str, chunk_size: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    if not is_parquet_path(path):
+        yield from iter_csv_chunks(path, chunk_size, usecols=columns)
+        return
+
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    if not os.path.exists(sparse_block_path(path)):
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    sparse_block, column_order = read_sparse_block(sparse_block_path(path))
+    columns = column_order if columns is None else columns
+    dense_columns = [column for column in columns if column not in sparse_block.columns]
+    sparse_block = sparse_block[[column for column in columns if column in sparse_block.columns]]
+    start = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=dense_columns):
+        chunk = batch.to_pandas()
+        sparse_rows = sparse_block.iloc[start:start + len(chunk)].reset_index(drop=True)
+        start += len(chunk)
+        yield pd.concat([chunk, sparse_rows], axis=1)[columns]
+
+
+def read_csv(path: str, **kwargs) -> pd.DataFrame:
+    """
+    Read a CSV file into a DataFrame. Remote files are parsed directly from the MinIO response stream,
+    without being written to local disk first.
+
+    :param path: A local file path or a minio://bucket/object path.
+    :param kwargs: Additional keyword arguments forwarded to pandas.read_csv.
+    :return: The parsed DataFrame.
+    """
+    if not is_remote_path(path):
+        return pd.read_csv(path, **kwargs)
+
+    bucket_name, object_name = split_remote_path(path)
+    response = client.get_shared_client().client.get_object(bucket_name, object_name)
+    try:
+        if LOADER_CONFIG['remote_engine'] == 'pyarrow' and not kwargs:
+            from pyarrow import csv
+            return csv.read_csv(response).to_pandas()
+        return pd.read_csv(response, **kwargs)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def iter_csv_chunks(path: str, chunk_size: int, **kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Iterate over a CSV file in chunks of at most chunk_size rows, so that only one chunk is held in memory at a time.
+    Inside a schema scope the chunks are converted to the compact dtypes of the cached schema, as by read_compact_csv.
+    Text columns are parsed into categories directly, while numerical columns are converted chunk by chunk, so that a
+    chunk that does not fit the schema widens it rather than failing the read halfway through the file. Categories
+    differ from chunk to chunk, see concat_chunks for combining them.
+
+    :param path: A local file path or a minio://bucket/object path.
+    :param chunk_size: Number of rows per chunk.
+    :param kwargs: Additional keyword arguments forwarded to pandas.read_csv. Columns given a dtype are not converted.
+    :return: An iterator over the DataFrame chunks.
+    """
+    schema_key = schema.active_schema_key()
+    requested_dtypes = kwargs.get('dtype') or {}
+    if schema_key is None or not isinstance(requested_dtypes, dict) or callable(kwargs.get('usecols')):
+        yield from _iter_csv_chunks(path, chunk_size, **kwargs)
+        return
+
+    schema_cache = schema.get_cache()
+    header = kwargs.get('usecols') or read_header(path)
+    column_dtypes = {column: dtype for column, dtype in _cached_schema(path, schema_key, header).items()
+                     if column not in requested_dtypes}
+    category_dtypes = {column: dtype for column, dtype in schema.parser_dtypes(column_dtypes, header).items()
+                       if dtype == 'category'}
+    for chunk in _iter_csv_chunks(path, chunk_size, **{**kwargs, 'dtype': {**category_dtypes, **requested_dtypes}}):
+        chunk, widened_dtypes = schema.apply_schema(chunk, column_dtypes)
+        if widened_dtypes:
+            schema_cache.update(schema_key, widened_dtypes)
+            column_dtypes.update(widened_dtypes)
+        yield chunk
+
+
+def _iter_csv_chunks(path: str, chunk_size: int, **kwargs) -> Iterator[pd.DataFrame]:
+    if not is_remote_path(path):
+        with pd.read_csv(path, chunksize=chunk_size, **kwargs) as reader:
+            yield from reader
+        return
+
+    bucket_name, object_name = split_remote_path(path)
+    response = client.get_shared_client().client.get_object(bucket_name, object_name)
+    try:
+        with pd.read_csv(response, chunksize=chunk_size, **kwargs) as reader:
+            yield from reader
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def read_files_in_chunks(paths: List[str],
+                         chunk_size: int,
+                         columns: Optional[List[str]] = None,
+                         downcast_floats: bool = True) -> pd.DataFrame:
+    """
+    Load several CSV or Parquet files chunk by chunk, keeping only the requested columns and downcasting floating point
+    columns to float32 before the chunks are combined, which bounds the peak memory to the selected columns.
+
+    :param paths: Local file paths or minio:// paths of the data files.
+    :param chunk_size: Number of rows read at a time.
+    :param columns: Columns to keep. Columns missing from a file are filled with NaN. Defaults to every column.
+    :param downcast_floats: Whether to store float64 columns as float32.
+    :return: A single DataFrame with the rows of every file.
+    """
+    chunks = []
+    for path in paths:
+        if columns is None:
+            usecols = None
+        else:
+            available_columns = set(read_header(path))
+            usecols = [column for column in columns if column in available_columns]
+
+        for chunk in iter_chunks(path, chunk_size, usecols):
+            if columns is not None:
+                chunk = chunk.reindex(columns=columns)
+            if downcast_floats:
+                float_columns = chunk.select_dtypes(include=['float64']).columns
+                chunk[float_columns] = chunk[float_columns].astype(np.float32)
+            chunks.append(chunk)
+
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return concat_chunks(chunks)
+
+
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combine chunks into a single DataFrame. pandas.concat turns a categorical column into an object column when its
+    categories differ between chunks, as they do for chunks read with a compact schema, so such columns are first given
+    the union of the categories of every chunk.
+
+    :param chunks: The chunks, in order.
+    :return: The rows of every chunk, with a new index.
+    """
+    categorical_columns = {column for chunk in chunks for column in chunk.columns
+                           if isinstance(chunk[column].dtype, pd.CategoricalDtype)}
+    for column in categorical_columns:
+        dtype = pd.CategoricalDtype(pd.api.types.union_categoricals(
+            [chunk[column] for chunk in chunks
+             if column in chunk.columns and isinstance(chunk[column].dtype, pd.CategoricalDtype)]).categories)
+        chunks = [chunk.astype({column: dtype}) if column in chunk.columns else chunk for chunk in chunks]
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,166 @@
+import os
+import threading
+import contextlib
+import pandas as pd
+from collections import OrderedDict
+from typing import Callable, Iterator, List, Optional, Tuple
+from packages.data_access.config import REGISTRY_CONFIG
+
+_active_session: Optional[str] = None
+_shared_registry = None
+
+
+class DatasetRegistry:
+    """
+    In-memory registry of the DataFrames parsed during a session, so that the stages of one session read each file at
+    most once. Entries are keyed by the session directory and the file path, and the least recently used ones are
+    evicted once the registry holds more than its memory budget. Chunked reads are served from the registered files,
+    see loader.iter_chunks, but only register files when REGISTRY_CONFIG allows it.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else REGISTRY_CONFIG['max_bytes']
+        self.entries: 'OrderedDict[Tuple[str, str], Tuple[object, pd.DataFrame, int]]' = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, session_directory: str, path: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        Return the DataFrame registered for a file, if the file has not changed since it was registered.
+
+        :param session_directory: Directory of the session the file belongs to.
+        :param path: Local or minio:// path of the file.
+        :param columns: Optional subset of columns, which are the only ones copied.
+        :return: A copy of the registered DataFrame, or None if the file is not registered.
+        """
+        data = self._lookup(session_directory, path)
+        if data is None:
+            return None
+        return data.copy() if columns is None else data[columns].copy()
+
+    def get_chunks(self, session_directory: str, path: str, chunk_size: int,
+                   columns: Optional[List[str]] = None) -> Optional[Iterator[pd.DataFrame]]:
+        """
+        Slice the DataFrame registered for a file into chunks, copying one chunk at a time rather than the whole frame.
+
+        :param session_directory: Directory of the session the file belongs to.
+        :param path: Local or minio:// path of the file.
+        :param chunk_size: Number of rows per chunk.
+        :param columns: Optional subset of columns.
+        :return: An iterator over copies of the chunks, or None if the file is not registered.
+        """
+        data = self._lookup(session_directory, path)
+        if data is None:
+            return None
+        data = data if columns is None else data[columns]
+        return (data.iloc[start:start + chunk_size].copy() for start in range(0, len(data), chunk_size))
+
+    def publish(self, session_directory: str, path: str, data: pd.DataFrame, copy: bool = True) -> None:
+        """
+        Register the contents of a file, replacing any previous entry for the same path.
+
+        :param session_directory: Directory of the session the file belongs to.
+        :param path: Local or minio:// path of the file.
+        :param data: The DataFrame read from, or written to, the file.
+        :param copy: Whether to register a copy. Only pass False for a DataFrame no one else holds.
+        """
+        size = int(data.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        key = (session_directory, _normalize_path(path))
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (_file_stamp(path), data.copy() if copy else data, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def load(self, session_directory: str, path: str, read_function: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Return the registered DataFrame of a file, reading and registering it first if needed.
+
+        :param session_directory: Directory of the session the file belongs to.
+        :param path: Local or minio:// path of the file.
+        :param read_function: Callable that parses the file.
+        :return: The DataFrame of the file.
+        """
+        data = self.get(session_directory, path)
+        if data is not None:
+            print(f"Reused {path} from the dataset registry")
+            return data
+
+        data = read_function()
+        self.publish(session_directory, path, data)
+        return data
+
+    def _lookup(self, session_directory: str, path: str) -> Optional[pd.DataFrame]:
+        key = (session_directory, _normalize_path(path))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != _file_stamp(path):
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def release_session(self, session_directory: str) -> None:
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == session_directory]:
+                self._remove(key)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        _, _, size = self.entries.pop(key)
+        self.total_bytes -= size
+
+
+def _normalize_path(path: str) -> str:
+    if path.startswith('minio://'):
+        return path
+    return os.path.abspath(path)
+
+
+def _file_stamp(path: str) -> object:
+    if path.startswith('minio://'):
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_registry() -> DatasetRegistry:
+    """
+    Return the registry of the current process, creating it on first use.
+    """
+    global _shared_registry
+    if _shared_registry is None:
+        _shared_registry = DatasetRegistry()
+    return _shared_registry
+
+
+def active_session() -> Optional[str]:
+    if not REGISTRY_CONFIG['enabled']:
+        return None
+    return _active_session
+
+
+@contextlib.contextmanager
+def session_scope(session_directory: str) -> Iterator[DatasetRegistry]:
+    """
+    Make the loader share parsed files through the registry while the block runs.
+
+    :param session_directory: Directory of the session whose files are read.
+    :return: The registry of the current process.
+    """
+    global _active_session
+    previous_session = _active_session
+    _active_session = session_directory
+    try:
+        yield get_registry()
+    finally:
+        _active_session = previous_session
@@ -0,0 +1,210 @@
+import os
+import json
+import hashlib
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+from packages.data_access.config import SCHEMA_CONFIG
+
+NUMERIC_DTYPES = ['float32', 'float64', 'int8', 'int16', 'int32', 'int64']
+INTEGER_DTYPES = ['int8', 'int16', 'int32', 'int64']
+
+# A schema maps each column to the compact dtype it is loaded with, or to None when pandas' own dtype is kept
+Schema = Dict[str, Optional[str]]
+
+_active_schema_key: Optional[str] = None
+_shared_cache = None
+
+
+class SchemaCache:
+    """
+    Cache of the schemas inferred for the data of a user and label. Schemas are kept in memory and in a JSON file per
+    key, so that the worker processes and later jobs of the same user and label load the files with the same dtypes.
+    A schema only ever widens: a file that does not fit it widens the dtypes of the offending columns.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or SCHEMA_CONFIG['directory']
+        self.schemas: Dict[str, Schema] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Schema:
+        """
+        Return the schema cached for a key.
+
+        :param key: The key returned by schema_key.
+        :return: A copy of the schema, empty if nothing was inferred for the key yet.
+        """
+        with self.lock:
+            if key not in self.schemas:
+                self.schemas[key] = self._read(key)
+            return dict(self.schemas[key])
+
+    def update(self, key: str, column_dtypes: Schema) -> Schema:
+        """
+        Add the dtypes of new columns to the schema of a key and widen the dtypes of the columns it already holds.
+
+        :param key: The key returned by schema_key.
+        :param column_dtypes: Dtypes inferred from a sample or widened while loading a file.
+        :return: A copy of the updated schema.
+        """
+        with self.lock:
+            schema = self.schemas.get(key)
+            if schema is None:
+                schema = self.schemas[key] = self._read(key)
+            for column, dtype in column_dtypes.items():
+                schema[column] = widen_dtype(schema[column], dtype) if column in schema else dtype
+            self._write(key, schema)
+            return dict(schema)
+
+    def _path(self, key: str) -> str:
+        # The user ID and label come from the request, so they are hashed rather than used as a path
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def _read(self, key: str) -> Schema:
+        try:
+            with open(self._path(key)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, key: str, schema: Schema) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as file:
+            json.dump(schema, file, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+
+def get_cache() -> SchemaCache:
+    """
+    Return the schema cache of the current process, creating it on first use.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SchemaCache()
+    return _shared_cache
+
+
+def schema_key(user_id: str, label: str) -> str:
+    return f"{user_id}/{label}"
+
+
+def active_schema_key() -> Optional[str]:
+    if not SCHEMA_CONFIG['enabled']:
+        return None
+    return _active_schema_key
+
+
+@contextlib.contextmanager
+def schema_scope(key: Optional[str]) -> Iterator[None]:
+    """
+    Make the loader read CSV files with the compact dtypes cached for a user and label while the block runs.
+
+    :param key: The key returned by schema_key, or None to read files with pandas' own dtypes.
+    """
+    global _active_schema_key
+    previous_key = _active_schema_key
+    _active_schema_key = key
+    try:
+        yield
+    finally:
+        _active_schema_key = previous_key
+
+
+def infer_dtype(values: pd.Series) -> Optional[str]:
+    """
+    The most compact dtype that holds the values of a column: the smallest integer type covering the range of an
+    integer column, float32 for floating point columns and category for text columns with few distinct values.
+
+    :param values: The column, usually taken from a sample of the rows.
+    :return: The name of the dtype, or None if the column is best left as pandas reads it.
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return None
+
+    if pd.api.types.is_integer_dtype(values):
+        if values.empty:
+            return 'int64'
+        minimum, maximum = values.min(), values.max()
+        for dtype in INTEGER_DTYPES:
+            if np.iinfo(dtype).min <= minimum and maximum <= np.iinfo(dtype).max:
+                return dtype
+        return None
+
+    if pd.api.types.is_float_dtype(values):
+        largest = np.abs(values.to_numpy(dtype=np.float64, na_value=np.nan))
+        largest = np.nanmax(largest) if np.isfinite(largest).any() else 0.0
+        return 'float32' if largest <= np.finfo(np.float32).max else None
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return 'category'
+
+    if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+        present = values.dropna()
+        unique_count = present.nunique()
+        if len(present) and unique_count <= SCHEMA_CONFIG['category_max_unique'] \
+                and unique_count <= SCHEMA_CONFIG['category_max_unique_ratio'] * len(present):
+            return 'category'
+    return None
+
+
+def infer_schema(data: pd.DataFrame) -> Schema:
+    return {column: infer_dtype(data[column]) for column in data.columns}
+
+
+def widen_dtype(first: Optional[str], second: Optional[str]) -> Optional[str]:
+    """
+    The most compact dtype that holds the values of both dtypes.
+    """
+    if first == second:
+        return first
+    if first in INTEGER_DTYPES and second in INTEGER_DTYPES:
+        return max(first, second, key=INTEGER_DTYPES.index)
+    if {first, second} in ({'float32', 'int8'}, {'float32', 'int16'}):
+        return 'float32'
+    return None
+
+
+def parser_dtypes(schema: Schema, columns: List[str]) -> Dict[str, str]:
+    """
+    The dtypes of a schema that pandas.read_csv can be asked to parse into directly. Integer columns are left out,
+    because the parser silently wraps values that do not fit a small integer type; apply_schema downcasts them after
+    checking their range.
+
+    :param schema: The cached schema.
+    :param columns: The columns being read.
+    :return: The dtype argument of pandas.read_csv.
+    """
+    return {column: schema[column] for column in columns if schema.get(column) in ('float32', 'category')}
+
+
+def apply_schema(data: pd.DataFrame, schema: Schema) -> Tuple[pd.DataFrame, Schema]:
+    """
+    Convert the columns of a DataFrame to the dtypes of a schema. A column whose values do not fit its cached dtype is
+    converted to the widened dtype instead.
+
+    :param data: The DataFrame as read from the file.
+    :param schema: The cached schema.
+    :return: The converted DataFrame and the widened dtypes, which should be written back to the cache.
+    """
+    widened = {}
+    for column in data.columns:
+        dtype = schema.get(column)
+        if dtype is None or data[column].dtype.name == dtype:
+            continue
+        if not _fits(data[column], dtype):
+            dtype = widened[column] = widen_dtype(dtype, infer_dtype(data[column]))
+            if dtype is None or data[column].dtype.name == dtype:
+                continue
+        data[column] = data[column].astype(dtype)
+    return data, widened
+
+
+def _fits(values: pd.Series, dtype: str) -> bool:
+    if dtype in INTEGER_DTYPES:
+        return infer_dtype(values) in INTEGER_DTYPES[:INTEGER_DTYPES.index(dtype) + 1]
+    return infer_dtype(values) == dtype
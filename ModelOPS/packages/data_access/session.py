@@ -0,0 +1,65 @@
+import os
+import json
+from typing import Optional
+from packages.data_access.schema import schema_key
+from packages.data_access.loader import build_remote_path
+
+SESSION_FILE_NAME = 'session.json'
+
+
+def write_session_info(session_directory: str, bucket_name: str, user_id: str, label: str, stream: bool) -> None:
+    """
+    Record where the data of a session comes from, so that later stages can locate it.
+
+    :param session_directory: Temporary directory created for the session by /download_files.
+    :param bucket_name: Name of the Minio bucket holding the raw files.
+    :param user_id: User ID as part of the object path.
+    :param label: Label as part of the object path.
+    :param stream: Whether the raw files are streamed from MinIO instead of being downloaded into the session.
+    """
+    os.makedirs(session_directory, exist_ok=True)
+    with open(os.path.join(session_directory, SESSION_FILE_NAME), 'w') as file:
+        json.dump({'bucket_name': bucket_name, 'user_id': user_id, 'label': label, 'stream': stream}, file)
+
+
+def read_session_info(session_directory: str) -> Optional[dict]:
+    """
+    Read the session information written by write_session_info.
+
+    :param session_directory: Temporary directory of the session.
+    :return: The session information, or None if the session was not created by /download_files.
+    """
+    session_file = os.path.join(session_directory, SESSION_FILE_NAME)
+    if not os.path.exists(session_file):
+        return None
+
+    with open(session_file) as file:
+        return json.load(file)
+
+
+def resolve_data_directory(session_directory: str) -> str:
+    """
+    Return the location of the raw files of a session: the local 'data' directory, or the MinIO prefix when the
+    session streams its files.
+
+    :param session_directory: Temporary directory of the session.
+    :return: A local directory path or a minio:// prefix accepted by the loader.
+    """
+    session_info = read_session_info(session_directory)
+    if session_info and session_info.get('stream'):
+        return build_remote_path(session_info['bucket_name'], f"{session_info['user_id']}/{session_info['label']}/")
+
+    return os.path.join(session_directory, 'data')
+
+
+def session_schema_key(session_directory: str) -> Optional[str]:
+    """
+    Return the schema cache key of the user and label a session was created for.
+
+    :param session_directory: Temporary directory of the session.
+    :return: The key, or None if the session was not created by /download_files.
+    """
+    session_info = read_session_info(session_directory)
+    if session_info is None:
+        return None
+    return schema_key(session_info['user_id'], session_info['label'])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from packages.data_access import dedup
+from packages.data_access.dedup import RowDeduplicator
+
+
+def _files(file_count: int = 3, row_count: int = 500):
+    rng = np.random.default_rng(2)
+    return [pd.DataFrame({'pid': rng.integers(0, 400, row_count).astype(float),
+                          'age': rng.integers(18, 25, row_count),
+                          'sex': rng.choice(['M', 'F'], row_count)}) for _ in range(file_count)]
+
+
+@pytest.mark.parametrize('key_columns', [None, ['pid']])
+def test_chunks_of_several_files_match_drop_duplicates(key_columns):
+    files = _files()
+    files[0].loc[::50, 'pid'] = np.nan
+    deduplicator = RowDeduplicator(key_columns=key_columns)
+
+    kept = [deduplicator.drop_duplicates(data.iloc[start:start + 120])
+            for data in files for start in range(0, len(data), 120)]
+
+    expected = pd.concat(files, ignore_index=True).drop_duplicates(subset=key_columns)
+    pd.testing.assert_frame_equal(pd.concat(kept, ignore_index=True), expected.reset_index(drop=True))
+    assert deduplicator.duplicate_count == sum(len(data) for data in files) - len(expected)
+    assert len(deduplicator) == len(expected)
+
+
+def test_values_match_across_dtypes():
+    deduplicator = RowDeduplicator()
+    deduplicator.drop_duplicates(pd.DataFrame({'pid': np.array([1, 2], dtype=np.int8), 'bmi': [20.5, 30.0]}))
+
+    kept = deduplicator.drop_duplicates(pd.DataFrame({'pid': [1.0, 3.0], 'bmi': np.array([20.5, 30.0], np.float32)}))
+
+    assert kept['pid'].tolist() == [3.0]
+
+
+def test_integer_identifiers_above_float_precision_stay_distinct():
+    identifiers = np.array([2 ** 53, 2 ** 53 + 1, 2 ** 62 + 1, 2 ** 62], dtype=np.int64)
+    deduplicator = RowDeduplicator(key_columns=['pid'])
+
+    kept = deduplicator.drop_duplicates(pd.DataFrame({'pid': identifiers}))
+    repeated = deduplicator.drop_duplicates(pd.DataFrame({'pid': pd.array([2 ** 53 + 1, None, 7], dtype='Int64')}))
+
+    assert len(kept) == 4 and len(deduplicator) == 6
+    assert repeated['pid'].isna().tolist() == [True, False]
+    assert not deduplicator.first_occurrences(pd.DataFrame({'pid': [np.nan, 7.0]})).any()
+
+
+def test_chunks_with_different_columns_never_match():
+    deduplicator = RowDeduplicator()
+    deduplicator.drop_duplicates(pd.DataFrame({'a': [1, 2]}))
+
+    assert len(deduplicator.drop_duplicates(pd.DataFrame({'b': [1, 2]}))) == 2
+
+
+def test_verify_keeps_rows_whose_hashes_collide(monkeypatch):
+    monkeypatch.setattr(dedup, 'hash_rows', lambda data, columns=None: np.zeros(len(data), dtype=np.uint64))
+    rows = pd.DataFrame({'pid': [1, 2, 1, 3]})
+
+    assert RowDeduplicator(verify=False).first_occurrences(rows).tolist() == [True, False, False, False]
+    assert RowDeduplicator(verify=True).first_occurrences(rows).tolist() == [True, True, False, True]
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from packages.data_access import loader, registry, schema
+
+
+def _write_file(path) -> pd.DataFrame:
+    # The first rows fit int8 and hold one smoker status, which later rows widen
+    data = pd.DataFrame({'pid': np.arange(400),
+                         'visits': np.r_[np.zeros(300, dtype=int), np.arange(100) * 10],
+                         'bmi': np.linspace(18, 40, 400),
+                         'smoker': ['no'] * 300 + ['yes', 'former'] * 50})
+    data.to_csv(path, index=False)
+    return data
+
+
+def test_chunks_are_read_with_the_cached_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema, '_shared_cache', schema.SchemaCache(str(tmp_path / 'schemas')))
+    monkeypatch.setitem(schema.SCHEMA_CONFIG, 'sample_rows', 100)
+    data = _write_file(tmp_path / 'cohort.csv')
+
+    with schema.schema_scope('user/label'):
+        chunks = list(loader.iter_csv_chunks(str(tmp_path / 'cohort.csv'), 100))
+
+    assert chunks[0]['visits'].dtype == np.int8 and chunks[-1]['visits'].dtype == np.int16
+    assert all(chunk['bmi'].dtype == np.float32 for chunk in chunks)
+    assert all(isinstance(chunk['smoker'].dtype, pd.CategoricalDtype) for chunk in chunks)
+    assert schema.get_cache().get('user/label')['visits'] == 'int16'
+    assert pd.concat(chunks)['visits'].tolist() == data['visits'].tolist()
+
+
+def test_caller_dtypes_take_precedence_over_the_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema, '_shared_cache', schema.SchemaCache(str(tmp_path / 'schemas')))
+    _write_file(tmp_path / 'cohort.csv')
+
+    with schema.schema_scope('user/label'):
+        chunks = list(loader.iter_csv_chunks(str(tmp_path / 'cohort.csv'), 100, dtype={'smoker': object}))
+
+    assert all(chunk['smoker'].dtype == object for chunk in chunks)
+    assert all(chunk['visits'].dtype.name in schema.INTEGER_DTYPES[:2] for chunk in chunks)
+
+
+def test_chunks_keep_the_union_of_their_categories(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema, '_shared_cache', schema.SchemaCache(str(tmp_path / 'schemas')))
+    data = _write_file(tmp_path / 'cohort.csv')
+
+    with schema.schema_scope('user/label'):
+        combined = loader.read_files_in_chunks([str(tmp_path / 'cohort.csv')], 100)
+
+    assert isinstance(combined['smoker'].dtype, pd.CategoricalDtype)
+    assert set(combined['smoker'].cat.categories) == {'no', 'yes', 'former'}
+    assert combined['smoker'].astype(str).tolist() == data['smoker'].tolist()
+
+
+def test_chunked_reads_share_the_dataset_registry(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(registry, '_shared_registry', registry.DatasetRegistry())
+    monkeypatch.setitem(registry.REGISTRY_CONFIG, 'register_chunked_reads', True)
+    data = _write_file(tmp_path / 'cohort.csv')
+    path = str(tmp_path / 'cohort.csv')
+
+    with registry.session_scope(str(tmp_path)):
+        first_read = loader.concat_chunks(list(loader.iter_chunks(path, 150)))
+        second_read = loader.concat_chunks(list(loader.iter_chunks(path, 150, ['pid', 'smoker'])))
+        whole_read = loader.read_data_file(path)
+
+    assert capsys.readouterr().out.count('from the dataset registry') == 2
+    pd.testing.assert_frame_equal(first_read, data)
+    pd.testing.assert_frame_equal(second_read, data[['pid', 'smoker']])
+    pd.testing.assert_frame_equal(whole_read, data)
+
+
+def test_partial_chunked_reads_are_not_registered(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, '_shared_registry', registry.DatasetRegistry())
+    _write_file(tmp_path / 'cohort.csv')
+    path = str(tmp_path / 'cohort.csv')
+
+    with registry.session_scope(str(tmp_path)):
+        list(loader.iter_chunks(path, 150, ['pid']))
+        next(loader.iter_chunks(path, 150))
+
+    assert not registry.get_registry().entries
+
+
+def test_chunked_and_column_reads_do_not_register_by_default(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(registry, '_shared_registry', registry.DatasetRegistry())
+    data = _write_file(tmp_path / 'cohort.csv')
+    path = str(tmp_path / 'cohort.csv')
+
+    with registry.session_scope(str(tmp_path)):
+        list(loader.iter_chunks(path, 150))
+        column_read = loader.read_data_file(path, ['pid', 'smoker'])
+        assert not registry.get_registry().entries
+        loader.read_data_file(path)
+        chunks = list(loader.iter_chunks(path, 150, ['bmi']))
+        registered_column_read = loader.read_data_file(path, ['visits'])
+
+    assert capsys.readouterr().out.count('from the dataset registry') == 2
+    assert [len(chunk) for chunk in chunks] == [150, 150, 100]
+    pd.testing.assert_frame_equal(loader.concat_chunks(chunks), data[['bmi']])
+    pd.testing.assert_frame_equal(column_read, data[['pid', 'smoker']])
+    pd.testing.assert_frame_equal(registered_column_read, data[['visits']])
+
+
+def test_schema_files_stay_in_the_cache_directory(tmp_path):
+    key = schema.schema_key('../../user', '../label')
+    schema.SchemaCache(str(tmp_path / 'schemas')).update(key, {'visits': 'int8'})
+
+    written = [path for path in tmp_path.rglob('*') if path.is_file()]
+    assert len(written) == 1 and (tmp_path / 'schemas') in written[0].parents
+    assert schema.SchemaCache(str(tmp_path / 'schemas')).get(key) == {'visits': 'int8'}
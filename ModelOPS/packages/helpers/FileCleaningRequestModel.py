@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -9,3 +10,5 @@ class FileCleaningRequest(BaseModel):
     row_threshold: float
     column_threshold: float
     excluded_columns: list[str]
+    chunk_size: Optional[int] = None
+    max_workers: Optional[int] = None
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -5,3 +6,5 @@ class FileDownloadRequest(BaseModel):
     bucket_name: str
     user_id: str
     label: str
+    max_workers: Optional[int] = None
+    stream: bool = False
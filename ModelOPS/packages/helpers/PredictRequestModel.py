@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class PredictRequest(BaseModel):
+    user_id: str
+    label: str
+    engine: str = 'random_forest'
+    explain: bool = False
+    rows: list[dict] = []
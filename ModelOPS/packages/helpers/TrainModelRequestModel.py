@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -12,3 +13,7 @@ class TrainModelRequest(BaseModel):
     patient_identifier: str
     label: str
     user_id: str
+    render_artifacts: bool = True
+    incremental_trees: int = 0
+    search_budget_seconds: Optional[float] = None
+    importance_method: str = 'impurity'
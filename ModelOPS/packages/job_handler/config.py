@@ -0,0 +1,7 @@
+import os
+
+JOB_CONFIG = {
+    'max_workers': os.cpu_count() or 1,
+    'max_finished_jobs': 500,
+    'max_sessions': 1000
+}
@@ -0,0 +1,152 @@
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+from .config import JOB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class JobManager:
+    """
+    Runs jobs on a set of single-process workers. Jobs submitted with the same session key run on the same worker, so
+    the datasets a session keeps in the worker's memory are still there for its next job.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        worker_count = max_workers or JOB_CONFIG['max_workers']
+        self.executors: List[ProcessPoolExecutor] = [ProcessPoolExecutor(max_workers=1) for _ in range(worker_count)]
+        self.session_workers: 'OrderedDict[str, int]' = OrderedDict()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job_type: str, function: Callable, *args, session_key: Optional[str] = None) -> str:
+        """
+        Queue a function on a worker process and return the identifier of the created job.
+
+        :param job_type: Short name describing the job, e.g. 'train_model'.
+        :param function: Module-level callable executed in a worker process.
+        :param args: Picklable positional arguments passed to the function.
+        :param session_key: Optional key, such as the session directory, pinning the job to the worker of the session.
+        :return: The identifier of the queued job.
+        """
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self._prune_finished_jobs()
+            worker = self._assign_worker(session_key)
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'type': job_type,
+                'worker': worker,
+                'submitted_at': datetime.now(timezone.utc).isoformat(),
+                'finished_at': None,
+                'future': None,
+                'result': None,
+                'error': None
+            }
+
+        future = self.executors[worker].submit(function, *args)
+        with self.lock:
+            self.jobs[job_id]['future'] = future
+        future.add_done_callback(lambda done: self._on_job_done(job_id, done))
+        logger.info("Queued %s job %s", job_type, job_id)
+        return job_id
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Describe the current state of a job.
+
+        :param job_id: Identifier returned by submit.
+        :return: A dictionary with the job status, or None if the job is unknown.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+
+            return {
+                'job_id': job['job_id'],
+                'type': job['type'],
+                'status': self._job_state(job),
+                'submitted_at': job['submitted_at'],
+                'finished_at': job['finished_at'],
+                'error': job['error']
+            }
+
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve the status of a job together with the value returned by its function.
+
+        :param job_id: Identifier returned by submit.
+        :return: The job status extended with its result, or None if the job is unknown.
+        """
+        status = self.get_status(job_id)
+        if status is None:
+            return None
+
+        with self.lock:
+            status['result'] = self.jobs[job_id]['result']
+        return status
+
+    def get_future(self, job_id: str) -> Optional[Future]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job['future'] if job else None
+
+    def shutdown(self) -> None:
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _assign_worker(self, session_key: Optional[str]) -> int:
+        if session_key is not None and session_key in self.session_workers:
+            self.session_workers.move_to_end(session_key)
+            return self.session_workers[session_key]
+
+        pending_jobs = [0] * len(self.executors)
+        for job in self.jobs.values():
+            if job['finished_at'] is None:
+                pending_jobs[job['worker']] += 1
+        worker = pending_jobs.index(min(pending_jobs))
+
+        if session_key is not None:
+            self.session_workers[session_key] = worker
+            while len(self.session_workers) > JOB_CONFIG['max_sessions']:
+                self.session_workers.popitem(last=False)
+        return worker
+
+    def _on_job_done(self, job_id: str, future: Future) -> None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+
+            job['finished_at'] = datetime.now(timezone.utc).isoformat()
+            if future.cancelled():
+                job['error'] = "Job was cancelled."
+            elif future.exception() is not None:
+                job['error'] = str(future.exception())
+            else:
+                job['result'] = future.result()
+            state = self._job_state(job)
+
+        logger.info("Finished %s job %s with status %s", job['type'], job_id, state)
+
+    def _prune_finished_jobs(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished_at'] is not None]
+        excess = len(finished) - JOB_CONFIG['max_finished_jobs']
+        for job_id in sorted(finished, key=lambda key: self.jobs[key]['finished_at'])[:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    @staticmethod
+    def _job_state(job: Dict[str, Any]) -> str:
+        future = job['future']
+        if job['error'] is not None:
+            return 'failed'
+        if job['finished_at'] is not None:
+            return 'completed'
+        if future is not None and future.running():
+            return 'running'
+        return 'queued'
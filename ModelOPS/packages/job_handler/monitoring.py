@@ -0,0 +1,46 @@
+import psutil
+import threading
+
+
+class PeakMemoryMonitor:
+    """
+    Context manager that samples the resident memory of the current process and its children in a background thread
+    and records the highest value observed while the block runs.
+    """
+
+    def __init__(self, interval_seconds: float = 0.1):
+        self.interval_seconds = interval_seconds
+        self.process = psutil.Process()
+        self.peak_bytes = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak_bytes / (1024 * 1024), 1)
+
+    def __enter__(self) -> 'PeakMemoryMonitor':
+        self._measure()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._stop_event.set()
+        self._thread.join()
+        self._measure()
+
+    def _sample(self) -> None:
+        while not self._stop_event.wait(self.interval_seconds):
+            self._measure()
+
+    def _measure(self) -> None:
+        try:
+            resident_bytes = self.process.memory_info().rss
+            for child in self.process.children(recursive=True):
+                try:
+                    resident_bytes += child.memory_info().rss
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            return
+        self.peak_bytes = max(self.peak_bytes, resident_bytes)
@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+from typing import Optional
+from packages.data_access import session, registry, schema
+from packages.processing import random_forest
+from packages.minio_file_handler import client
+from packages.artifact_handler import artifacts, rendering
+from packages.job_handler.monitoring import PeakMemoryMonitor
+from packages.statistical_analysis import statistical_analysis
+from packages.preprocessing.preprocess_data import preprocess_files
+from packages.helpers.TrainModelRequestModel import TrainModelRequest
+from packages.helpers.FileCleaningRequestModel import FileCleaningRequest
+
+
+def run_cleaning_job(request: FileCleaningRequest) -> dict:
+    """
+    Merge, clean, encode and scale the downloaded files of a session.
+
+    :param request: The cleaning request received by the /clean_files endpoint.
+    :return: The response body reported as the job result.
+    """
+    input_path = session.resolve_data_directory(request.input_path)
+    output_path = os.path.join(request.input_path, 'cleaned')
+
+    with PeakMemoryMonitor() as memory_monitor, registry.session_scope(request.input_path), \
+            schema.schema_scope(session.session_schema_key(request.input_path)):
+        file_reports = preprocess_files(input_path,
+                                        output_path,
+                                        request.patient_identifier,
+                                        request.encoding_method,
+                                        request.scale_method,
+                                        request.row_threshold,
+                                        request.column_threshold,
+                                        request.excluded_columns,
+                                        request.chunk_size,
+                                        request.max_workers)
+    failed_files = [report for report in file_reports if report["error"]]
+    return {"message": "Files cleaned successfully" if not failed_files else
+            f"{len(failed_files)} of {len(file_reports)} files could not be cleaned",
+            "cleaned_files_path": request.input_path,
+            "files": file_reports,
+            "peak_memory_mb": memory_monitor.peak_mb}
+
+
+def run_training_job(request: TrainModelRequest) -> dict:
+    """
+    Train the model for a session, run the statistical analysis and upload every result to MinIO.
+
+    :param request: The training request received by the /train_model endpoint.
+    :return: The response body reported as the job result.
+    """
+    minio_client = client.get_shared_client()
+    temporary_directory = tempfile.mkdtemp()
+
+    try:
+        with PeakMemoryMonitor() as memory_monitor, registry.session_scope(request.input_path), \
+                schema.schema_scope(schema.schema_key(request.user_id, request.label)):
+            minio_client.get_files_by_user_label(request.bucket_name, request.user_id, request.label,
+                                                 temporary_directory, copy_from_cache=True)
+            _remove_derived_outputs(temporary_directory, request.render_artifacts)
+
+            if request.excluded_columns is None:
+                request.excluded_columns = []
+
+            if request.patient_identifier not in request.excluded_columns:
+                request.excluded_columns.append(request.patient_identifier)
+
+            default_directory = session.resolve_data_directory(request.input_path)
+            cleaned_directory = os.path.join(request.input_path, 'cleaned')
+
+            if os.path.exists(cleaned_directory):
+                input_path = cleaned_directory
+            else:
+                input_path = default_directory
+
+            random_forest.run(input_path,
+                              default_directory,
+                              temporary_directory,
+                              request.target_column,
+                              max_depth=request.max_depth,
+                              random_state=request.random_state,
+                              excluded_columns=request.excluded_columns,
+                              chunk_size=request.chunk_size or None,
+                              render_artifacts=request.render_artifacts,
+                              user_id=request.user_id,
+                              label=request.label,
+                              incremental_trees=request.incremental_trees,
+                              search_budget_seconds=request.search_budget_seconds,
+                              importance_method=request.importance_method)
+
+            statistical_analysis.analyze(default_directory,
+                                         temporary_directory,
+                                         request.target_column,
+                                         request.patient_identifier,
+                                         request.render_artifacts)
+            minio_client.upload_directory(request.bucket_name, request.user_id, request.label, temporary_directory)
+        return {"message": "Model trained successfully.",
+                "label": request.label,
+                "peak_memory_mb": memory_monitor.peak_mb}
+    finally:
+        registry.get_registry().release_session(request.input_path)
+        shutil.rmtree(request.input_path, ignore_errors=True)
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+
+
+def run_artifact_job(bucket_name: str, user_id: str, label: str, artifact_name: str) -> Optional[dict]:
+    """
+    Render an artifact registered by a training run from its saved data and store it in MinIO next to the other
+    training outputs, so that later requests are served from there.
+
+    :param bucket_name: Name of the Minio bucket holding the training outputs.
+    :param user_id: User ID as part of the object path.
+    :param label: Label as part of the object path.
+    :param artifact_name: Name of the artifact relative to the label, e.g. 'graphics/plot_Age.png'.
+    :return: The name of the stored object, or None if the training run did not register the artifact.
+    """
+    minio_client = client.get_shared_client()
+    temporary_directory = tempfile.mkdtemp()
+
+    try:
+        artifact_directory = os.path.join(temporary_directory, artifacts.ARTIFACT_DIRECTORY)
+        minio_client.get_files_by_user_label(bucket_name, user_id, label, artifact_directory,
+                                             subdirectory=artifacts.ARTIFACT_DIRECTORY)
+
+        path = rendering.render_artifact(artifact_directory, os.path.join(temporary_directory, 'rendered'),
+                                         artifact_name)
+        if path is None:
+            return None
+
+        object_name = f"{user_id}/{label}/{artifact_name}"
+        minio_client.upload_file(bucket_name, object_name, path)
+        return {"object_name": object_name}
+    finally:
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+
+
+def _remove_derived_outputs(results_directory: str, render_artifacts: bool) -> None:
+    """
+    Remove the outputs of the previous training run that this run regenerates, so that neither stale figures nor a
+    stale artifact manifest are uploaded again.
+    """
+    directories = [artifacts.ARTIFACT_DIRECTORY]
+    if not render_artifacts:
+        directories += ['graphics', 'shap', 'stats']
+    for directory in directories:
+        shutil.rmtree(os.path.join(results_directory, directory), ignore_errors=True)
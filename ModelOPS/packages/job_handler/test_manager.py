@@ -0,0 +1,63 @@
+import time
+import logging
+import pytest
+from packages.job_handler.manager import JobManager
+
+
+def _square(value: int) -> int:
+    time.sleep(0.2)
+    return value * value
+
+
+def _fail(message: str) -> None:
+    raise ValueError(message)
+
+
+def _wait_for(condition) -> None:
+    # The done callback of a job runs in a thread of the executor, shortly after its future resolves
+    for _ in range(100):
+        if condition():
+            return
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def manager():
+    job_manager = JobManager(max_workers=2)
+    yield job_manager
+    job_manager.shutdown()
+
+
+def test_completed_job_reports_its_result(manager, caplog):
+    with caplog.at_level(logging.INFO, logger='packages.job_handler.manager'):
+        job_id = manager.submit('square', _square, 4)
+        assert manager.get_status(job_id)['status'] in ('queued', 'running')
+        assert manager.get_result(job_id)['result'] is None
+
+        manager.get_future(job_id).result(timeout=30)
+        _wait_for(lambda: 'Finished' in caplog.text)
+
+    result = manager.get_result(job_id)
+    assert result['status'] == 'completed' and result['result'] == 16 and result['error'] is None
+    assert result['type'] == 'square' and result['finished_at'] is not None
+    assert f"Queued square job {job_id}" in caplog.text
+    assert f"Finished square job {job_id} with status completed" in caplog.text
+
+
+def test_failed_job_reports_its_error(manager):
+    job_id = manager.submit('fail', _fail, 'bad input')
+    with pytest.raises(ValueError):
+        manager.get_future(job_id).result(timeout=30)
+    _wait_for(lambda: manager.get_status(job_id)['status'] == 'failed')
+
+    status = manager.get_result(job_id)
+    assert status['status'] == 'failed' and status['error'] == 'bad input' and status['result'] is None
+
+
+def test_jobs_of_a_session_share_a_worker(manager):
+    first_job = manager.submit('square', _square, 1, session_key='session')
+    manager.submit('square', _square, 2)
+    second_job = manager.submit('square', _square, 3, session_key='session')
+
+    assert manager.jobs[first_job]['worker'] == manager.jobs[second_job]['worker']
+    assert manager.get_status('unknown') is None and manager.get_result('unknown') is None
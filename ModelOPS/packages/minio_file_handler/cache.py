@@ -0,0 +1,115 @@
+import os
+import uuid
+import shutil
+import hashlib
+import threading
+from typing import Optional
+from .config import CACHE_CONFIG
+
+
+class DatasetCache:
+    """
+    Content-addressed on-disk cache of MinIO objects keyed by their ETag.
+
+    Each cached object is stored as a single file whose modification time records its last use, so several processes
+    can share the cache directory without a common index. Files are evicted in least-recently-used order once the
+    cache grows beyond its disk budget.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory or CACHE_CONFIG['directory']
+        self.max_bytes = max_bytes if max_bytes is not None else CACHE_CONFIG['max_bytes']
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(etag: str, size: int) -> str:
+        """
+        Build the cache key of an object from its ETag and size.
+
+        :param etag: ETag reported by MinIO for the object.
+        :param size: Size of the object in bytes.
+        :return: A file-system safe cache key.
+        """
+        etag = etag.strip('"')
+        return hashlib.sha256(f"{etag}:{size}".encode('utf-8')).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def staging_path(self, key: str) -> str:
+        """
+        Return a unique temporary path to download an object to before committing it into the cache.
+
+        :param key: Cache key of the object being downloaded.
+        :return: Path of the staging file.
+        """
+        entry_path = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        return f"{entry_path}.{uuid.uuid4().hex}.part"
+
+    def commit(self, key: str, staging_path: str) -> None:
+        os.replace(staging_path, self.entry_path(key))
+
+    def materialize(self, key: str, destination_path: str, copy: bool = False) -> bool:
+        """
+        Place a cached object at the destination path, hardlinking it when possible and copying it otherwise.
+
+        :param key: Cache key of the object.
+        :param destination_path: Local path where the object is expected.
+        :param copy: Whether to always copy the object, for destinations that are modified in place.
+        :return: True if the object was served from the cache, False if it is not cached.
+        """
+        entry_path = self.entry_path(key)
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return False
+
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
+        try:
+            if copy:
+                shutil.copyfile(entry_path, destination_path)
+            else:
+                os.link(entry_path, destination_path)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            shutil.copyfile(entry_path, destination_path)
+        return True
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the cache fits in its disk budget.
+
+        :return: The number of bytes freed.
+        """
+        with self.lock:
+            entries = []
+            for root, _, files in os.walk(self.directory):
+                for file in files:
+                    if '.part' in file:
+                        continue
+                    file_path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, file_path))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            freed_bytes = 0
+            for _, size, file_path in sorted(entries):
+                if total_bytes - freed_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(file_path)
+                    freed_bytes += size
+                except FileNotFoundError:
+                    continue
+
+        if freed_bytes:
+            print(f"Evicted {freed_bytes} bytes from the dataset cache")
+        return freed_bytes
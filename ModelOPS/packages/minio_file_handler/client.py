@@ -1,56 +1,289 @@
 import os
+import time
+import hashlib
+import urllib3
 from minio import Minio
-from .config import MINIO_CONFIG
+from typing import Optional
+from minio.error import S3Error, ServerError
+from minio.deleteobjects import DeleteObject
+from concurrent.futures import ThreadPoolExecutor
+from .cache import DatasetCache
+from .config import MINIO_CONFIG, MINIO_TRANSFER_CONFIG, CACHE_CONFIG
+
+_shared_client = None
 
 
 class MinioClient:
-    def __init__(self):
-        self.client = Minio(**MINIO_CONFIG)
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or MINIO_TRANSFER_CONFIG['max_workers']
+        http_client = urllib3.PoolManager(
+            maxsize=self.max_workers,
+            timeout=urllib3.Timeout(connect=MINIO_TRANSFER_CONFIG['connect_timeout'],
+                                    read=MINIO_TRANSFER_CONFIG['read_timeout']),
+            # Downloads are retried per object by _download_object, which also covers failures while the body is read,
+            # so the pool does not retry on top of it
+            retries=urllib3.Retry(total=0)
+        )
+        self.client = Minio(**MINIO_CONFIG, http_client=http_client)
+        self.cache = DatasetCache() if CACHE_CONFIG['enabled'] else None
 
-    def get_files_by_user_label(self, bucket_name: str, user_id: str, label: str, local_storage_path: str) -> None:
+    def get_files_by_user_label(self,
+                                bucket_name: str,
+                                user_id: str,
+                                label: str,
+                                local_storage_path: str,
+                                max_workers: Optional[int] = None,
+                                use_cache: bool = True,
+                                subdirectory: Optional[str] = None,
+                                copy_from_cache: bool = False) -> dict:
         """
         Retrieve all files for a given user ID and label, and store them locally.
+        Objects are downloaded concurrently over a shared connection pool, and each download is retried with backoff.
+        Objects whose ETag is already in the local dataset cache are hardlinked or copied from it instead of being fetched
+        again.
 
         :param bucket_name: Name of the Minio bucket.
         :param user_id: User ID as part of the object path.
         :param label: Label as part of the object path.
         :param local_storage_path: Base local path to store the retrieved files.
+        :param max_workers: Number of parallel downloads. Defaults to the client's pool size.
+        :param use_cache: Whether to serve objects from the dataset cache.
+        :param subdirectory: Optional folder under the label to retrieve instead of every object of the label.
+        :param copy_from_cache: Whether cached objects are copied rather than hardlinked. Enable it for files that are
+                                modified in place, which would otherwise modify the cache entry as well.
+        :return: A summary with the number of files, the retrieved and downloaded bytes, the cache hits,
+                 the elapsed seconds and the throughput.
         """
+        start_time = time.perf_counter()
 
         prefix = f"{user_id}/{label}/"
-        objects = self.client.list_objects(bucket_name, prefix=prefix, recursive=True)
+        if subdirectory:
+            prefix = f"{prefix}{subdirectory.strip('/')}/"
+        objects = [obj for obj in self.client.list_objects(bucket_name, prefix=prefix, recursive=True) if not obj.is_dir]
+
+        cache = self.cache if use_cache else None
 
-        for obj in objects:
+        def download(obj) -> bool:
             local_path = os.path.join(local_storage_path, obj.object_name.replace(prefix, ""))
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            self.client.fget_object(bucket_name, obj.object_name, local_path)
+
+            if cache is None or not obj.etag:
+                self._download_object(bucket_name, obj.object_name, local_path)
+                print(f"Downloaded {obj.object_name} to {local_path}")
+                return False
+
+            cache_key = cache.key(obj.etag, obj.size)
+            if cache.materialize(cache_key, local_path, copy_from_cache):
+                print(f"Served {obj.object_name} from the dataset cache")
+                return True
+
+            staging_path = cache.staging_path(cache_key)
+            self._download_object(bucket_name, obj.object_name, staging_path)
+            cache.commit(cache_key, staging_path)
+            if not cache.materialize(cache_key, local_path, copy_from_cache):
+                self._download_object(bucket_name, obj.object_name, local_path)
             print(f"Downloaded {obj.object_name} to {local_path}")
+            return False
+
+        workers = min(max_workers or self.max_workers, self.max_workers)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            cache_hits = list(executor.map(download, objects))
 
-    def upload_directory(self, bucket_name: str, user_id: str, label: str, directory_path: str) -> None:
+        if cache is not None:
+            cache.evict()
+
+        total_bytes = sum(obj.size or 0 for obj in objects)
+        downloaded_bytes = sum(obj.size or 0 for obj, hit in zip(objects, cache_hits) if not hit)
+        elapsed_seconds = time.perf_counter() - start_time
+        summary = {
+            'files': len(objects),
+            'cache_hits': sum(cache_hits),
+            'bytes': total_bytes,
+            'downloaded_bytes': downloaded_bytes,
+            'seconds': round(elapsed_seconds, 3),
+            'throughput_mb_per_second': round(total_bytes / (1024 * 1024) / elapsed_seconds, 3) if elapsed_seconds > 0 else 0.0
+        }
+        print(f"Retrieved {summary['files']} files ({summary['bytes']} bytes, {summary['cache_hits']} from cache) "
+              f"in {summary['seconds']}s at {summary['throughput_mb_per_second']} MB/s")
+        return summary
+
+    def _download_object(self, bucket_name: str, object_name: str, local_path: str) -> None:
         """
-        Upload all files in a directory to a Minio bucket after clearing existing files in the path,
-        ensuring the bucket and folder structure exist.
+        Download a single object, retrying transient failures with exponential backoff.
+
+        :param bucket_name: Name of the Minio bucket.
+        :param object_name: Full name of the object in the bucket.
+        :param local_path: Local file path to write the object to.
+        """
+        max_retries = MINIO_TRANSFER_CONFIG['max_retries']
+        for attempt in range(max_retries + 1):
+            try:
+                self.client.fget_object(bucket_name, object_name, local_path)
+                return
+            except (ServerError, urllib3.exceptions.HTTPError, OSError) as e:
+                if attempt == max_retries:
+                    raise
+                delay = MINIO_TRANSFER_CONFIG['backoff_factor'] * (2 ** attempt)
+                print(f"Retrying {object_name} in {delay}s after error: {e}")
+                time.sleep(delay)
+
+    def get_object_content(self, bucket_name: str, object_name: str) -> Optional[bytes]:
+        """
+        Read a whole object into memory.
+
+        :param bucket_name: Name of the Minio bucket.
+        :param object_name: Full name of the object in the bucket.
+        :return: The content of the object, or None if the bucket or the object does not exist.
+        """
+        try:
+            response = self.client.get_object(bucket_name, object_name)
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchBucket'):
+                return None
+            raise
+
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def get_object_etag(self, bucket_name: str, object_name: str) -> Optional[str]:
+        """
+        Look up the ETag of an object without downloading it.
+
+        :param bucket_name: Name of the Minio bucket.
+        :param object_name: Full name of the object in the bucket.
+        :return: The ETag without quotes, or None if the bucket or the object does not exist.
+        """
+        try:
+            return (self.client.stat_object(bucket_name, object_name).etag or '').strip('"')
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchBucket'):
+                return None
+            raise
+
+    def download_file(self, bucket_name: str, object_name: str, local_path: str) -> None:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        self._download_object(bucket_name, object_name, local_path)
+        print(f"Downloaded {object_name} to {local_path}")
+
+    def upload_file(self, bucket_name: str, object_name: str, file_path: str) -> str:
+        """
+        Upload a single file, creating the bucket if needed.
+
+        :param bucket_name: Name of the Minio bucket.
+        :param object_name: Full name of the object in the bucket.
+        :param file_path: Path of the local file to upload.
+        :return: The ETag of the uploaded object, without quotes.
+        """
+        if not self.client.bucket_exists(bucket_name):
+            self.client.make_bucket(bucket_name)
+        result = self.client.fput_object(bucket_name, object_name, file_path,
+                                         part_size=MINIO_TRANSFER_CONFIG['multipart_part_size'])
+        print(f"Uploaded {file_path} to {object_name} in bucket {bucket_name}")
+        return (result.etag or '').strip('"')
+
+    def upload_directory(self,
+                         bucket_name: str,
+                         user_id: str,
+                         label: str,
+                         directory_path: str,
+                         max_workers: Optional[int] = None) -> dict:
+        """
+        Synchronize a local directory into a Minio bucket, ensuring the bucket and folder structure exist.
+        Objects that no longer exist locally are removed with a single bulk delete, files whose checksum matches the
+        stored ETag are skipped, and the remaining files are uploaded in parallel, using multipart uploads for large files.
 
         :param bucket_name: Name of the Minio bucket.
         :param user_id: User ID as part of the object path.
         :param label: Label as part of the object path.
         :param directory_path: Path of the local directory to upload.
+        :param max_workers: Number of parallel uploads. Defaults to the client's pool size.
+        :return: A summary with the number of uploaded, skipped and deleted objects and the elapsed seconds.
         """
+        start_time = time.perf_counter()
+
         if not self.client.bucket_exists(bucket_name):
             self.client.make_bucket(bucket_name)
 
         path_prefix = f"{user_id}/{label}/"
 
-        existing_objects = self.client.list_objects(bucket_name, prefix=path_prefix, recursive=True)
-        for obj in existing_objects:
-            self.client.remove_object(bucket_name, obj.object_name)
-            print(f"Deleted {obj.object_name} from bucket {bucket_name}")
+        existing_objects = {obj.object_name: (obj.etag or '').strip('"')
+                            for obj in self.client.list_objects(bucket_name, prefix=path_prefix, recursive=True)
+                            if not obj.is_dir}
 
+        local_files = {}
         for root, _, files in os.walk(directory_path):
             for file in files:
                 file_path = os.path.join(root, file)
                 relative_path = os.path.relpath(file_path, directory_path)
-                object_name = f"{path_prefix}{relative_path.replace(os.path.sep, '/')}"
-                self.client.fput_object(bucket_name, object_name, file_path)
-                print(f"Uploaded {file_path} to {object_name} in bucket {bucket_name}")
+                local_files[f"{path_prefix}{relative_path.replace(os.path.sep, '/')}"] = file_path
+
+        stale_objects = [DeleteObject(object_name) for object_name in existing_objects if object_name not in local_files]
+        if stale_objects:
+            for error in self.client.remove_objects(bucket_name, stale_objects):
+                print(f"Failed to delete {error.name} from bucket {bucket_name}: {error.message}")
+            print(f"Deleted {len(stale_objects)} stale objects from bucket {bucket_name}")
+
+        part_size = MINIO_TRANSFER_CONFIG['multipart_part_size']
+
+        def upload(item) -> bool:
+            object_name, file_path = item
+            existing_etag = existing_objects.get(object_name)
+            if existing_etag and existing_etag == compute_etag(file_path, part_size):
+                print(f"Skipped unchanged {file_path}")
+                return False
+
+            self.client.fput_object(bucket_name, object_name, file_path, part_size=part_size,
+                                    num_parallel_uploads=MINIO_TRANSFER_CONFIG['multipart_parallel_uploads'])
+            print(f"Uploaded {file_path} to {object_name} in bucket {bucket_name}")
+            return True
+
+        workers = min(max_workers or self.max_workers, self.max_workers)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            uploaded = list(executor.map(upload, local_files.items()))
+
+        summary = {
+            'uploaded': sum(uploaded),
+            'skipped': len(uploaded) - sum(uploaded),
+            'deleted': len(stale_objects),
+            'seconds': round(time.perf_counter() - start_time, 3)
+        }
+        print(f"Uploaded {summary['uploaded']} files, skipped {summary['skipped']} unchanged and deleted "
+              f"{summary['deleted']} stale objects in {summary['seconds']}s")
+        return summary
+
+
+def get_shared_client() -> MinioClient:
+    """
+    Return the MinIO client of the current process, creating it on first use.
+
+    :return: A MinioClient shared by every caller in this process.
+    """
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = MinioClient()
+    return _shared_client
+
+
+def compute_etag(file_path: str, part_size: int) -> str:
+    """
+    Compute the ETag MinIO assigns to a file uploaded with the given part size: the MD5 of the content for single-part
+    uploads, or the MD5 of the concatenated part digests followed by the part count for multipart uploads.
+
+    :param file_path: Path of the local file.
+    :param part_size: Part size used for multipart uploads.
+    :return: The expected ETag, without quotes.
+    """
+    part_digests = []
+    with open(file_path, 'rb') as file:
+        while True:
+            chunk = file.read(part_size)
+            if not chunk:
+                break
+            part_digests.append(hashlib.md5(chunk).digest())
 
+    if len(part_digests) <= 1:
+        return part_digests[0].hex() if part_digests else hashlib.md5(b'').hexdigest()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
@@ -1,6 +1,25 @@
+import os
+import tempfile
+
 MINIO_CONFIG = {
     'endpoint': '127.0.0.1:9500',
     'access_key': 'minioadmin',
     'secret_key':  'minioadmin',
     'secure': False
 }
+
+MINIO_TRANSFER_CONFIG = {
+    'max_workers': 8,
+    'max_retries': 3,
+    'backoff_factor': 0.5,
+    'connect_timeout': 10,
+    'read_timeout': 300,
+    'multipart_part_size': 16 * 1024 * 1024,
+    'multipart_parallel_uploads': 4
+}
+
+CACHE_CONFIG = {
+    'enabled': True,
+    'directory': os.path.join(tempfile.gettempdir(), 'modelops_dataset_cache'),
+    'max_bytes': 10 * 1024 ** 3
+}
@@ -0,0 +1,24 @@
+from packages.minio_file_handler.cache import DatasetCache
+
+
+def _cache_object(cache: DatasetCache, content: str) -> str:
+    key = cache.key('"etag"', len(content))
+    staging_path = cache.staging_path(key)
+    with open(staging_path, 'w') as staging_file:
+        staging_file.write(content)
+    cache.commit(key, staging_path)
+    return key
+
+
+def test_copied_objects_can_be_rewritten_in_place(tmp_path):
+    cache = DatasetCache(str(tmp_path / 'cache'))
+    key = _cache_object(cache, 'pid,age\n1,30\n')
+    destination_path = str(tmp_path / 'results' / 'summary.csv')
+
+    assert cache.materialize(key, destination_path, copy=True)
+    with open(destination_path, 'a') as destination_file:
+        destination_file.write('2,40\n')
+
+    with open(cache.entry_path(key)) as entry_file:
+        assert entry_file.read() == 'pid,age\n1,30\n'
+    assert not cache.materialize(cache.key('"other"', 1), destination_path, copy=True)
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+MODEL_REGISTRY_CONFIG = {
+    'bucket_name': 'thesis-models',
+    'directory': os.path.join(tempfile.gettempdir(), 'modelops_model_registry'),
+    'max_loaded_models': 8,
+    'mmap_mode': 'r'
+}
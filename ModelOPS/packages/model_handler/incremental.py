@@ -0,0 +1,110 @@
+import copy
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from packages.data_access import loader
+from packages.minio_file_handler import client
+from packages.model_handler import registry
+from packages.minio_file_handler.config import MINIO_TRANSFER_CONFIG
+from packages.preprocessing.pipeline import PreprocessingPipeline, find_pipeline
+
+
+def file_fingerprints(data_files: List[str]) -> Dict[str, str]:
+    """
+    Fingerprint every data file by its content, so that files already used for training are recognised after they are
+    downloaded again under a new session directory. The raw source files are fingerprinted rather than the processed
+    ones, since these are rebuilt from every raw file in each session and change whenever a file is added.
+
+    :param data_files: Paths of the raw data files, either local or minio:// paths.
+    :return: The fingerprint of every file, keyed by path. Remote files are fingerprinted by their path.
+    """
+    fingerprints = {}
+    for path in data_files:
+        if loader.is_remote_path(path):
+            fingerprints[path] = path
+        else:
+            fingerprints[path] = client.compute_etag(path, MINIO_TRANSFER_CONFIG['multipart_part_size'])
+    return fingerprints
+
+
+def load_previous_model(user_id: str, label: str, engine: str,
+                        target_column: str) -> Tuple[Optional[Any], Optional[dict]]:
+    """
+    Load the model last saved for a user, label and engine, along with its metadata. The model is a copy of the one
+    held by the registry, since warm-starting fits it in place and would otherwise change the model that /predict and
+    later sessions reuse from the in-process cache, even if the grown model is never saved.
+
+    :param user_id: User ID as part of the object path.
+    :param label: Label as part of the object path.
+    :param engine: Name of the model engine, e.g. 'random_forest'.
+    :param target_column: The target the new training run predicts. A model trained for another target is ignored.
+    :return: The model and its metadata, or None for both if there is no model to continue from.
+    """
+    model_registry = registry.get_registry()
+    metadata = model_registry.load_latest_metadata(user_id, label, engine)
+    if metadata is None or metadata.get('target_column') != target_column:
+        return None, None
+
+    model = model_registry.load(user_id, label, engine, metadata['features'])
+    if model is None:
+        return None, None
+    return copy.deepcopy(model), metadata
+
+
+def new_data_files(data_files: List[str], fingerprints: Dict[str, str], metadata: dict) -> List[str]:
+    """
+    Select the data files that the previous model was not trained on.
+    """
+    trained_files = set(metadata.get('trained_files', []))
+    return [path for path in data_files if fingerprints[path] not in trained_files]
+
+
+def model_pipeline(metadata: dict, data_dir: str) -> Optional[PreprocessingPipeline]:
+    """
+    The preprocessing pipeline that maps raw rows to the features a stored model was trained on: the one saved with
+    the model or, for a model saved before pipelines were stored with models, the one found with find_pipeline next
+    to the processed files of the session.
+
+    :param metadata: The metadata saved with the model in the model registry.
+    :param data_dir: The directory of the processed files of the session.
+    :return: The pipeline, or None if the model was trained on the raw columns.
+    """
+    if 'pipeline' in metadata:
+        return PreprocessingPipeline.from_dict(metadata['pipeline']) if metadata['pipeline'] else None
+    return find_pipeline(data_dir)
+
+
+def load_rows(data_files: List[str],
+              features: List[str],
+              target_column: str,
+              pipeline: Optional[PreprocessingPipeline] = None,
+              chunk_size: Optional[int] = None) -> pd.DataFrame:
+    """
+    Load the rows of data files in the feature space of a stored model. Raw rows are transformed with the pipeline of
+    the model, as at prediction time, so that trees added to the model split on features scaled and encoded like those
+    of its stored trees, rather than on statistics fitted again on the data of the session.
+
+    :param data_files: Paths of the data files, either local or minio:// paths.
+    :param features: The features of the model.
+    :param target_column: The name of the target variable column.
+    :param pipeline: The pipeline of the model, see model_pipeline, or None to read files that already hold the
+                     features, such as processed files.
+    :param chunk_size: When set, the files are read in chunks of this many rows.
+    :return: The features and the target column, with missing targets filled with 0.
+    """
+    columns = features + [target_column]
+    read_columns = columns if pipeline is None else list(dict.fromkeys(pipeline.input_columns + [target_column]))
+    if chunk_size:
+        data = loader.read_files_in_chunks(data_files, chunk_size, read_columns)
+    else:
+        data = pd.concat([loader.read_data_file(path) for path in data_files],
+                         ignore_index=True).reindex(columns=read_columns)
+
+    if pipeline is not None:
+        transformed = pipeline.transform(data)
+        if target_column not in transformed.columns:
+            transformed[target_column] = data[target_column]
+        data = transformed
+
+    data = data.reindex(columns=columns)
+    data[target_column] = data[target_column].fillna(0)
+    return data
@@ -0,0 +1,172 @@
+import os
+import json
+import joblib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from packages.minio_file_handler import client
+from packages.model_handler.config import MODEL_REGISTRY_CONFIG
+
+MODEL_FILE_NAME = 'model.joblib'
+METADATA_FILE_NAME = 'metadata.json'
+LATEST_FILE_NAME = 'latest.json'
+ETAG_FILE_NAME = 'model.etag'
+
+ModelKey = Tuple[str, str, str, str]
+
+_shared_registry = None
+
+
+def feature_set_hash(features: List[str]) -> str:
+    """
+    Hash of an ordered list of features, so that models trained on different columns are stored separately.
+    """
+    return hashlib.sha256('\n'.join(features).encode('utf-8')).hexdigest()[:16]
+
+
+class ModelRegistry:
+    """
+    Registry of trained models stored in MinIO under user, label, engine and feature-set hash. Loaded models are kept
+    in a bounded in-memory LRU, checked against the ETag of the stored object, so that repeated retraining and
+    explanation requests skip both the download and the deserialization. Models missing from the LRU are loaded from a
+    local copy with memory-mapped arrays.
+    """
+
+    def __init__(self,
+                 bucket_name: Optional[str] = None,
+                 directory: Optional[str] = None,
+                 max_loaded_models: Optional[int] = None,
+                 mmap_mode: Optional[str] = None):
+        self.bucket_name = bucket_name or MODEL_REGISTRY_CONFIG['bucket_name']
+        self.directory = directory or MODEL_REGISTRY_CONFIG['directory']
+        self.max_loaded_models = max_loaded_models or MODEL_REGISTRY_CONFIG['max_loaded_models']
+        self.mmap_mode = mmap_mode if mmap_mode is not None else MODEL_REGISTRY_CONFIG['mmap_mode']
+        self.loaded_models: 'OrderedDict[ModelKey, Tuple[str, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def save(self, user_id: str, label: str, engine: str, features: List[str], model: Any,
+             metadata: Optional[dict] = None) -> str:
+        """
+        Store a trained model and keep it loaded.
+
+        :param user_id: User ID as part of the object path.
+        :param label: Label as part of the object path.
+        :param engine: Name of the model engine, e.g. 'random_forest'.
+        :param features: The ordered features the model was trained on.
+        :param model: The trained model.
+        :param metadata: Optional JSON-serializable details stored next to the model.
+        :return: The name of the stored model object.
+        """
+        key = (user_id, label, engine, feature_set_hash(features))
+        local_directory = self._local_directory(key)
+        os.makedirs(local_directory, exist_ok=True)
+
+        # Compressed dumps cannot be memory-mapped, so the model is written uncompressed. The file is replaced rather
+        # than overwritten, since models loaded earlier may still map the previous one
+        model_path = os.path.join(local_directory, MODEL_FILE_NAME)
+        joblib.dump(model, f"{model_path}.tmp")
+        os.replace(f"{model_path}.tmp", model_path)
+        metadata_path = os.path.join(local_directory, METADATA_FILE_NAME)
+        with open(metadata_path, 'w') as file:
+            json.dump({**(metadata or {}), 'engine': engine, 'features': features}, file)
+
+        minio_client = client.get_shared_client()
+        object_prefix = self._object_prefix(key)
+        minio_client.upload_file(self.bucket_name, f"{object_prefix}/{METADATA_FILE_NAME}", metadata_path)
+        etag = minio_client.upload_file(self.bucket_name, f"{object_prefix}/{MODEL_FILE_NAME}", model_path)
+        minio_client.upload_file(self.bucket_name, f"{user_id}/{label}/{engine}/{LATEST_FILE_NAME}", metadata_path)
+        self._write_local_etag(key, etag)
+
+        with self.lock:
+            self.loaded_models[key] = (etag, model)
+            self._evict()
+        return f"{object_prefix}/{MODEL_FILE_NAME}"
+
+    def load(self, user_id: str, label: str, engine: str, features: List[str]) -> Optional[Any]:
+        """
+        Return the stored model for a user, label, engine and feature set.
+
+        :param user_id: User ID as part of the object path.
+        :param label: Label as part of the object path.
+        :param engine: Name of the model engine, e.g. 'random_forest'.
+        :param features: The ordered features the model was trained on.
+        :return: The model, or None if no model was stored for this key.
+        """
+        key = (user_id, label, engine, feature_set_hash(features))
+        minio_client = client.get_shared_client()
+        object_name = f"{self._object_prefix(key)}/{MODEL_FILE_NAME}"
+
+        etag = minio_client.get_object_etag(self.bucket_name, object_name)
+        with self.lock:
+            if etag is None:
+                self.loaded_models.pop(key, None)
+                return None
+            entry = self.loaded_models.get(key)
+            if entry is not None and entry[0] == etag:
+                self.loaded_models.move_to_end(key)
+                print(f"Reused model {object_name} from memory")
+                return entry[1]
+
+        model_path = os.path.join(self._local_directory(key), MODEL_FILE_NAME)
+        if self._read_local_etag(key) != etag or not os.path.exists(model_path):
+            minio_client.download_file(self.bucket_name, object_name, f"{model_path}.tmp")
+            os.replace(f"{model_path}.tmp", model_path)
+            self._write_local_etag(key, etag)
+
+        model = joblib.load(model_path, mmap_mode=self.mmap_mode)
+        print(f"Loaded model {object_name}")
+        with self.lock:
+            self.loaded_models[key] = (etag, model)
+            self._evict()
+        return model
+
+    def load_metadata(self, user_id: str, label: str, engine: str, features: List[str]) -> Optional[dict]:
+        key = (user_id, label, engine, feature_set_hash(features))
+        content = client.get_shared_client().get_object_content(self.bucket_name,
+                                                                f"{self._object_prefix(key)}/{METADATA_FILE_NAME}")
+        return json.loads(content) if content is not None else None
+
+    def load_latest_metadata(self, user_id: str, label: str, engine: str) -> Optional[dict]:
+        """
+        Return the metadata of the model saved last for a user, label and engine, whatever its features.
+
+        :param user_id: User ID as part of the object path.
+        :param label: Label as part of the object path.
+        :param engine: Name of the model engine, e.g. 'random_forest'.
+        :return: The metadata, including the features of the model, or None if no model was saved.
+        """
+        content = client.get_shared_client().get_object_content(self.bucket_name,
+                                                                f"{user_id}/{label}/{engine}/{LATEST_FILE_NAME}")
+        return json.loads(content) if content is not None else None
+
+    def _evict(self) -> None:
+        while len(self.loaded_models) > self.max_loaded_models:
+            self.loaded_models.popitem(last=False)
+
+    def _object_prefix(self, key: ModelKey) -> str:
+        return '/'.join(key)
+
+    def _local_directory(self, key: ModelKey) -> str:
+        return os.path.join(self.directory, *key)
+
+    def _read_local_etag(self, key: ModelKey) -> Optional[str]:
+        try:
+            with open(os.path.join(self._local_directory(key), ETAG_FILE_NAME)) as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    def _write_local_etag(self, key: ModelKey, etag: str) -> None:
+        with open(os.path.join(self._local_directory(key), ETAG_FILE_NAME), 'w') as file:
+            file.write(etag)
+
+
+def get_registry() -> ModelRegistry:
+    """
+    Return the model registry of the current process, creating it on first use.
+    """
+    global _shared_registry
+    if _shared_registry is None:
+        _shared_registry = ModelRegistry()
+    return _shared_registry
@@ -0,0 +1,60 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from packages.minio_file_handler import client
+from packages.model_handler import incremental, registry
+
+
+class _DirectoryClient:
+    """
+    Stands in for the MinIO client, with buckets as local directories.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def upload_file(self, bucket_name, object_name, file_path):
+        destination = os.path.join(self.directory, bucket_name, object_name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copy(file_path, destination)
+        return self.get_object_etag(bucket_name, object_name)
+
+    def get_object_etag(self, bucket_name, object_name):
+        path = os.path.join(self.directory, bucket_name, object_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as file:
+            return hashlib.md5(file.read()).hexdigest()
+
+    def get_object_content(self, bucket_name, object_name):
+        path = os.path.join(self.directory, bucket_name, object_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def download_file(self, bucket_name, object_name, file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        shutil.copy(os.path.join(self.directory, bucket_name, object_name), file_path)
+
+
+def test_warm_start_leaves_the_cached_model_unchanged(tmp_path, monkeypatch):
+    minio_client = _DirectoryClient(str(tmp_path / 'minio'))
+    monkeypatch.setattr(client, 'get_shared_client', lambda: minio_client)
+    monkeypatch.setattr(registry, '_shared_registry', registry.ModelRegistry(directory=str(tmp_path / 'models')))
+
+    rng = np.random.default_rng(0)
+    features, targets = rng.normal(size=(200, 2)), rng.integers(0, 2, 200)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(features, targets)
+    registry.get_registry().save('user', 'label', 'random_forest', ['a', 'b'], model, {'target_column': 'target'})
+
+    previous_model, metadata = incremental.load_previous_model('user', 'label', 'random_forest', 'target')
+    previous_model.set_params(warm_start=True, n_estimators=15)
+    previous_model.fit(features, targets)
+
+    cached_model = registry.get_registry().load('user', 'label', 'random_forest', ['a', 'b'])
+    assert len(previous_model.estimators_) == 15
+    assert len(cached_model.estimators_) == 10 and not cached_model.warm_start
+    assert metadata['features'] == ['a', 'b']
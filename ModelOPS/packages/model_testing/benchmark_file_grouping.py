@@ -0,0 +1,60 @@
+import time
+import random
+import string
+from typing import List
+from fuzzywuzzy import fuzz
+from packages.preprocessing.merge import find_similar_files
+
+
+def find_similar_files_pairwise(file_names: List[str], threshold: int = 85) -> List[List[str]]:
+    """
+    The pairwise grouping find_similar_files replaced, kept as the reference for the benchmark.
+    """
+    file_names = list(file_names)
+    similar_groups = []
+    while file_names:
+        base = file_names.pop(0)
+        group = [base]
+        for other in file_names[:]:
+            if fuzz.ratio(base, other) > threshold:
+                group.append(other)
+                file_names.remove(other)
+        similar_groups.append(group)
+    return similar_groups
+
+
+def generate_file_names(file_count: int, study_count: int = 1000, seed: int = 42) -> List[str]:
+    """
+    Per-visit exports of many studies, e.g. 'qhzbtwm_visit_07_labs.csv', in random order.
+    """
+    rng = random.Random(seed)
+    kinds = ['labs', 'vitals', 'medication', 'diagnoses']
+    studies = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+               for _ in range(study_count)]
+    file_names = set()
+    while len(file_names) < file_count:
+        file_names.add(f"{rng.choice(studies)}_visit_{rng.randrange(40):02d}_{rng.choice(kinds)}.csv")
+    file_names = sorted(file_names)
+    rng.shuffle(file_names)
+    return file_names
+
+
+def benchmark_file_grouping(file_count: int = 10000, reference_count: int = 1000) -> None:
+    file_names = generate_file_names(file_count)
+
+    start = time.perf_counter()
+    groups = find_similar_files(file_names)
+    print(f"Indexed grouping of {file_count} filenames: {len(groups)} groups in {time.perf_counter() - start:.2f}s")
+
+    sample = file_names[:reference_count]
+    start = time.perf_counter()
+    reference_groups = find_similar_files_pairwise(sample)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed_groups = find_similar_files(sample)
+    indexed_seconds = time.perf_counter() - start
+    print(f"{reference_count} filenames: pairwise {reference_seconds:.2f}s, indexed {indexed_seconds:.2f}s, "
+          f"same groups: {indexed_groups == reference_groups}")
+
+
+benchmark_file_grouping()
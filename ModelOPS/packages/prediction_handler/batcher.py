@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import numpy as np
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from packages.prediction_handler.config import PREDICTION_CONFIG
+
+
+class MicroBatcher:
+    """
+    Groups the rows of concurrent requests for the same model into one batch, so that the model scores them with a
+    single vectorized call. A batch is scored once it holds max_batch_rows rows or once its first request has waited
+    max_wait_seconds, on a thread pool that keeps the event loop free.
+    """
+
+    def __init__(self,
+                 batch_function: Callable[[Hashable, pd.DataFrame], np.ndarray],
+                 max_batch_rows: Optional[int] = None,
+                 max_wait_seconds: Optional[float] = None,
+                 max_workers: Optional[int] = None):
+        self.batch_function = batch_function
+        self.max_batch_rows = max_batch_rows or PREDICTION_CONFIG['max_batch_rows']
+        self.max_wait_seconds = max_wait_seconds if max_wait_seconds is not None \
+            else PREDICTION_CONFIG['max_wait_seconds']
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or PREDICTION_CONFIG['max_workers'])
+        self.pending: Dict[Hashable, List[Tuple[pd.DataFrame, asyncio.Future]]] = {}
+        self.pending_rows: Dict[Hashable, int] = {}
+        self.timers: Dict[Hashable, asyncio.TimerHandle] = {}
+
+    async def submit(self, key: Hashable, rows: pd.DataFrame) -> np.ndarray:
+        """
+        Queue rows to be scored by the model of a key.
+
+        :param key: Identifies the model; only rows of the same key are batched together.
+        :param rows: The rows of one request.
+        :return: The output of the batch function for these rows.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.setdefault(key, []).append((rows, future))
+        self.pending_rows[key] = self.pending_rows.get(key, 0) + len(rows)
+
+        if self.pending_rows[key] >= self.max_batch_rows:
+            self._flush(key)
+        elif key not in self.timers:
+            self.timers[key] = loop.call_later(self.max_wait_seconds, self._flush, key)
+        return await future
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(key, [])
+        self.pending_rows.pop(key, None)
+        if batch:
+            asyncio.get_running_loop().create_task(self._score(key, batch))
+
+    async def _score(self, key: Hashable, batch: List[Tuple[pd.DataFrame, asyncio.Future]]) -> None:
+        frames = [rows for rows, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.batch_function, key, pd.concat(frames, ignore_index=True))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        start = 0
+        for rows, future in batch:
+            if not future.done():
+                future.set_result(results[start:start + len(rows)])
+            start += len(rows)
+
+
+class LatencyTracker:
+    """
+    Keeps the latencies of the most recent requests and reports their percentiles.
+    """
+
+    def __init__(self, window: Optional[int] = None):
+        self.latencies = deque(maxlen=window or PREDICTION_CONFIG['latency_window'])
+        self.rows = deque(maxlen=window or PREDICTION_CONFIG['latency_window'])
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, row_count: int) -> None:
+        with self.lock:
+            self.latencies.append(seconds)
+            self.rows.append(row_count)
+
+    def summary(self) -> dict:
+        with self.lock:
+            latencies = np.array(self.latencies)
+            row_count = int(sum(self.rows))
+        if not len(latencies):
+            return {"requests": 0, "rows": 0, "p50_ms": None, "p99_ms": None}
+
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        return {"requests": len(latencies), "rows": row_count, "p50_ms": round(float(p50), 2),
+                "p99_ms": round(float(p99), 2)}
@@ -0,0 +1,9 @@
+import os
+
+PREDICTION_CONFIG = {
+    'max_batch_rows': 4096,
+    'max_wait_seconds': 0.005,
+    'max_workers': os.cpu_count() or 1,
+    'model_refresh_seconds': 30,
+    'latency_window': 10000
+}
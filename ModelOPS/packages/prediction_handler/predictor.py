@@ -0,0 +1,105 @@
+import time
+import shap
+import weakref
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Any, Dict, List, Optional, Tuple
+from packages.model_handler import registry
+from packages.preprocessing.pipeline import PreprocessingPipeline
+from packages.prediction_handler.config import PREDICTION_CONFIG
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+ModelKey = Tuple[str, str, str]
+
+_loaded_models: Dict[ModelKey, Tuple[float, Any, List[str], Optional[PreprocessingPipeline]]] = {}
+_explainers = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def load_model(key: ModelKey) -> Optional[Tuple[Any, List[str], Optional[PreprocessingPipeline]]]:
+    """
+    Return the model saved last for a user, label and engine, the features it was trained on and the preprocessing
+    pipeline of its training data. The model is taken from the model registry and checked again for a newer version
+    only every model_refresh_seconds, so that batches do not wait on MinIO.
+
+    :param key: The user ID, label and engine of the model.
+    :return: The model, its features and its pipeline, or None if no model was saved for this key. The pipeline is
+             None for models trained on files that were not preprocessed.
+    """
+    with _lock:
+        entry = _loaded_models.get(key)
+    if entry is not None and time.monotonic() - entry[0] < PREDICTION_CONFIG['model_refresh_seconds']:
+        return entry[1], entry[2], entry[3]
+
+    model_registry = registry.get_registry()
+    metadata = model_registry.load_latest_metadata(*key)
+    model = model_registry.load(*key, metadata['features']) if metadata is not None else None
+    with _lock:
+        if model is None:
+            _loaded_models.pop(key, None)
+            return None
+        pipeline = PreprocessingPipeline.from_dict(metadata['pipeline']) if metadata.get('pipeline') else None
+        _loaded_models[key] = (time.monotonic(), model, metadata['features'], pipeline)
+    return model, metadata['features'], pipeline
+
+
+def read_arrow_rows(body: bytes) -> pd.DataFrame:
+    """
+    Read the rows of an Arrow IPC stream.
+    """
+    return pa.ipc.open_stream(body).read_all().to_pandas()
+
+
+def prepare_rows(rows: pd.DataFrame, features: List[str],
+                 pipeline: Optional[PreprocessingPipeline] = None) -> pd.DataFrame:
+    """
+    Arrange incoming rows as the feature matrix of a model: the features in training order, missing features as NaN
+    and every value as float32, the precision the tree models predict with.
+
+    :param rows: The rows to score, holding at least the features of the model.
+    :param features: The features the model was trained on.
+    :param pipeline: The preprocessing pipeline of the training data. When given, the rows hold raw values, as in the
+                     uploaded files, and are encoded and scaled by it first.
+    :return: The feature matrix.
+    """
+    if pipeline is not None:
+        rows = pipeline.transform(rows)
+    prepared = rows.reindex(columns=features)
+    for column in features:
+        if not pd.api.types.is_numeric_dtype(prepared[column]):
+            prepared[column] = pd.to_numeric(prepared[column], errors='coerce')
+    return prepared.astype(np.float32)
+
+
+def predict_probabilities(key: ModelKey, rows: pd.DataFrame) -> np.ndarray:
+    """
+    Class probabilities of a batch of rows, in the order of the model's classes.
+    """
+    model, features, pipeline = load_model(key)
+    return model.predict_proba(prepare_rows(rows, features, pipeline))
+
+
+def explain_rows(key: ModelKey, rows: pd.DataFrame, class_positions: np.ndarray) -> np.ndarray:
+    """
+    SHAP contributions of every feature to the predicted class of each row.
+
+    :param key: The user ID, label and engine of the model.
+    :param rows: The rows to explain.
+    :param class_positions: Position of the predicted class of each row among the model's classes.
+    :return: The contributions, of shape (rows, features).
+    """
+    model, features, pipeline = load_model(key)
+    with _lock:
+        explainer = _explainers.get(model)
+        if explainer is None:
+            explainer = _explainers[model] = shap.TreeExplainer(model)
+
+    shap_values = explainer.shap_values(prepare_rows(rows, features, pipeline))
+    if isinstance(shap_values, list):
+        shap_values = np.stack(shap_values, axis=-1)
+    if shap_values.ndim == 3:
+        shap_values = shap_values[np.arange(len(shap_values)), :, class_positions]
+    return shap_values
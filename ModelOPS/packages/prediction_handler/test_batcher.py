@@ -0,0 +1,80 @@
+import time
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from packages.prediction_handler.batcher import LatencyTracker, MicroBatcher
+
+
+class _RecordingModel:
+    """
+    Batch function that scores every row by its value and records the batches it is called with.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, key, rows: pd.DataFrame) -> np.ndarray:
+        self.batches.append((key, rows['value'].tolist()))
+        if key == 'broken':
+            raise ValueError('model failed')
+        return rows['value'].to_numpy() * 10
+
+
+def _rows(*values) -> pd.DataFrame:
+    return pd.DataFrame({'value': list(values)})
+
+
+def _run(batcher: MicroBatcher, *requests):
+    async def submit_all():
+        return await asyncio.gather(*[batcher.submit(key, rows) for key, rows in requests], return_exceptions=True)
+
+    try:
+        return asyncio.run(submit_all())
+    finally:
+        batcher.shutdown()
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    model = _RecordingModel()
+    batcher = MicroBatcher(model, max_batch_rows=100, max_wait_seconds=0.05)
+
+    results = _run(batcher, ('a', _rows(1, 2)), ('b', _rows(3)), ('a', _rows(4, 5, 6)))
+
+    assert [result.tolist() for result in results] == [[10, 20], [30], [40, 50, 60]]
+    assert sorted(model.batches) == [('a', [1, 2, 4, 5, 6]), ('b', [3])]
+    assert not batcher.pending and not batcher.timers
+
+
+def test_full_batch_is_scored_without_waiting():
+    model = _RecordingModel()
+    batcher = MicroBatcher(model, max_batch_rows=3, max_wait_seconds=60)
+
+    start = time.perf_counter()
+    results = _run(batcher, ('a', _rows(1, 2)), ('a', _rows(3)))
+
+    assert time.perf_counter() - start < 10
+    assert [result.tolist() for result in results] == [[10, 20], [30]]
+    assert model.batches == [('a', [1, 2, 3])]
+
+
+def test_failed_batch_fails_each_of_its_requests():
+    model = _RecordingModel()
+    batcher = MicroBatcher(model, max_batch_rows=100, max_wait_seconds=0.01)
+
+    results = _run(batcher, ('broken', _rows(1)), ('broken', _rows(2)), ('a', _rows(3)))
+
+    assert all(isinstance(result, ValueError) for result in results[:2])
+    assert results[2].tolist() == [30]
+
+
+def test_latency_percentiles():
+    tracker = LatencyTracker(window=3)
+    assert tracker.summary()['requests'] == 0
+
+    for seconds in [0.5, 0.001, 0.002, 0.003]:
+        tracker.record(seconds, 2)
+
+    summary = tracker.summary()
+    assert summary['requests'] == 3 and summary['rows'] == 6
+    assert summary['p50_ms'] == pytest.approx(2.0) and summary['p99_ms'] == pytest.approx(2.98)
@@ -0,0 +1,242 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+from typing import Dict, List, Optional
+from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from packages.data_access import loader
+from packages.data_access.dedup import RowDeduplicator
+from packages.data_access.schema import NUMERIC_DTYPES, INTEGER_DTYPES
+from packages.preprocessing.pipeline import PreprocessingPipeline
+
+
+def preprocess_file_in_chunks(file_path: str,
+                              output_file_path: str,
+                              patient_identifier: str,
+                              encode_method: str,
+                              scale_method: str,
+                              row_threshold: float,
+                              column_threshold: float,
+                              exclude_columns: List[str],
+                              chunk_size: int) -> PreprocessingPipeline:
+    """
+    Cleans, encodes and scales a CSV file while holding at most one chunk of rows in memory.
+    The file is read several times: once to collect missing value counts and column types, once to collect the
+    statistics used for outlier removal, once to filter and deduplicate the rows into a temporary file, and twice
+    over that file to fit the scaler and write the scaled output.
+    The steps follow clean_dataset, one_hot_encode_columns, label_encode_columns, standardize_columns and
+    min_max_scale_columns, using statistics aggregated over the whole file instead of a single DataFrame.
+
+    :param file_path: Path of the merged CSV file to process.
+    :param output_file_path: Path where the processed Parquet file will be written.
+    :param patient_identifier: Column name for the patient identifier that must not be altered or removed.
+    :param encode_method: One of 'one_hot_encoding', 'sparse_one_hot_encoding', 'label_encoding' or 'none'. The sparse
+                          one-hot columns are written next to the Parquet file as a CSR matrix, see
+                          loader.write_sparse_block.
+    :param scale_method: One of 'standardize' or 'min_max'.
+    :param row_threshold: Proportion threshold for missing values in rows to be removed.
+    :param column_threshold: Proportion threshold for missing values in columns to be removed.
+    :param exclude_columns: Columns to be excluded from being altered.
+    :param chunk_size: Number of rows read at a time.
+    :return: The fitted preprocessing pipeline of the file.
+    """
+    if patient_identifier not in exclude_columns:
+        exclude_columns.append(patient_identifier)
+
+    row_count, null_counts, numeric_columns, integer_columns = _collect_column_statistics(file_path, chunk_size)
+
+    col_missing_proportion = null_counts / max(row_count, 1)
+    columns_to_drop = col_missing_proportion[
+        (col_missing_proportion > column_threshold) & (~col_missing_proportion.index.isin(exclude_columns))].index
+    kept_columns = [column for column in null_counts.index if column not in columns_to_drop]
+    text_columns = [column for column in kept_columns if column not in numeric_columns]
+    outlier_columns = [column for column in kept_columns if column in numeric_columns and column not in exclude_columns]
+    float_columns = [column for column in kept_columns if column in numeric_columns and column not in integer_columns]
+    read_options = {'usecols': kept_columns, 'dtype': {column: object for column in text_columns}}
+    pipeline = PreprocessingPipeline()
+    pipeline.record_columns(kept_columns, columns_to_drop)
+
+    outlier_moments = _collect_outlier_moments(file_path, chunk_size, read_options, kept_columns, outlier_columns,
+                                               row_threshold)
+
+    filtered_file_path = f"{output_file_path}.filtered"
+    categories = _filter_rows(file_path, filtered_file_path, chunk_size, read_options, kept_columns, outlier_columns,
+                              outlier_moments, row_threshold, [column for column in text_columns if column not in exclude_columns])
+
+    try:
+        filtered_options = {'dtype': {column: object for column in text_columns}}
+        scaler = StandardScaler() if scale_method == 'standardize' else MinMaxScaler()
+        scaled_columns = None
+        for chunk in loader.iter_csv_chunks(filtered_file_path, chunk_size, **filtered_options):
+            encoded_chunk = _encode_chunk(chunk, encode_method, categories)
+            scaled_columns = _scaled_columns(encoded_chunk, exclude_columns)
+            if scaled_columns:
+                scaler.partial_fit(encoded_chunk[scaled_columns])
+
+        for column, values in categories.items():
+            if encode_method == 'label_encoding':
+                pipeline.record_label_encoding(column, values)
+            elif encode_method in ('one_hot_encoding', 'sparse_one_hot_encoding'):
+                pipeline.record_one_hot_encoding(column, values)
+        if scaled_columns:
+            pipeline.record_scaling(scale_method, scaled_columns, scaler)
+
+        writer = None
+        sparse_blocks = []
+        sparse_columns = []
+        try:
+            for chunk in loader.iter_csv_chunks(filtered_file_path, chunk_size, **filtered_options):
+                encoded_chunk = _encode_chunk(chunk, encode_method, categories)
+                if scaled_columns:
+                    encoded_chunk[scaled_columns] = scaler.transform(encoded_chunk[scaled_columns])
+                pipeline.columns = encoded_chunk.columns.tolist()
+
+                sparse_columns = [column for column in encoded_chunk.columns
+                                  if isinstance(encoded_chunk[column].dtype, pd.SparseDtype)]
+                if sparse_columns:
+                    sparse_blocks.append(encoded_chunk[sparse_columns].sparse.to_coo().tocsr())
+                    encoded_chunk = encoded_chunk.drop(columns=sparse_columns)
+
+                table = _to_arrow_table(encoded_chunk, float_columns, writer.schema if writer else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_file_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if sparse_blocks:
+            loader.write_sparse_block(loader.sparse_block_path(output_file_path), sp.vstack(sparse_blocks).tocsr(),
+                                      sparse_columns, pipeline.columns)
+    finally:
+        os.remove(filtered_file_path)
+    return pipeline
+
+
+def _collect_column_statistics(file_path: str, chunk_size: int):
+    row_count = 0
+    null_counts = None
+    non_numeric_columns = set()
+    non_integer_columns = set()
+
+    for chunk in loader.iter_csv_chunks(file_path, chunk_size):
+        row_count += len(chunk)
+        chunk_null_counts = chunk.isnull().sum()
+        null_counts = chunk_null_counts if null_counts is None else null_counts.add(chunk_null_counts, fill_value=0)
+        non_numeric_columns.update(chunk.select_dtypes(exclude=NUMERIC_DTYPES).columns)
+        non_integer_columns.update(chunk.select_dtypes(exclude=INTEGER_DTYPES).columns)
+
+    if null_counts is None:
+        null_counts = pd.Series(dtype='int64', index=loader.read_header(file_path))
+    numeric_columns = [column for column in null_counts.index if column not in non_numeric_columns]
+    integer_columns = [column for column in null_counts.index if column not in non_integer_columns]
+    return row_count, null_counts, numeric_columns, integer_columns
+
+
+def _row_mask(chunk: pd.DataFrame, row_threshold: float) -> pd.Series:
+    return chunk.isnull().mean(axis=1) <= row_threshold
+
+
+def _collect_outlier_moments(file_path: str, chunk_size: int, read_options: dict, kept_columns: List[str],
+                             outlier_columns: List[str], row_threshold: float) -> Dict[str, np.ndarray]:
+    count = 0
+    mean = np.zeros(len(outlier_columns))
+    m2 = np.zeros(len(outlier_columns))
+    has_null = np.zeros(len(outlier_columns), dtype=bool)
+
+    for chunk in loader.iter_csv_chunks(file_path, chunk_size, **read_options):
+        chunk = chunk[kept_columns][_row_mask(chunk[kept_columns], row_threshold)]
+        if chunk.empty or not outlier_columns:
+            continue
+
+        values = chunk[outlier_columns].to_numpy(dtype=np.float64)
+        has_null |= np.isnan(values).any(axis=0)
+
+        chunk_count = len(values)
+        chunk_mean = np.nanmean(values, axis=0)
+        chunk_m2 = np.nansum((values - chunk_mean) ** 2, axis=0)
+
+        total_count = count + chunk_count
+        delta = chunk_mean - mean
+        mean = mean + delta * chunk_count / total_count
+        m2 = m2 + chunk_m2 + delta ** 2 * count * chunk_count / total_count
+        count = total_count
+
+    std = np.sqrt(m2 / count) if count else np.zeros(len(outlier_columns))
+    return {'mean': mean, 'std': std, 'has_null': has_null}
+
+
+def _filter_rows(file_path: str, filtered_file_path: str, chunk_size: int, read_options: dict,
+                 kept_columns: List[str], outlier_columns: List[str], outlier_moments: Dict[str, np.ndarray],
+                 row_threshold: float, categorical_columns: List[str]) -> Dict[str, List[str]]:
+    deduplicator = RowDeduplicator()
+    categories = {column: set() for column in categorical_columns}
+    write_header = True
+
+    with open(filtered_file_path, 'w', newline='') as filtered_file:
+        for chunk in loader.iter_csv_chunks(file_path, chunk_size, **read_options):
+            chunk = chunk[kept_columns][_row_mask(chunk[kept_columns], row_threshold)]
+
+            if outlier_columns:
+                values = chunk[outlier_columns].to_numpy(dtype=np.float64)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    z_scores = (values - outlier_moments['mean']) / outlier_moments['std']
+                # scipy's zscore propagates a single missing value to the whole column, so such columns reject every row
+                z_scores[:, outlier_moments['has_null']] = np.nan
+                chunk = chunk[(np.abs(z_scores) < 3.0).all(axis=1)]
+
+            chunk = deduplicator.drop_duplicates(chunk)
+
+            for column in categorical_columns:
+                categories[column].update(chunk[column].dropna().unique())
+
+            chunk.to_csv(filtered_file, index=False, header=write_header)
+            write_header = False
+
+    return {column: sorted(values) for column, values in categories.items()}
+
+
+def _encode_chunk(chunk: pd.DataFrame, encode_method: str, categories: Dict[str, List[str]]) -> pd.DataFrame:
+    if encode_method == 'label_encoding':
+        for column, values in categories.items():
+            chunk[column] = pd.Categorical(chunk[column], categories=values).codes.astype(np.int64)
+        return chunk
+
+    if encode_method in ('one_hot_encoding', 'sparse_one_hot_encoding') and categories:
+        encoded_columns = []
+        for column, values in categories.items():
+            encoded = pd.get_dummies(pd.Categorical(chunk[column], categories=values), prefix=column, dtype=np.float64,
+                                     sparse=encode_method == 'sparse_one_hot_encoding')
+            encoded.index = chunk.index
+            encoded_columns.append(encoded)
+        chunk = chunk.drop(columns=list(categories))
+        return pd.concat([chunk] + encoded_columns, axis=1)
+
+    return chunk
+
+
+def _to_arrow_table(chunk: pd.DataFrame, float_columns: List[str], schema: Optional[pa.Schema]) -> pa.Table:
+    """
+    Converts a processed chunk into an Arrow table with the same schema for every chunk of the file. Columns that hold
+    floating point values somewhere in the file are written as float64 even when a chunk only holds integers, and
+    integer columns as int64, since the compact integer type a chunk is read with depends on its range.
+    """
+    for column in float_columns:
+        if column in chunk.columns:
+            chunk[column] = chunk[column].astype(np.float64)
+    for column in chunk.select_dtypes(include=INTEGER_DTYPES).columns:
+        chunk[column] = chunk[column].astype(np.int64)
+
+    if schema is None:
+        schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+        schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                            for field in schema], metadata=schema.metadata)
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def _scaled_columns(chunk: pd.DataFrame, exclude_columns: List[str]) -> List[str]:
+    # As in scale.py, sparse one-hot columns are left unscaled so that they stay sparse
+    return [column for column in chunk.select_dtypes(include=NUMERIC_DTYPES).columns
+            if column not in exclude_columns and not isinstance(chunk[column].dtype, pd.SparseDtype)]
@@ -4,6 +4,7 @@ import pandas as pd
 from scipy.stats import zscore
 from typing import List, Optional
 from sklearn.impute import SimpleImputer
+from packages.data_access.schema import NUMERIC_DTYPES
 
 
 def remove_data_based_on_threshold(data_frame: pd.DataFrame,
@@ -57,7 +58,7 @@ def remove_outliers(data_frame: pd.DataFrame,
         if exclude_columns is None:
             exclude_columns = []
 
-        numerical_columns = [col for col in data_frame.select_dtypes(include=['float64', 'int64']).columns if
+        numerical_columns = [col for col in data_frame.select_dtypes(include=NUMERIC_DTYPES).columns if
                              col not in exclude_columns]
         if len(numerical_columns) == 0:
             return data_frame
@@ -120,24 +121,103 @@ def clean_dataset(data_frame: pd.DataFrame,
     Cleans the dataset by performing several preprocessing steps:
     1. Removes rows and columns based on specified missing value thresholds, while preserving specified columns.
     2. Removes outliers based on the Z-score for numerical columns, excluding specified columns.
-    3. Standardizes text columns to lower case and trims leading/trailing whitespaces, excluding specified columns.
-    4. Removes duplicate rows from the DataFrame.
+    3. Removes duplicate rows from the DataFrame.
 
-    This process ensures that the dataset is cleaned thoroughly while preserving the integrity of key columns, such as patient identifiers.
+    The steps give the same result as remove_data_based_on_threshold, remove_outliers and remove_duplicate_rows applied
+    one after the other, but are fused into a single pass: the null mask is computed once, the column drop, row drop
+    and Z-score mask are derived from it with NumPy, and the cleaned DataFrame is copied out of the input only once.
 
     :param data_frame: The pandas DataFrame to be cleaned.
     :param patient_identifier: The column name for the patient identifier that must not be altered or removed.
     :param row_threshold: The proportion threshold for missing values in rows to be removed. Rows with a higher proportion of missing values are dropped.
     :param column_threshold: The proportion threshold for missing values in columns to be removed. Columns with a higher proportion of missing values are dropped.
-    :param key_columns: A list of columns to be excluded from being altered during the cleaning process, including from outlier removal, text standardization, and the missing value threshold checks. The patient identifier column is automatically preserved.
+    :param key_columns: A list of columns to be excluded from being altered during the cleaning process, including from outlier removal and the missing value threshold checks. The patient identifier column is automatically preserved.
     :return: A cleaned pandas DataFrame.
     """
-    if key_columns is None:
-        key_columns = []
+    exclude_columns = list(key_columns or [])
+    if patient_identifier not in exclude_columns:
+        exclude_columns.append(patient_identifier)
 
-    data_frame_cleaned = remove_data_based_on_threshold(data_frame, patient_identifier, row_threshold, column_threshold, key_columns)
-    data_frame_cleaned = remove_outliers(data_frame_cleaned, exclude_columns=key_columns)
-    data_frame_cleaned = standardize_text_columns(data_frame_cleaned, columns_to_standardize=None, exclude_columns=key_columns)
-    data_frame_cleaned = remove_duplicate_rows(data_frame_cleaned)
+    try:
+        column_positions, row_positions = _threshold_positions(data_frame, row_threshold, column_threshold,
+                                                               exclude_columns)
+    except Exception as e:
+        print(f"Error in remove_data_based_on_threshold: {e}")
+        column_positions, row_positions = np.arange(data_frame.shape[1]), np.arange(len(data_frame))
+
+    try:
+        row_positions = row_positions[_outlier_mask(data_frame, column_positions, row_positions, exclude_columns)]
+    except Exception as e:
+        print(f"Error in remove_outliers: {e}")
+
+    try:
+        row_positions = row_positions[_first_occurrence_mask(data_frame, column_positions, row_positions)]
+    except Exception as e:
+        print(f"Error in remove_duplicate_rows: {e}")
 
-    return data_frame_cleaned
+    return data_frame.iloc[row_positions, column_positions]
+
+
+def _threshold_positions(data_frame: pd.DataFrame,
+                         row_threshold: float,
+                         column_threshold: float,
+                         exclude_columns: List[str]):
+    """
+    Positions of the columns and rows kept by the missing value thresholds, from one null mask of the whole frame.
+    """
+    null_mask = data_frame.isnull().to_numpy()
+    row_count, column_count = null_mask.shape
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        column_missing_proportion = null_mask.sum(axis=0) / row_count
+    # A NaN proportion (no rows) is never above the threshold, as in remove_data_based_on_threshold
+    keep_columns = ~(column_missing_proportion > column_threshold) | data_frame.columns.isin(exclude_columns)
+    column_positions = np.flatnonzero(keep_columns)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        row_missing_proportion = null_mask[:, keep_columns].sum(axis=1) / len(column_positions)
+    row_positions = np.flatnonzero(~(row_missing_proportion > row_threshold))
+    return column_positions, row_positions
+
+
+def _outlier_mask(data_frame: pd.DataFrame,
+                  column_positions: np.ndarray,
+                  row_positions: np.ndarray,
+                  exclude_columns: List[str],
+                  z_score_threshold: float = 3.0) -> np.ndarray:
+    """
+    Mask of the given rows whose Z-score is below the threshold in every numerical column that is not excluded.
+    A column containing a missing value or a single repeated value rejects every row, as zscore returns NaN for it.
+    """
+    numerical_positions = [position for position in column_positions
+                           if data_frame.dtypes.iloc[position].name in NUMERIC_DTYPES
+                           and data_frame.columns[position] not in exclude_columns]
+    if len(numerical_positions) == 0:
+        return np.ones(len(row_positions), dtype=bool)
+
+    # Column-major, so that every column is reduced over contiguous memory as zscore does for a single column
+    values = np.asfortranarray(data_frame.iloc[:, numerical_positions].to_numpy(dtype=np.float64)[row_positions])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.abs(zscore(values, axis=0)) < z_score_threshold).all(axis=1)
+
+
+def _first_occurrence_mask(data_frame: pd.DataFrame,
+                           column_positions: np.ndarray,
+                           row_positions: np.ndarray) -> np.ndarray:
+    """
+    Mask of the given rows that are the first occurrence of their values in the kept columns. The columns are factorized
+    one at a time and their codes combined into one group number per row, as drop_duplicates does, without copying the
+    rows into a new DataFrame first.
+    """
+    groups = np.zeros(len(row_positions), dtype=np.int64)
+    group_count = 1
+    for position in column_positions:
+        codes, uniques = pd.factorize(data_frame.iloc[:, position].take(row_positions))
+        if group_count * (len(uniques) + 1) >= 2 ** 62:
+            # Renumber the groups densely before the combined number could overflow
+            groups, group_uniques = pd.factorize(groups)
+            group_count = len(group_uniques)
+        groups = groups * (len(uniques) + 1) + codes + 1
+        group_count *= len(uniques) + 1
+
+    return ~pd.Series(groups).duplicated().to_numpy()
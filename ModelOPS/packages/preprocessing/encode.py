@@ -1,15 +1,21 @@
 import pandas as pd
 from typing import List, Optional
 from sklearn.preprocessing import OneHotEncoder, LabelEncoder
+from packages.preprocessing.pipeline import PreprocessingPipeline
 
 
-def one_hot_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional[List[str]] = None, exclude_columns: Optional[List[str]] = None) -> pd.DataFrame:
+def one_hot_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional[List[str]] = None, exclude_columns: Optional[List[str]] = None,
+                           pipeline: Optional[PreprocessingPipeline] = None, sparse: bool = False) -> pd.DataFrame:
     """
     Applies one-hot encoding to specified columns in the DataFrame, excluding key columns.
+    In sparse mode the encoded block is kept as a CSR matrix and added as sparse columns, which only store the ones, so
+    that high-cardinality columns such as diagnosis codes do not grow into a dense block of zeros.
 
     :param data_frame: pandas DataFrame containing the data.
     :param columns_to_encode: Optional list of column names to encode. If None, automatically detects object and category dtype columns.
     :param exclude_columns: Columns to exclude from encoding.
+    :param pipeline: Optional pipeline that records the categories of each encoded column.
+    :param sparse: Whether to add the encoded columns as sparse columns instead of dense float64 columns.
 
     :return: DataFrame with specified columns one-hot encoded, excluding specified key columns.
     """
@@ -22,9 +28,16 @@ def one_hot_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional
         else:
             columns_to_encode = [col for col in columns_to_encode if col not in exclude_columns]
 
-        encoder = OneHotEncoder(sparse=False, handle_unknown='ignore')
+        encoder = OneHotEncoder(sparse_output=sparse, handle_unknown='ignore')
         encoded_array = encoder.fit_transform(data_frame[columns_to_encode])
-        encoded_df = pd.DataFrame(encoded_array, columns=encoder.get_feature_names_out(columns_to_encode))
+        if sparse:
+            encoded_df = pd.DataFrame.sparse.from_spmatrix(encoded_array.tocsr(),
+                                                           columns=encoder.get_feature_names_out(columns_to_encode))
+        else:
+            encoded_df = pd.DataFrame(encoded_array, columns=encoder.get_feature_names_out(columns_to_encode))
+        if pipeline is not None:
+            for column, categories in zip(columns_to_encode, encoder.categories_):
+                pipeline.record_one_hot_encoding(column, categories)
 
         data_frame = data_frame.drop(columns=columns_to_encode).reset_index(drop=True)
         encoded_df = encoded_df.reset_index(drop=True)
@@ -34,13 +47,15 @@ def one_hot_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional
         return data_frame
 
 
-def label_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional[List[str]] = None, exclude_columns: Optional[List[str]] = None) -> pd.DataFrame:
+def label_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional[List[str]] = None, exclude_columns: Optional[List[str]] = None,
+                         pipeline: Optional[PreprocessingPipeline] = None) -> pd.DataFrame:
     """
     Applies label encoding to specified columns in the DataFrame, excluding key columns.
 
     :param data_frame: pandas DataFrame containing the data.
     :param columns_to_encode: Optional list of column names to encode. If None, automatically detects object and category dtype columns.
     :param exclude_columns: Columns to exclude from encoding.
+    :param pipeline: Optional pipeline that records the categories of each encoded column.
 
     :return: DataFrame with specified columns label encoded, excluding specified key columns.
     """
@@ -56,6 +71,8 @@ def label_encode_columns(data_frame: pd.DataFrame, columns_to_encode: Optional[L
         label_encoder = LabelEncoder()
         for column in columns_to_encode:
             data_frame[column] = label_encoder.fit_transform(data_frame[column])
+            if pipeline is not None:
+                pipeline.record_label_encoding(column, label_encoder.classes_)
 
         return data_frame
     except Exception as e:
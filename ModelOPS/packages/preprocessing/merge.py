@@ -1,50 +1,109 @@
 import os
-import pandas as pd
+import numpy as np
 from typing import List
 from fuzzywuzzy import fuzz
+from packages.data_access import loader
+from packages.data_access.dedup import RowDeduplicator
+from packages.data_access.config import DEDUPLICATION_CONFIG
 
 
 def find_similar_files(file_names: List[str], threshold: int = 85) -> List[List[str]]:
     """
     Finds and groups filenames with similarity above a specified threshold.
+    Each group starts with the first filename not yet grouped and takes every later filename whose fuzz.ratio with it
+    is above the threshold. The ratio is only computed for the filenames that a character count index cannot rule out:
+    two names share at most the smaller count of every character, which bounds their ratio from above, and that bound
+    is computed for all remaining names at once with NumPy.
 
     :param file_names: List of filenames to compare.
     :param threshold: Similarity threshold for considering two filenames as a match.
 
     :return: List of lists, where each sublist contains filenames considered similar.
     """
+    if not file_names:
+        return []
+
+    histograms, lengths = _character_histograms(file_names)
+    remaining = np.ones(len(file_names), dtype=bool)
     similar_groups = []
-    while file_names:
-        base = file_names.pop(0)
-        group = [base]
-        for other in file_names[:]:
-            if fuzz.ratio(base, other) > threshold:
-                group.append(other)
-                file_names.remove(other)
+
+    for base in range(len(file_names)):
+        if not remaining[base]:
+            continue
+        remaining[base] = False
+        group = [file_names[base]]
+
+        others = np.flatnonzero(remaining)
+        if len(others):
+            shared = np.minimum(histograms[others], histograms[base]).sum(axis=1)
+            totals = lengths[others] + lengths[base]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                upper_bounds = np.where(totals > 0, 200.0 * shared / totals, 0.0)
+            # fuzz.ratio rounds to the nearest integer, so bounds within half a point of the threshold are kept
+            candidates = others[upper_bounds > threshold - 0.5]
+            matches = [other for other in candidates if fuzz.ratio(file_names[base], file_names[other]) > threshold]
+            remaining[matches] = False
+            group += [file_names[other] for other in matches]
+
         similar_groups.append(group)
     return similar_groups
 
 
+def _character_histograms(file_names: List[str]):
+    """
+    Counts of every character in every filename, as a (filenames x characters) matrix, and the filename lengths.
+    """
+    alphabet = {character: position for position, character in enumerate(sorted(set(''.join(file_names))))}
+    histograms = np.zeros((len(file_names), max(len(alphabet), 1)), dtype=np.int32)
+    for row, file_name in enumerate(file_names):
+        positions = np.fromiter((alphabet[character] for character in file_name), dtype=np.int64,
+                                count=len(file_name))
+        np.add.at(histograms[row], positions, 1)
+    return histograms, histograms.sum(axis=1)
+
+
 def merge_files(directory_path: str, save_directory: str, threshold: int = 85):
     """
     Merges files in a directory with similar names based on a specified similarity threshold.
     Merged files are saved to a separate directory.
+    The columns of a merged file are the union of the columns of its files, in order of first appearance, taken from
+    the file headers alone. Each file is then read and appended to the merged file on its own, so at most one file is
+    held in memory at a time.
+    When enabled in DEDUPLICATION_CONFIG, rows already written from an earlier file of the directory are dropped, so
+    that a row repeated across the files of a label is only kept once. Only the hashes of the written rows are kept.
 
-    :param directory_path: Path to the directory containing the files to merge.
+    :param directory_path: Path to the directory containing the files to merge, either local or a minio:// prefix.
     :param save_directory: Directory where merged files will be saved.
     :param threshold: Similarity threshold for considering filenames as a match.
     """
-    file_names = [f for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f)) and f.endswith('.csv')]
-    similar_groups = find_similar_files(file_names, threshold)
+    file_paths = {loader.file_name(path): path for path in loader.list_csv_files(directory_path) if
+                  loader.is_remote_path(path) or os.path.isfile(path)}
+    similar_groups = find_similar_files(list(file_paths), threshold)
 
     os.makedirs(save_directory, exist_ok=True)
+    deduplicator = RowDeduplicator() if DEDUPLICATION_CONFIG['across_files'] else None
 
     for group in similar_groups:
-        merged_df = pd.DataFrame()
-        for file_name in group:
-            df = pd.read_csv(os.path.join(directory_path, file_name))
-            merged_df = pd.concat([merged_df, df], ignore_index=True)
+        paths = [file_paths[file_name] for file_name in group]
+        columns = unify_columns(paths)
 
         save_path = os.path.join(save_directory, f"merged_{group[0]}")
-        merged_df.to_csv(save_path, index=False)
+        with open(save_path, 'w', newline='') as merged_file:
+            for position, path in enumerate(paths):
+                df = loader.read_data_file(path).reindex(columns=columns)
+                if deduplicator is not None:
+                    df = deduplicator.drop_duplicates(df)
+                df.to_csv(merged_file, index=False, header=position == 0)
+
+    if deduplicator is not None and deduplicator.duplicate_count:
+        print(f"Removed {deduplicator.duplicate_count} rows repeated across the files.")
 
+
+def unify_columns(paths: List[str]) -> List[str]:
+    """
+    Union of the columns of several files, in order of first appearance, read from their headers only.
+    """
+    columns = {}
+    for path in paths:
+        columns.update((column, None) for column in loader.read_header(path))
+    return list(columns)
@@ -0,0 +1,140 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from sklearn.preprocessing import StandardScaler
+
+PIPELINE_FILE_SUFFIX = '.pipeline.json'
+
+
+class PreprocessingPipeline:
+    """
+    The fitted state of the cleaning, encoding and scaling of one merged file: the columns kept and dropped, the
+    categories of the encoded columns and the offset and scale of every scaled column. It is saved as JSON next to the
+    processed file, so that new rows can be transformed into the same feature space without fitting anything again.
+    """
+
+    def __init__(self):
+        self.input_columns: List[str] = []
+        self.dropped_columns: List[str] = []
+        self.label_categories: Dict[str, list] = {}
+        self.one_hot_categories: Dict[str, list] = {}
+        self.scale_method: Optional[str] = None
+        self.scaled_columns: List[str] = []
+        self.offsets: List[float] = []
+        self.scales: List[float] = []
+        self.columns: List[str] = []
+
+    def record_columns(self, input_columns: List[str], dropped_columns: List[str]) -> None:
+        self.input_columns = list(input_columns)
+        self.dropped_columns = list(dropped_columns)
+
+    def record_label_encoding(self, column: str, categories) -> None:
+        # Categories read from Parquet or found by sklearn are NumPy scalars, which JSON cannot store
+        self.label_categories[column] = pd.Series(categories, dtype=object).tolist()
+
+    def record_one_hot_encoding(self, column: str, categories) -> None:
+        self.one_hot_categories[column] = pd.Series(categories, dtype=object).tolist()
+
+    def record_scaling(self, scale_method: str, columns: List[str], scaler) -> None:
+        """
+        Keep the statistics of a fitted StandardScaler or MinMaxScaler, as an offset subtracted from each column and a
+        scale it is divided by.
+        """
+        self.scale_method = scale_method
+        self.scaled_columns = list(columns)
+        if isinstance(scaler, StandardScaler):
+            self.offsets, self.scales = scaler.mean_.tolist(), scaler.scale_.tolist()
+        else:
+            self.offsets, self.scales = scaler.data_min_.tolist(), (1 / scaler.scale_).tolist()
+
+    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply the fitted pipeline to new rows. Rows are never removed, so every row gets a prediction: missing input
+        columns are filled with NaN, missing values get the code or one-hot column that missing values were given in
+        training, and unseen categories, like missing values that were not seen in training, are label encoded as -1
+        and one-hot encoded as zeros in every column.
+
+        :param data: Rows with the columns of the raw files.
+        :return: The rows with the columns of the processed file, in the same order.
+        """
+        transformed = {}
+        for column in self.input_columns:
+            values = data[column] if column in data.columns else pd.Series(np.nan, index=data.index)
+            if column in self.label_categories:
+                transformed[column] = _category_codes(values, self.label_categories[column])
+            elif column in self.one_hot_categories:
+                codes = _category_codes(values, self.one_hot_categories[column])
+                for position, category in enumerate(self.one_hot_categories[column]):
+                    transformed[f"{column}_{category}"] = (codes == position).astype(np.float64)
+            else:
+                transformed[column] = values.to_numpy()
+
+        if self.scaled_columns:
+            matrix = np.column_stack([pd.to_numeric(pd.Series(transformed[column]), errors='coerce')
+                                      .to_numpy(dtype=np.float64) for column in self.scaled_columns])
+            matrix = (matrix - np.array(self.offsets)) / np.array(self.scales)
+            for position, column in enumerate(self.scaled_columns):
+                transformed[column] = matrix[:, position]
+
+        return pd.DataFrame(transformed, index=data.index).reindex(columns=self.columns)
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'PreprocessingPipeline':
+        pipeline = cls()
+        for name, value in state.items():
+            setattr(pipeline, name, value)
+        return pipeline
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path: str) -> 'PreprocessingPipeline':
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+
+def _category_codes(values: pd.Series, categories: list) -> np.ndarray:
+    """
+    Position of every value in the categories fitted in training, or -1 for values outside them. LabelEncoder and
+    OneHotEncoder keep missing values as a category of their own, which is matched against the missing values
+    separately, since a missing value is not equal to itself.
+    """
+    is_null = pd.isna(pd.Series(categories, dtype=object)).to_numpy()
+    known_positions = np.flatnonzero(~is_null)
+    codes = pd.Index([categories[position] for position in known_positions], dtype=object) \
+        .get_indexer(pd.Series(values, dtype=object))
+    codes = np.where(codes >= 0, known_positions[np.maximum(codes, 0)] if len(known_positions) else -1, -1)
+    if is_null.any():
+        codes[pd.isna(values).to_numpy()] = np.flatnonzero(is_null)[0]
+    return codes
+
+
+def pipeline_path(output_file_path: str) -> str:
+    """
+    Path of the pipeline saved next to a processed file.
+    """
+    return f"{os.path.splitext(output_file_path)[0]}{PIPELINE_FILE_SUFFIX}"
+
+
+def find_pipeline(directory: str) -> Optional[PreprocessingPipeline]:
+    """
+    Load the pipeline saved with the processed files of a directory.
+
+    :param directory: A local directory of processed files. Remote prefixes hold raw files and have no pipeline.
+    :return: The pipeline, or None if the directory does not hold exactly one, since the rows of a model trained on
+             several merged files cannot be mapped to a single feature space.
+    """
+    if directory.startswith('minio://') or not os.path.isdir(directory):
+        return None
+    paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(PIPELINE_FILE_SUFFIX)]
+    if len(paths) != 1:
+        return None
+    return PreprocessingPipeline.load(paths[0])
+
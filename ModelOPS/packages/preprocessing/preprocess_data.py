@@ -1,9 +1,13 @@
 import os
-import pandas as pd
+import time
 from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
 from difflib import get_close_matches
+from packages.data_access import loader, registry, schema
 from packages.preprocessing.merge import merge_files
 from packages.preprocessing.clean import clean_dataset
+from packages.preprocessing.pipeline import PreprocessingPipeline, pipeline_path
+from packages.preprocessing.chunked import preprocess_file_in_chunks
 from packages.preprocessing.scale import standardize_columns, min_max_scale_columns
 from packages.preprocessing.encode import one_hot_encode_columns, label_encode_columns
 
@@ -40,7 +44,9 @@ def preprocess_files(input_directory: str,
                      scale_method: str = 'standardize',
                      row_threshold: float = 0.3,
                      column_threshold: float = 0.5,
-                     exclude_columns: Optional[List[str]] = None):
+                     exclude_columns: Optional[List[str]] = None,
+                     chunk_size: Optional[int] = None,
+                     max_workers: Optional[int] = None) -> List[dict]:
     """
     Orchestrates an entire data preprocessing workflow including merging, cleaning, encoding, and scaling of data files.
     This process is designed to prepare datasets for further analysis or machine learning training by performing several key preprocessing steps:
@@ -49,19 +55,24 @@ def preprocess_files(input_directory: str,
     - Encoding: Transforms categorical data into numerical formats using either one-hot encoding or label encoding methods, based on the specified 'encode_method'.
     - Scaling: Normalizes or standardizes numerical features in the data, based on the specified 'scale_method'.
 
-    After processing, the cleaned, encoded, and scaled data is saved to the output directory. Merged files used during processing are removed after their processed versions are saved.
+    After processing, the cleaned, encoded, and scaled data is saved to the output directory as Parquet files, which keep the column dtypes and per column statistics for training. Each processed file is accompanied by the fitted preprocessing pipeline (<name>.pipeline.json) that transforms new rows into its feature space. Merged files used during processing are removed after their processed versions are saved.
 
     Parameters:
-    - input_directory (str): Directory containing the files to process.
+    - input_directory (str): Directory containing the files to process, either local or a minio:// prefix.
     - output_directory (str): Directory where processed files will be saved.
     - patient_identifier (str): The column name used as a unique identifier for patients. This column is preserved during cleaning.
-    - encode_method (str, optional): Specifies the method for encoding categorical variables ('one_hot' or 'label'). Defaults to 'one_hot'.
+    - encode_method (str, optional): Specifies the method for encoding categorical variables ('one_hot', 'sparse_one_hot' or 'label'). Defaults to 'one_hot'. Sparse one-hot encoding keeps the encoded columns sparse and writes them next to the Parquet file as a CSR matrix (<name>.sparse.npz).
     - scale_method (str, optional): Specifies the method for scaling numerical variables ('standardize' or 'min_max'). Defaults to 'standardize'.
     - row_threshold (float, optional): The threshold for the proportion of missing values in a row, above which the row is removed. Defaults to 0.3.
     - column_threshold (float, optional): The threshold for the proportion of missing values in a column, above which the column is removed. Defaults to 0.5.
     - exclude_columns (List[str], optional): A list of column names to be excluded from being altered during the preprocessing steps, including the patient identifier.
+    - chunk_size (int, optional): When set, each merged file is cleaned, encoded and scaled chunk by chunk with at most this many rows in memory.
+    - max_workers (int, optional): Number of processes that handle merged files concurrently. Defaults to one file at a time in the current process.
+
+    Returns:
+        list: One report per merged file, with the processed file name, the time taken in seconds and the error message of a failed file.
     """
-    valid_encode_methods = ['one_hot_encoding', 'label_encoding', 'none']
+    valid_encode_methods = ['one_hot_encoding', 'sparse_one_hot_encoding', 'label_encoding', 'none']
     valid_scale_methods = ['standardize', 'min_max']
 
     chosen_encode_method = choose_closest_match(encode_method, valid_encode_methods)
@@ -80,29 +91,96 @@ def preprocess_files(input_directory: str,
     if patient_identifier not in exclude_columns:
         exclude_columns.append(patient_identifier)
 
-    for filename in os.listdir(output_directory):
-        if filename.startswith("merged_"):
-            file_path = os.path.join(output_directory, filename)
-            df = pd.read_csv(file_path)
+    merged_files = sorted(filename for filename in os.listdir(output_directory) if filename.startswith("merged_"))
+    tasks = [(os.path.join(output_directory, filename),
+              os.path.join(output_directory, f"processed_{os.path.splitext(filename)[0]}.parquet"),
+              patient_identifier, chosen_encode_method, chosen_scale_method, row_threshold, column_threshold,
+              exclude_columns, chunk_size) for filename in merged_files]
+
+    max_workers = min(max_workers or 1, len(tasks))
+    if max_workers <= 1:
+        return [preprocess_merged_file(*task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_preprocess_in_worker, tasks, [schema.active_schema_key()] * len(tasks)))
+
+
+def preprocess_merged_file(file_path: str,
+                           output_file_path: str,
+                           patient_identifier: str,
+                           encode_method: str,
+                           scale_method: str,
+                           row_threshold: float,
+                           column_threshold: float,
+                           exclude_columns: List[str],
+                           chunk_size: Optional[int] = None) -> dict:
+    """
+    Cleans, encodes and scales a single merged file, writes the processed Parquet file and its fitted preprocessing
+    pipeline next to it, and deletes the merged file. A failure is reported instead of raised, so that the other merged files are still processed.
+
+    :param file_path: Path of the merged CSV file.
+    :param output_file_path: Path where the processed Parquet file will be written.
+    :param patient_identifier: Column name for the patient identifier that must not be altered or removed.
+    :param encode_method: One of 'one_hot_encoding', 'sparse_one_hot_encoding', 'label_encoding' or 'none'.
+    :param scale_method: One of 'standardize' or 'min_max'.
+    :param row_threshold: Proportion threshold for missing values in rows to be removed.
+    :param column_threshold: Proportion threshold for missing values in columns to be removed.
+    :param exclude_columns: Columns to be excluded from being altered.
+    :param chunk_size: When set, the file is processed chunk by chunk with at most this many rows in memory.
+    :return: The name of the merged file, the processed file, its pipeline, the time taken in seconds and the error, if
+             any.
+    """
+    start = time.perf_counter()
+    report = {"file": os.path.basename(file_path), "output_file": os.path.basename(output_file_path)}
+    try:
+        if chunk_size:
+            pipeline = preprocess_file_in_chunks(file_path, output_file_path, patient_identifier, encode_method,
+                                                 scale_method, row_threshold, column_threshold, exclude_columns,
+                                                 chunk_size)
+            print(f"Processed and saved in chunks: {output_file_path}")
+        else:
+            df = loader.read_compact_csv(file_path)
+            pipeline = PreprocessingPipeline()
 
             df_cleaned = clean_dataset(df, patient_identifier, row_threshold, column_threshold, exclude_columns)
-
-            if chosen_encode_method == 'one_hot_encoding':
-                df_encoded = one_hot_encode_columns(df_cleaned, exclude_columns=exclude_columns)
-            elif chosen_encode_method == 'label_encoding':
-                df_encoded = label_encode_columns(df_cleaned, exclude_columns=exclude_columns)
+            pipeline.record_columns(df_cleaned.columns, [column for column in df.columns
+                                                         if column not in df_cleaned.columns])
+
+            if encode_method == 'one_hot_encoding':
+                df_encoded = one_hot_encode_columns(df_cleaned, exclude_columns=exclude_columns, pipeline=pipeline)
+            elif encode_method == 'sparse_one_hot_encoding':
+                df_encoded = one_hot_encode_columns(df_cleaned, exclude_columns=exclude_columns, pipeline=pipeline,
+                                                    sparse=True)
+            elif encode_method == 'label_encoding':
+                df_encoded = label_encode_columns(df_cleaned, exclude_columns=exclude_columns, pipeline=pipeline)
             else:
                 df_encoded = df_cleaned
 
-            if chosen_scale_method == 'standardize':
-                df_scaled = standardize_columns(df_encoded, exclude_columns=exclude_columns)
-            elif chosen_scale_method == 'min_max':
-                df_scaled = min_max_scale_columns(df_encoded, exclude_columns=exclude_columns)
+            if scale_method == 'standardize':
+                df_scaled = standardize_columns(df_encoded, exclude_columns=exclude_columns, pipeline=pipeline)
+            elif scale_method == 'min_max':
+                df_scaled = min_max_scale_columns(df_encoded, exclude_columns=exclude_columns, pipeline=pipeline)
 
-            processed_filename = f"processed_{filename}"
-            output_file_path = os.path.join(output_directory, processed_filename)
-            df_scaled.to_csv(output_file_path, index=False)
+            pipeline.columns = df_scaled.columns.tolist()
+            loader.write_parquet(df_scaled, output_file_path)
             print(f"Processed and saved: {output_file_path}")
 
-            os.remove(file_path)
-            print(f"Deleted merged file: {file_path}")
+        pipeline.save(pipeline_path(output_file_path))
+        os.remove(file_path)
+        print(f"Deleted merged file: {file_path}")
+        report["pipeline_file"] = os.path.basename(pipeline_path(output_file_path))
+        report["error"] = None
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        report["output_file"] = None
+        report["pipeline_file"] = None
+        report["error"] = str(e)
+
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def _preprocess_in_worker(task: tuple, schema_key: Optional[str]) -> dict:
+    # Frames published from a worker process would never be read, so the dataset registry is left out
+    with registry.session_scope(None), schema.schema_scope(schema_key):
+        return preprocess_merged_file(*task)
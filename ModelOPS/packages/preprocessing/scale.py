@@ -1,16 +1,20 @@
 import pandas as pd
 from typing import List, Optional
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from packages.data_access.schema import NUMERIC_DTYPES
+from packages.preprocessing.pipeline import PreprocessingPipeline
 
 
 def standardize_columns(data_frame: pd.DataFrame, columns_to_scale: Optional[List[str]] = None,
-                        exclude_columns: Optional[List[str]] = None) -> pd.DataFrame:
+                        exclude_columns: Optional[List[str]] = None,
+                        pipeline: Optional[PreprocessingPipeline] = None) -> pd.DataFrame:
     """
     Standardizes specified numerical columns in the DataFrame to have mean 0 and variance 1, excluding specified columns.
 
     :param data_frame: pandas DataFrame containing the data.
     :param columns_to_scale: Optional list of numerical column names to standardize. If None, automatically detects float and int dtype columns.
     :param exclude_columns: Columns to exclude from scaling.
+    :param pipeline: Optional pipeline that records the fitted statistics of the scaled columns.
 
     :return: DataFrame with specified columns standardized, excluding specified columns.
     """
@@ -19,13 +23,16 @@ def standardize_columns(data_frame: pd.DataFrame, columns_to_scale: Optional[Lis
             exclude_columns = []
 
         if columns_to_scale is None:
-            columns_to_scale = [col for col in data_frame.select_dtypes(include=['float64', 'int64']).columns.tolist() if
-                                col not in exclude_columns]
+            # Sparse one-hot columns are left unscaled, centering them would fill every zero
+            columns_to_scale = [col for col in data_frame.select_dtypes(include=NUMERIC_DTYPES).columns.tolist() if
+                                col not in exclude_columns and not isinstance(data_frame[col].dtype, pd.SparseDtype)]
         else:
             columns_to_scale = [col for col in columns_to_scale if col not in exclude_columns]
 
         scaler = StandardScaler()
         data_frame[columns_to_scale] = scaler.fit_transform(data_frame[columns_to_scale])
+        if pipeline is not None:
+            pipeline.record_scaling('standardize', columns_to_scale, scaler)
 
         return data_frame
     except Exception as e:
@@ -34,13 +41,15 @@ def standardize_columns(data_frame: pd.DataFrame, columns_to_scale: Optional[Lis
 
 
 def min_max_scale_columns(data_frame: pd.DataFrame, columns_to_scale: Optional[List[str]] = None,
-                          exclude_columns: Optional[List[str]] = None) -> pd.DataFrame:
+                          exclude_columns: Optional[List[str]] = None,
+                          pipeline: Optional[PreprocessingPipeline] = None) -> pd.DataFrame:
     """
     Applies Min-Max scaling to specified numerical columns in the DataFrame to scale them to a given range, typically [0, 1], excluding specified columns.
 
     :param data_frame: pandas DataFrame containing the data.
     :param columns_to_scale: Optional list of numerical column names to scale. If None, automatically detects float and int dtype columns.
     :param exclude_columns: Columns to exclude from scaling.
+    :param pipeline: Optional pipeline that records the fitted statistics of the scaled columns.
 
     :return: DataFrame with specified columns scaled using Min-Max scaling, excluding specified columns.
     """
@@ -49,13 +58,16 @@ def min_max_scale_columns(data_frame: pd.DataFrame, columns_to_scale: Optional[L
             exclude_columns = []
 
         if columns_to_scale is None:
-            columns_to_scale = [col for col in data_frame.select_dtypes(include=['float64', 'int64']).columns.tolist() if
-                                col not in exclude_columns]
+            # Sparse one-hot columns are left unscaled, centering them would fill every zero
+            columns_to_scale = [col for col in data_frame.select_dtypes(include=NUMERIC_DTYPES).columns.tolist() if
+                                col not in exclude_columns and not isinstance(data_frame[col].dtype, pd.SparseDtype)]
         else:
             columns_to_scale = [col for col in columns_to_scale if col not in exclude_columns]
 
         scaler = MinMaxScaler()
         data_frame[columns_to_scale] = scaler.fit_transform(data_frame[columns_to_scale])
+        if pipeline is not None:
+            pipeline.record_scaling('min_max', columns_to_scale, scaler)
 
         return data_frame
     except Exception as e:
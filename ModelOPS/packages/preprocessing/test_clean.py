@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from packages.preprocessing.clean import clean_dataset, remove_data_based_on_threshold, remove_outliers, \
+    remove_duplicate_rows
+
+
+def _cleaning_chain(data_frame, patient_identifier, row_threshold, column_threshold, key_columns):
+    key_columns = list(key_columns)
+    data_frame = remove_data_based_on_threshold(data_frame, patient_identifier, row_threshold, column_threshold,
+                                                key_columns)
+    data_frame = remove_outliers(data_frame, exclude_columns=key_columns)
+    return remove_duplicate_rows(data_frame)
+
+
+def _dirty_data(row_count: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(5)
+    data = pd.DataFrame({'pid': rng.integers(0, 300, row_count),
+                         'age': rng.integers(18, 90, row_count),
+                         'bmi': rng.normal(27, 4, row_count).round(0),
+                         'sex': rng.choice(['M', 'F'], row_count),
+                         'note': np.where(rng.random(row_count) < 0.7, None, 'checked'),
+                         'lab': np.where(rng.random(row_count) < 0.3, np.nan, rng.normal(size=row_count)),
+                         'site': rng.choice(['a', 'b', None], row_count)})
+    data.loc[::37, 'bmi'] = 80.0
+    return pd.concat([data, data.iloc[:40]], ignore_index=True)
+
+
+@pytest.mark.parametrize('row_threshold, column_threshold, key_columns', [(0.3, 0.5, []),
+                                                                         (0.1, 0.2, ['lab']),
+                                                                         (0.0, 0.0, ['note', 'site']),
+                                                                         (1.0, 1.0, ['age'])])
+def test_fused_cleaning_matches_the_chain_of_steps(row_threshold, column_threshold, key_columns):
+    data = _dirty_data()
+
+    cleaned = clean_dataset(data.copy(), 'pid', row_threshold, column_threshold, list(key_columns))
+
+    expected = _cleaning_chain(data.copy(), 'pid', row_threshold, column_threshold, key_columns)
+    pd.testing.assert_frame_equal(cleaned, expected)
+
+
+def test_fused_cleaning_of_an_empty_frame():
+    data = _dirty_data().iloc[:0]
+
+    pd.testing.assert_frame_equal(clean_dataset(data.copy(), 'pid', 0.3, 0.5, []),
+                                  _cleaning_chain(data.copy(), 'pid', 0.3, 0.5, []))
@@ -0,0 +1,47 @@
+import random
+import string
+from typing import List
+import pytest
+from fuzzywuzzy import fuzz
+from packages.preprocessing.merge import find_similar_files
+
+
+def _pairwise_groups(file_names: List[str], threshold: int) -> List[List[str]]:
+    # The grouping find_similar_files replaced, which compares every remaining pair of filenames
+    file_names = list(file_names)
+    similar_groups = []
+    while file_names:
+        base = file_names.pop(0)
+        group = [base]
+        for other in file_names[:]:
+            if fuzz.ratio(base, other) > threshold:
+                group.append(other)
+                file_names.remove(other)
+        similar_groups.append(group)
+    return similar_groups
+
+
+def _file_names(file_count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    studies = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10))) for _ in range(30)]
+    kinds = ['labs', 'vitals', 'medication', 'diagnoses', 'lab', 'Labs']
+    file_names = {f"{rng.choice(studies)}_{rng.choice(kinds)}_{rng.randrange(12)}.csv" for _ in range(file_count)}
+    file_names = sorted(file_names | {'', 'a.csv', 'b.csv', 'ÿearly_labs.csv', 'yearly_labs.csv'})
+    rng.shuffle(file_names)
+    return file_names
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('threshold', [0, 50, 85, 95])
+def test_indexed_grouping_matches_pairwise_grouping(seed, threshold):
+    file_names = _file_names(300, seed)
+
+    assert find_similar_files(file_names, threshold) == _pairwise_groups(file_names, threshold)
+
+
+def test_input_list_is_left_unchanged():
+    file_names = ['cohort_part_1.csv', 'cohort_part_2.csv', 'labs.csv']
+
+    assert find_similar_files(file_names) == [['cohort_part_1.csv', 'cohort_part_2.csv'], ['labs.csv']]
+    assert file_names == ['cohort_part_1.csv', 'cohort_part_2.csv', 'labs.csv']
+    assert find_similar_files([]) == []
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from packages.data_access import loader
+from packages.preprocessing.pipeline import PreprocessingPipeline, find_pipeline
+from packages.preprocessing.preprocess_data import preprocess_files
+
+
+def _write_cohort(directory: str, row_count: int = 300, smoker_statuses=('yes', 'no', 'former')) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame({'pid': np.arange(row_count),
+                         'age': rng.integers(18, 90, row_count),
+                         'bmi': rng.normal(27, 4, row_count).round(1),
+                         'smoker': rng.choice(list(smoker_statuses), row_count)})
+    data['target'] = (data['age'] > 60).astype(int)
+    data.to_csv(os.path.join(directory, 'cohort.csv'), index=False)
+    return data
+
+
+@pytest.mark.parametrize('encode_method', ['label_encoding', 'one_hot_encoding'])
+def test_saved_pipeline_reproduces_the_processed_file(tmp_path, encode_method):
+    raw_directory, cleaned_directory = tmp_path / 'raw', tmp_path / 'cleaned'
+    raw_directory.mkdir()
+    raw_data = _write_cohort(str(raw_directory))
+    preprocess_files(str(raw_directory), str(cleaned_directory), 'pid', encode_method, 'standardize',
+                     exclude_columns=['target'])
+
+    pipeline = find_pipeline(str(cleaned_directory))
+    pipeline.save(str(tmp_path / 'copy.pipeline.json'))
+    loaded = PreprocessingPipeline.load(str(tmp_path / 'copy.pipeline.json'))
+    assert loaded.to_dict() == pipeline.to_dict()
+
+    processed = loader.read_data_file(loader.list_data_files(str(cleaned_directory))[0]).set_index('pid')
+    transformed = loaded.transform(raw_data).set_index('pid').loc[processed.index]
+    assert list(transformed.columns) == list(processed.columns)
+    np.testing.assert_allclose(transformed.to_numpy(dtype=np.float64), processed.to_numpy(dtype=np.float64))
+
+
+@pytest.mark.parametrize('chunk_size', [None, 100])
+@pytest.mark.parametrize('encode_method', ['label_encoding', 'one_hot_encoding'])
+def test_missing_categories_are_transformed_as_in_training(tmp_path, encode_method, chunk_size):
+    raw_directory, cleaned_directory = tmp_path / 'raw', tmp_path / 'cleaned'
+    raw_directory.mkdir()
+    raw_data = _write_cohort(str(raw_directory), smoker_statuses=('yes', 'no', None))
+    preprocess_files(str(raw_directory), str(cleaned_directory), 'pid', encode_method, 'standardize',
+                     exclude_columns=['target'], chunk_size=chunk_size)
+
+    processed = loader.read_data_file(loader.list_data_files(str(cleaned_directory))[0]).set_index('pid')
+    transformed = find_pipeline(str(cleaned_directory)).transform(raw_data).set_index('pid').loc[processed.index]
+
+    assert raw_data.loc[processed.index, 'smoker'].isna().any()
+    assert list(transformed.columns) == list(processed.columns)
+    np.testing.assert_allclose(transformed.to_numpy(dtype=np.float64), processed.to_numpy(dtype=np.float64))
+
+
+def test_transform_keeps_rows_with_missing_columns_and_unseen_categories():
+    pipeline = PreprocessingPipeline()
+    pipeline.record_columns(['age', 'smoker'], [])
+    pipeline.record_one_hot_encoding('smoker', ['no', 'yes'])
+    pipeline.columns = ['age', 'smoker_no', 'smoker_yes']
+
+    transformed = pipeline.transform(pd.DataFrame({'smoker': ['yes', 'former', None]}))
+
+    assert transformed['age'].isna().all()
+    assert transformed[['smoker_no', 'smoker_yes']].to_numpy().tolist() == [[0, 1], [0, 0], [0, 0]]
+
+
+def test_transform_keeps_the_code_of_missing_values_fitted_in_training():
+    pipeline = PreprocessingPipeline()
+    pipeline.record_columns(['smoker'], [])
+    pipeline.record_label_encoding('smoker', np.array(['no', 'yes', np.nan], dtype=object))
+    pipeline.columns = ['smoker']
+
+    transformed = pipeline.transform(pd.DataFrame({'smoker': ['yes', None, 'former', 'no']}))
+
+    assert transformed['smoker'].tolist() == [1, 2, -1, 0]
@@ -0,0 +1,39 @@
+import os
+
+SCREENING_CONFIG = {
+    # Memory shared by the column blocks screened at the same time, which sets how many columns a block holds
+    'max_bytes': 1024 * 1024 * 1024,
+    'max_block_size': 256,
+    'max_workers': os.cpu_count() or 1
+}
+
+PLOT_CONFIG = {
+    'max_workers': os.cpu_count() or 1,
+    'max_points_per_strip': 2000,
+    'max_points_per_swarm': 300,
+    'random_state': 42
+}
+
+SHAP_CONFIG = {
+    'sample_size': 2000,
+    'chunk_size': 250,
+    'max_workers': os.cpu_count() or 1,
+    'random_state': 42
+}
+
+SEARCH_CONFIG = {
+    'max_workers': os.cpu_count() or 1,
+    'candidates': 27,
+    'eta': 3,
+    'min_rows': 200,
+    'validation_size': 0.2
+}
+
+PERMUTATION_CONFIG = {
+    'max_workers': os.cpu_count() or 1,
+    'block_size': 4,
+    'repeats_per_round': 5,
+    'max_repeats': 30,
+    'confidence_tolerance': 0.005,
+    'random_state': 42
+}
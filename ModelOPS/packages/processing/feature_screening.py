@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from packages.data_access import loader
+from packages.processing.config import SCREENING_CONFIG
+from packages.processing.sparse_features import to_dense
+
+# Number of (block x rows) float64 arrays _kruskal_wallis_block holds at once, the block itself included
+BLOCK_TEMPORARIES = 10
+
+
+def kruskal_wallis_screening(data: pd.DataFrame,
+                             target_column: str,
+                             p_value_threshold: float = 0.05,
+                             max_workers: Optional[int] = None) -> List[str]:
+    """
+    Selects the features whose distributions differ across the categories of the target column according to the
+    Kruskal-Wallis test, giving the same selection as running scipy.stats.kruskal on every feature.
+
+    :param data: The dataset containing both features and the target column.
+    :param target_column: The name of the target variable column in the dataset.
+    :param p_value_threshold: The significance level used to determine feature importance.
+    :param max_workers: Number of threads screening column blocks in parallel. Defaults to SCREENING_CONFIG.
+    :return: A list of significant features based on the Kruskal-Wallis test.
+    """
+    p_values = kruskal_wallis_p_values(data, target_column, max_workers)
+    return [feature for feature, p_value in p_values.items() if p_value < p_value_threshold]
+
+
+def kruskal_wallis_p_values(data: pd.DataFrame, target_column: str, max_workers: Optional[int] = None) -> pd.Series:
+    """
+    Computes the Kruskal-Wallis p-value of every numerical feature against the target column. The features are ranked
+    together in NumPy, one block of columns at a time, with missing values left out per feature and the usual correction
+    for ties.
+
+    :param data: The dataset containing both features and the target column.
+    :param target_column: The name of the target variable column in the dataset.
+    :param max_workers: Number of threads screening column blocks in parallel. Defaults to SCREENING_CONFIG.
+    :return: The p-values indexed by feature, in column order. Features that cannot be tested have a NaN p-value.
+    """
+    features = [feature for feature in data.columns
+                if feature != target_column and pd.api.types.is_numeric_dtype(data[feature])]
+    groups = data[target_column]
+    in_group = groups.notna().to_numpy()
+    group_codes, group_values = pd.factorize(groups[in_group], sort=True)
+    p_values = pd.Series(np.nan, index=features, dtype=np.float64)
+
+    if len(group_values) < 2 or not features:
+        return p_values
+
+    membership = np.zeros((int(in_group.sum()), len(group_values)))
+    membership[np.arange(len(group_codes)), group_codes] = 1.0
+
+    max_workers = max_workers or SCREENING_CONFIG['max_workers']
+    block_size = _block_size(len(group_codes), max_workers)
+    blocks = [features[start:start + block_size] for start in range(0, len(features), block_size)]
+
+    def screen_block(block: List[str]) -> np.ndarray:
+        values = np.ascontiguousarray(data.loc[in_group, block].to_numpy(dtype=np.float64).T)
+        return _kruskal_wallis_block(values, membership)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for block, block_p_values in zip(blocks, executor.map(screen_block, blocks)):
+            p_values[block] = block_p_values
+    return p_values
+
+
+def _block_size(row_count: int, max_workers: int) -> int:
+    """
+    Number of columns per block, such that the temporaries of the blocks screened at the same time fit in
+    SCREENING_CONFIG['max_bytes']. A block always holds at least one column.
+    """
+    block_bytes = BLOCK_TEMPORARIES * np.dtype(np.float64).itemsize * max(row_count, 1) * max_workers
+    return int(min(max(SCREENING_CONFIG['max_bytes'] // block_bytes, 1), SCREENING_CONFIG['max_block_size']))
+
+
+def _kruskal_wallis_block(values: np.ndarray, membership: np.ndarray) -> np.ndarray:
+    """
+    Kruskal-Wallis p-values of each row of a (features x rows) block, given the (rows x groups) one-hot membership of
+    every data row. Missing values are excluded feature by feature; a group left empty or a feature whose values are
+    all equal gives a NaN p-value.
+    """
+    row_count = values.shape[1]
+    valid = ~np.isnan(values)
+
+    # Sorting places the missing values last, so the valid values of a feature occupy its first positions
+    order = np.argsort(values, axis=1)
+    sorted_values = np.take_along_axis(values, order, axis=1)
+    positions = np.arange(row_count)
+
+    run_starts = np.ones(sorted_values.shape, dtype=bool)
+    run_starts[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    run_ends = np.ones(sorted_values.shape, dtype=bool)
+    run_ends[:, :-1] = run_starts[:, 1:]
+
+    first_position = np.maximum.accumulate(np.where(run_starts, positions, 0), axis=1)
+    last_position = np.minimum.accumulate(np.where(run_ends, positions, row_count)[:, ::-1], axis=1)[:, ::-1]
+
+    ranks = np.empty_like(values)
+    np.put_along_axis(ranks, order, (first_position + last_position) / 2.0 + 1.0, axis=1)
+    ranks[~valid] = 0.0
+
+    tie_sizes = np.where(run_starts & np.take_along_axis(valid, order, axis=1),
+                         last_position - first_position + 1, 0).astype(np.float64)
+
+    total_counts = valid.sum(axis=1).astype(np.float64)
+    group_counts = valid.astype(np.float64) @ membership
+    rank_sums = ranks @ membership
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistics = 12.0 / (total_counts * (total_counts + 1)) * (rank_sums ** 2 / group_counts).sum(axis=1) \
+            - 3.0 * (total_counts + 1)
+        tie_correction = 1.0 - (tie_sizes ** 3 - tie_sizes).sum(axis=1) / (total_counts ** 3 - total_counts)
+        statistics /= tie_correction
+    # When every value is tied, the rounding error of the statistic would be divided by zero, where scipy gives NaN
+    statistics[(group_counts == 0).any(axis=1) | ~(tie_correction > 0)] = np.nan
+
+    return stats.chi2.sf(statistics, membership.shape[1] - 1)
+
+
+def screen_features_in_chunks(data_files: List[str],
+                              target_column: str,
+                              chunk_size: int,
+                              p_value_threshold: float = 0.05,
+                              excluded_columns: Optional[List[str]] = None) -> List[str]:
+    """
+    Screens numerical features with a one-way ANOVA F-test computed from per-group streaming moments, so that the files
+    are read one chunk at a time. The rank-based Kruskal-Wallis test needs every value of a feature at once, which is
+    why the bounded-memory path relies on moments instead.
+
+    :param data_files: Paths of the CSV or Parquet files, either local or minio:// paths.
+    :param target_column: The name of the target variable column in the dataset.
+    :param chunk_size: Number of rows read at a time.
+    :param p_value_threshold: The significance level used to determine feature importance.
+    :param excluded_columns: Columns to leave out of the screening.
+    :return: A list of significant features based on the F-test.
+    """
+    if excluded_columns is None:
+        excluded_columns = []
+
+    features = []
+    for path in data_files:
+        for column in loader.read_header(path):
+            if column != target_column and column not in excluded_columns and column not in features:
+                features.append(column)
+
+    non_numeric_features = set()
+    group_moments: Dict[object, List[np.ndarray]] = {}
+
+    for path in data_files:
+        for chunk in loader.iter_chunks(path, chunk_size):
+            # Only one chunk is held at a time, so its sparse one-hot columns can be densified for the groupby
+            chunk = to_dense(chunk)
+            chunk[target_column] = chunk[target_column].fillna(0)
+            chunk = chunk.reindex(columns=features + [target_column])
+
+            non_numeric_features.update(column for column in features
+                                        if not pd.api.types.is_numeric_dtype(chunk[column]))
+            numeric_block = chunk[features].apply(pd.to_numeric, errors='coerce')
+            grouped = numeric_block.groupby(chunk[target_column])
+
+            counts = grouped.count()
+            means = grouped.mean()
+            m2 = grouped.var(ddof=0) * counts
+
+            for group in counts.index:
+                chunk_moments = [counts.loc[group].to_numpy(dtype=np.float64),
+                                 means.loc[group].to_numpy(dtype=np.float64),
+                                 m2.loc[group].to_numpy(dtype=np.float64)]
+                if group in group_moments:
+                    group_moments[group] = _combine_moments(group_moments[group], chunk_moments)
+                else:
+                    group_moments[group] = [np.nan_to_num(moment) for moment in chunk_moments]
+
+    if len(group_moments) < 2:
+        return []
+
+    counts = np.vstack([moments[0] for moments in group_moments.values()])
+    means = np.vstack([moments[1] for moments in group_moments.values()])
+    m2 = np.vstack([moments[2] for moments in group_moments.values()])
+
+    total_counts = counts.sum(axis=0)
+    group_count = (counts > 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grand_means = (counts * means).sum(axis=0) / total_counts
+        between_groups = (counts * (means - grand_means) ** 2).sum(axis=0) / (group_count - 1)
+        within_groups = m2.sum(axis=0) / (total_counts - group_count)
+        f_statistics = between_groups / within_groups
+        p_values = stats.f.sf(f_statistics, group_count - 1, total_counts - group_count)
+
+    return [feature for feature, p_value, groups in zip(features, p_values, group_count)
+            if feature not in non_numeric_features and groups > 1 and p_value < p_value_threshold]
+
+
+def _combine_moments(left: List[np.ndarray], right: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Merges two sets of count, mean and sum of squared deviations using Chan's parallel update.
+    """
+    left_count, left_mean, left_m2 = left
+    right_count, right_mean, right_m2 = [np.nan_to_num(moment) for moment in right]
+
+    total_count = left_count + right_count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = right_mean - left_mean
+        mean = np.where(total_count > 0, left_mean + delta * right_count / total_count, 0.0)
+        m2 = left_m2 + right_m2 + np.where(total_count > 0, delta ** 2 * left_count * right_count / total_count, 0.0)
+    return [total_count, mean, m2]
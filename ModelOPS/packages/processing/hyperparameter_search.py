@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from typing import List, Optional, Tuple
+from lightgbm import LGBMClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import ParameterGrid, train_test_split
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from packages.processing.config import SEARCH_CONFIG
+from packages.processing.sparse_features import model_input
+
+PARAMETER_SPACES = {
+    'random_forest': {
+        'max_depth': [4, 8, 12, 16, None],
+        'n_estimators': [50, 100, 200, 400],
+        'max_leaf_nodes': [None, 64, 256, 1024]
+    },
+    'lightgbm': {
+        'max_depth': [4, 8, 12, 16, -1],
+        'n_estimators': [50, 100, 200, 400],
+        'num_leaves': [15, 31, 63, 127]
+    }
+}
+
+_worker_matrices = None
+
+
+def successive_halving(engine: str,
+                       data: pd.DataFrame,
+                       target_column: str,
+                       features: List[str],
+                       budget_seconds: float,
+                       random_state: int = 42,
+                       initial_parameters: Optional[dict] = None,
+                       max_workers: Optional[int] = None,
+                       test_size: float = 0.2) -> Tuple[dict, List[dict]]:
+    """
+    Searches the parameter space of an engine with successive halving within a wall-clock budget. Every round fits the
+    remaining candidates on a growing share of the training rows, scores them on held-out validation rows and keeps
+    the best 1/eta of them, so poor configurations stop after fitting on little data. The feature matrix is encoded
+    once as float32 and shared with the worker processes through a memory-mapped file. Sparse features are kept sparse,
+    see sparse_features.model_input, and the CSR matrix is loaded by every worker instead.
+    The rows that train_random_forest_model and train_lightgbm_model hold out as test rows are left out of the search,
+    so that the reported accuracy and permutation importances are measured on rows the parameters were not chosen on.
+
+    :param engine: Either 'random_forest' or 'lightgbm'.
+    :param data: The dataset containing the features and the target column.
+    :param target_column: The name of the target variable column.
+    :param features: The features the models are trained on.
+    :param budget_seconds: Wall-clock time the search may take. The workers of fits still running at the deadline are
+                           terminated.
+    :param random_state: Seed for sampling the candidates, splitting the rows and fitting the models.
+    :param initial_parameters: Parameters always included among the candidates, e.g. the requested max_depth.
+    :param max_workers: Number of fitting processes. Defaults to SEARCH_CONFIG.
+    :param test_size: Share of the rows held out as test rows by the training functions, with the same random_state.
+    :return: The best parameters and the score of every evaluated configuration per round.
+    """
+    deadline = time.monotonic() + budget_seconds
+    candidates = _sample_candidates(engine, SEARCH_CONFIG['candidates'], random_state, initial_parameters)
+
+    train_data, validation_data = search_rows(data, random_state, test_size)
+    matrix_directory = tempfile.mkdtemp()
+    try:
+        _save_matrix(matrix_directory, 'x_train', _feature_matrix(engine, train_data, features))
+        _save_matrix(matrix_directory, 'y_train', train_data[target_column].to_numpy())
+        _save_matrix(matrix_directory, 'x_validation', _feature_matrix(engine, validation_data, features))
+        _save_matrix(matrix_directory, 'y_validation', validation_data[target_column].to_numpy())
+
+        rounds = max(1, int(np.ceil(np.log(len(candidates)) / np.log(SEARCH_CONFIG['eta']))))
+        row_count = max(SEARCH_CONFIG['min_rows'], len(train_data) // SEARCH_CONFIG['eta'] ** rounds)
+        leaderboard = []
+
+        executor = ProcessPoolExecutor(max_workers=max_workers or SEARCH_CONFIG['max_workers'],
+                                       initializer=_initialize_worker, initargs=(matrix_directory,))
+        try:
+            while True:
+                row_count = min(row_count, len(train_data))
+                scores = _evaluate_round(executor, engine, candidates, row_count, random_state, deadline)
+                leaderboard += [{'parameters': candidate, 'rows': row_count, 'score': score}
+                                for candidate, score in zip(candidates, scores) if score is not None]
+
+                ranked = sorted([(score, position) for position, score in enumerate(scores) if score is not None],
+                                key=lambda item: -item[0])
+                if not ranked:
+                    break
+                keep = max(1, len(candidates) // SEARCH_CONFIG['eta'])
+                candidates = [candidates[position] for _, position in ranked[:keep]]
+                print(f"Search round on {row_count} rows kept {len(candidates)} configurations, best score "
+                      f"{ranked[0][0]:.3f}")
+
+                if len(candidates) == 1 and row_count >= len(train_data) or time.monotonic() >= deadline:
+                    break
+                row_count *= SEARCH_CONFIG['eta']
+        finally:
+            if time.monotonic() >= deadline:
+                _terminate_workers(executor)
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        shutil.rmtree(matrix_directory, ignore_errors=True)
+
+    if not leaderboard:
+        return dict(initial_parameters or {}), leaderboard
+    # The best configuration is the one that scored highest on the most rows
+    best = max(leaderboard, key=lambda entry: (entry['rows'], entry['score']))
+    return best['parameters'], leaderboard
+
+
+def search_rows(data: pd.DataFrame, random_state: int, test_size: float = 0.2) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    The training and validation rows of the search: the rows left for training once the test rows of the training
+    functions are split off, split again into training and validation rows.
+    """
+    train_data, _ = train_test_split(data, test_size=test_size, random_state=random_state)
+    return train_test_split(train_data, test_size=SEARCH_CONFIG['validation_size'], random_state=random_state)
+
+
+def save_leaderboard(output_dir: str, parameters: dict, leaderboard: List[dict]) -> None:
+    """
+    Saves the selected parameters and the score of every evaluated configuration to hyperparameter_search.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'hyperparameter_search.json'), 'w') as file:
+        json.dump({'selected': parameters, 'evaluations': leaderboard}, file, indent=2)
+
+
+def build_model(engine: str, parameters: dict, random_state: int, n_jobs: int = -1):
+    if engine == 'lightgbm':
+        return LGBMClassifier(random_state=random_state, class_weight='balanced', n_jobs=n_jobs, verbose=-1,
+                              **parameters)
+    return RandomForestClassifier(random_state=random_state, class_weight='balanced', n_jobs=n_jobs, **parameters)
+
+
+def _sample_candidates(engine: str, count: int, random_state: int, initial_parameters: Optional[dict]) -> List[dict]:
+    grid = list(ParameterGrid(PARAMETER_SPACES[engine]))
+    positions = np.random.default_rng(random_state).permutation(len(grid))[:count]
+    candidates = [grid[position] for position in positions]
+    if initial_parameters:
+        candidates = [dict(initial_parameters)] + [candidate for candidate in candidates
+                                                   if candidate != initial_parameters][:count - 1]
+    return candidates
+
+
+def _evaluate_round(executor: ProcessPoolExecutor, engine: str, candidates: List[dict], row_count: int,
+                    random_state: int, deadline: float) -> List[Optional[float]]:
+    futures = {executor.submit(_evaluate, engine, candidate, row_count, random_state): position
+               for position, candidate in enumerate(candidates)}
+    scores: List[Optional[float]] = [None] * len(candidates)
+
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            scores[futures[future]] = future.result()
+        if time.monotonic() >= deadline:
+            break
+
+    for future in pending:
+        future.cancel()
+    return scores
+
+
+def _terminate_workers(executor: ProcessPoolExecutor) -> None:
+    """
+    Stop the worker processes, including those still fitting, so that abandoned fits do not compete for the CPU with
+    the training that follows the search.
+    """
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _feature_matrix(engine: str, data: pd.DataFrame, features: List[str]):
+    # The same input the training functions fit on, as float32
+    matrix = model_input(data, features, accepts_missing_values=engine == 'lightgbm')
+    return matrix if sp.issparse(matrix) else matrix.to_numpy(dtype=np.float32)
+
+
+def _save_matrix(matrix_directory: str, name: str, matrix) -> None:
+    if sp.issparse(matrix):
+        sp.save_npz(os.path.join(matrix_directory, f'{name}.npz'), matrix, compressed=False)
+    else:
+        np.save(os.path.join(matrix_directory, f'{name}.npy'), matrix)
+
+
+def _load_matrix(matrix_directory: str, name: str):
+    sparse_path = os.path.join(matrix_directory, f'{name}.npz')
+    if os.path.exists(sparse_path):
+        return sp.load_npz(sparse_path)
+    return np.load(os.path.join(matrix_directory, f'{name}.npy'), mmap_mode='r')
+
+
+def _initialize_worker(matrix_directory: str) -> None:
+    global _worker_matrices
+    _worker_matrices = {name: _load_matrix(matrix_directory, name)
+                        for name in ('x_train', 'y_train', 'x_validation', 'y_validation')}
+
+
+def _evaluate(engine: str, parameters: dict, row_count: int, random_state: int) -> float:
+    model = build_model(engine, parameters, random_state, n_jobs=1)
+    model.fit(_worker_matrices['x_train'][:row_count], _worker_matrices['y_train'][:row_count])
+    predictions = model.predict(_worker_matrices['x_validation'])
+    return float(accuracy_score(_worker_matrices['y_validation'], predictions))
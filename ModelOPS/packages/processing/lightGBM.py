@@ -1,58 +1,98 @@
 import os
-import shap
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import scipy.stats as stats
 from pandas import DataFrame
-import matplotlib.pyplot as plt
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 from lightgbm import LGBMClassifier
+from packages.data_access import loader
+from packages.preprocessing.pipeline import PreprocessingPipeline, find_pipeline
+from packages.processing.sparse_features import model_input, sparse_columns
+from packages.model_handler import incremental, registry as model_registry
+from packages.processing import feature_screening, hyperparameter_search, permutation_importance, plotting, \
+    shap_engine
 
 import matplotlib
 matplotlib.use('Agg')
 
+MODEL_ENGINE = 'lightgbm'
+
 
 def perform_kruskal_wallis_test(data: pd.DataFrame, target_column: str, p_value_threshold: float = 0.05) -> List[str]:
     """
     Performs the Kruskal-Wallis test to determine if there are statistically significant differences between the distributions of each numerical feature across the categories defined by the target column.
     """
-    significant_features = []
-    for feature in data.columns:
-        if feature == target_column or data[feature].dtype == 'object':
-            continue
-        grouped_data = [group.dropna() for _, group in data.groupby(target_column)[feature]]
-        if len(grouped_data) > 1:
-            stat, p_value = stats.kruskal(*grouped_data)
-            if p_value < p_value_threshold:
-                significant_features.append(feature)
-    return significant_features
+    return feature_screening.kruskal_wallis_screening(data, target_column, p_value_threshold)
 
 
-def train_lightgbm_model(combined_data: pd.DataFrame, target_column: str, features: List[str], max_depth: int, random_state: int) -> tuple[DataFrame, LGBMClassifier, Any]:
+def train_lightgbm_model(combined_data: pd.DataFrame, target_column: str, features: List[str], max_depth: int, random_state: int,
+                         init_model: Optional[LGBMClassifier] = None, n_estimators: int = 100,
+                         parameters: Optional[dict] = None) -> tuple[DataFrame, LGBMClassifier, Any]:
     """
     Trains an LGBMClassifier using specified features, returns feature importances as percentages, and evaluates the model's accuracy on a test set.
+    Sparse feature columns are passed to fit as a CSR matrix, see sparse_features.model_input.
+    When init_model is given, boosting continues from its booster for n_estimators more rounds. Parameters from the
+    hyperparameter search override max_depth and n_estimators.
     """
     train_data, test_data = train_test_split(combined_data, test_size=0.2, random_state=random_state)
-    model = LGBMClassifier(max_depth=max_depth, random_state=random_state, class_weight='balanced')
-    model.fit(train_data[features], train_data[target_column], categorical_feature='auto')
+    model = hyperparameter_search.build_model(MODEL_ENGINE, {'max_depth': max_depth, 'n_estimators': n_estimators,
+                                                             **(parameters or {})}, random_state)
+    model.fit(model_input(train_data, features), train_data[target_column], categorical_feature='auto',
+              init_model=init_model)
+
+    return evaluate_model(model, test_data, target_column, features), model, test_data
+
 
+def evaluate_model(model: LGBMClassifier, test_data: pd.DataFrame, target_column: str, features: List[str]) -> DataFrame:
+    """
+    Reports the feature importances of a trained model as percentages, followed by its accuracy on the test set.
+    """
     importances = model.feature_importances_
     importances_percentage = 100 * importances / importances.sum()
     feature_importances_df = pd.DataFrame({'Feature': features, 'Importance (%)': importances_percentage})
     feature_importances_df = feature_importances_df.sort_values(by='Importance (%)', ascending=False)
 
-    predictions = model.predict(test_data[features])
+    predictions = model.predict(model_input(test_data, features))
     accuracy = accuracy_score(test_data[target_column], predictions)
     accuracy = round(accuracy, 2)
     feature_importances_df.loc[len(feature_importances_df)] = ['Accuracy', accuracy * 100]
 
-    return feature_importances_df, model, test_data
+    return feature_importances_df
 
 
-def apply_shap_explanations(model, test_data: pd.DataFrame, features: List[str], output_dir: str) -> None:
+def retrain_incrementally(model: LGBMClassifier, metadata: dict, source_files: List[str], fingerprints: Dict[str, str],
+                          pipeline: Optional[PreprocessingPipeline], target_column: str, added_rounds: int,
+                          max_depth: int, random_state: int) -> Optional[tuple]:
+    """
+    Continues boosting from a stored model on the data files that are new since it was saved, so that the cost of
+    retraining depends on the new data rather than on all of it. The model keeps the features it was trained on, and
+    the rows of raw files are transformed with its preprocessing pipeline, see incremental.load_rows.
+    Returns the feature importances, the model, the test rows, the loaded data, the features and the fingerprints of
+    every file the model has been trained on, or None if the new data calls for training a new model.
+    """
+    features = metadata['features']
+    new_files = incremental.new_data_files(source_files, fingerprints, metadata)
+    data = incremental.load_rows(new_files or source_files, features, target_column, pipeline)
+
+    if new_files:
+        if not np.array_equal(np.unique(data[target_column]), model.classes_):
+            print("The new data does not hold the classes of the stored model. Retraining a new model...")
+            return None
+        print(f"Continuing boosting for {added_rounds} rounds on {len(new_files)} new data files...")
+        feature_importances_df, model, test_data = train_lightgbm_model(data, target_column, features, max_depth,
+                                                                        random_state, model, added_rounds)
+    else:
+        print("No new data files since the model was saved. Evaluating the stored model...")
+        _, test_data = train_test_split(data, test_size=0.2, random_state=random_state)
+        feature_importances_df = evaluate_model(model, test_data, target_column, features)
+
+    trained_files = sorted(set(metadata.get('trained_files', [])) | set(fingerprints.values()))
+    return feature_importances_df, model, test_data, data, features, trained_files
+
+
+def apply_shap_explanations(model, test_data: pd.DataFrame, features: List[str], output_dir: str,
+                            render: bool = True, target_column: Optional[str] = None) -> None:
     """
     Apply SHAP to explain the model's predictions for each class in a multi-class or binary model
     and save the results in separate bar plots for each class.
@@ -61,72 +101,43 @@ def apply_shap_explanations(model, test_data: pd.DataFrame, features: List[str],
     :param test_data: The dataset containing the features.
     :param features: List of feature names used in the model.
     :param output_dir: Directory where the SHAP plots will be saved.
+    :param render: Whether to render the plots now. When False, the SHAP values are saved for on-demand rendering.
+    :param target_column: Optional target column of test_data, used to stratify the rows sampled for SHAP.
     """
+    results_dir = output_dir
     output_dir = os.path.join(output_dir, "shap")
-    os.makedirs(output_dir, exist_ok=True)
-
-    filtered_test_data = test_data[features]
+    if render:
+        os.makedirs(output_dir, exist_ok=True)
 
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(filtered_test_data)
+    target = test_data[target_column] if target_column else None
+    shap_values, filtered_test_data, expected_value = shap_engine.explain(model, test_data[features], target,
+                                                                          os.path.join(results_dir, 'model'))
 
     if isinstance(shap_values, np.ndarray) and len(shap_values.shape) == 3:
         mean_abs_shap_values = np.mean(np.abs(shap_values), axis=(0, 2))
 
         shap_values_mean = np.mean(shap_values, axis=2)
 
-        plt.figure()
-        plt.bar(features, mean_abs_shap_values)
-        plt.title('Average Impact of Features Across All Classes')
-        plt.xlabel('Features')
-        plt.ylabel('Mean Absolute SHAP Value')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, 'consolidated_shap_summary_plot.png'))
-        plt.close()
-
-        shap.summary_plot(shap_values_mean, filtered_test_data, feature_names=features, show=False, plot_size=(20, 15))
-        plt.savefig(os.path.join(output_dir, 'shap_summary_dot_plot.png'))
-        plt.close()
-
-        shap.summary_plot(shap_values_mean, filtered_test_data, plot_type="bar", feature_names=features, show=False,
-                          plot_size=(20, 15))
-        plt.savefig(os.path.join(output_dir, 'shap_summary_bar_plot.png'))
-        plt.close()
-
-        instance_index = 0
-        shap_values_instance = np.mean(shap_values[instance_index, :, :], axis=1)
-        shap.force_plot(explainer.expected_value[0], shap_values_instance,
-                        features=filtered_test_data.iloc[instance_index, :], show=False, matplotlib=True,
-                        figsize=(40, 10))
-        plt.savefig(os.path.join(output_dir, 'force_plot_instance.png'))
-        plt.close()
+        if not render:
+            plotting.defer_shap_figures(shap_values_mean, mean_abs_shap_values, filtered_test_data, features,
+                                        expected_value[0], results_dir,
+                                        'Average Impact of Features Across All Classes')
+            return
+
+        plotting.render_figures(plotting.shap_figure_tasks(shap_values_mean, mean_abs_shap_values, filtered_test_data,
+                                                           features, expected_value[0], output_dir,
+                                                           'Average Impact of Features Across All Classes'))
     else:
         mean_abs_shap_values = np.abs(shap_values).mean(0)
 
-        plt.figure()
-        plt.bar(features, mean_abs_shap_values)
-        plt.title('Average Impact of Features')
-        plt.xlabel('Features')
-        plt.ylabel('Mean Absolute SHAP Value')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, 'consolidated_shap_summary_plot.png'))
-        plt.close()
-
-        shap.summary_plot(shap_values, filtered_test_data, feature_names=features, show=False, plot_size=(20, 15))
-        plt.savefig(os.path.join(output_dir, 'shap_summary_dot_plot.png'))
-        plt.close()
-
-        shap.summary_plot(shap_values, filtered_test_data, plot_type="bar", feature_names=features, show=False, plot_size=(20, 15))
-        plt.savefig(os.path.join(output_dir, 'shap_summary_bar_plot.png'))
-        plt.close()
+        if not render:
+            plotting.defer_shap_figures(shap_values, mean_abs_shap_values, filtered_test_data, features,
+                                        expected_value, results_dir, 'Average Impact of Features')
+            return
 
-        instance_index = 0
-        shap.force_plot(explainer.expected_value, shap_values[instance_index, :],
-                        features=filtered_test_data.iloc[instance_index, :], show=False, matplotlib=True, figsize=(40, 10))
-        plt.savefig(os.path.join(output_dir, 'force_plot_instance.png'))
-        plt.close()
+        plotting.render_figures(plotting.shap_figure_tasks(shap_values, mean_abs_shap_values, filtered_test_data,
+                                                           features, expected_value, output_dir,
+                                                           'Average Impact of Features'))
 
 
 def save_results(directory: str, filename: str, data: pd.DataFrame) -> None:
@@ -140,30 +151,27 @@ def save_results(directory: str, filename: str, data: pd.DataFrame) -> None:
             file.write(f"{row['Feature']}:{row['Importance (%)']}\n")
 
 
-def create_violin_plots(data: pd.DataFrame, target_column: str, features: List[str], output_dir: str) -> None:
+def create_violin_plots(data: pd.DataFrame, target_column: str, features: List[str], output_dir: str,
+                        render: bool = True) -> Dict[str, float]:
     """
     Creates and saves violin plots for each significant feature against the target variable, with added statistical annotations.
+    The figures are rendered on the plot rendering pool and the time each figure took is returned, keyed by file path.
+    When render is False, the plotted data is saved instead and the figures are rendered on demand.
     """
+    if not render:
+        plotting.defer_distribution_plots(data, target_column, features, output_dir, 'violin_plot')
+        return {}
+
     plots_dir = os.path.join(output_dir, 'graphics')
     os.makedirs(plots_dir, exist_ok=True)
-    for feature in features:
-        plt.figure(figsize=(12, 8))
-        sns.violinplot(x=target_column, y=feature, data=data, inner=None)
-        sns.swarmplot(x=target_column, y=feature, data=data, color='k', alpha=0.5)
-
-        grouped = data.groupby(target_column)[feature]
-        means = grouped.mean()
-        stds = grouped.std()
-        counts = grouped.count()
+    return plotting.render_figures([(plotting.violin_plot, (data[[target_column, feature]], target_column, feature,
+                                                            plots_dir)) for feature in features])
 
-        for i, (mean, std, count) in enumerate(zip(means, stds, counts)):
-            plt.text(i, data[feature].max(), f'Mean: {mean:.2f}\nSD: {std:.2f}\nCount: {count}', color='red', ha='center', va='top')
 
-        plt.title(f'Violin Plot for {feature} by {target_column}')
-        plt.xlabel('Disease Stage')
-        plt.ylabel(f'{feature} Measurement')
-        plt.savefig(os.path.join(plots_dir, f'violin_plot_{feature}.png'))
-        plt.close()
+def _pipeline_state(data_dir: str) -> Optional[dict]:
+    # Saved with the model, so that /predict can transform raw rows into the features the model was trained on
+    pipeline = find_pipeline(data_dir)
+    return pipeline.to_dict() if pipeline is not None else None
 
 
 def run(data_dir: str,
@@ -172,48 +180,117 @@ def run(data_dir: str,
         max_depth: int = 15,
         random_state: int = 42,
         p_value_threshold: float = 0.05,
-        excluded_columns: Optional[List[str]] = None) -> None:
+        excluded_columns: Optional[List[str]] = None,
+        render_artifacts: bool = True,
+        user_id: Optional[str] = None,
+        label: Optional[str] = None,
+        incremental_rounds: int = 0,
+        search_budget_seconds: Optional[float] = None,
+        importance_method: str = 'impurity',
+        default_data_path: Optional[str] = None) -> None:
     """
     Main function to execute the feature selection, model training, and model evaluation pipeline.
 
-    :param data_dir: The directory containing the data files.
+    :param data_dir: The directory containing the data files, either local or a minio:// prefix.
     :param output_dir: The directory where all outputs will be saved.
     :param target_column: The name of the target variable for model training.
     :param max_depth: Maximum depth of trees in the RandomForest model.
     :param random_state: Random seed for model reproducibility.
     :param p_value_threshold: Threshold for determining feature significance via Kruskal-Wallis test.
     :param excluded_columns: Optional list of column names to exclude from processing.
+    :param render_artifacts: Whether to render the violin plots and SHAP figures, or only save their data for
+                             on-demand rendering.
+    :param user_id: When set together with the label, the trained model is saved to the model registry.
+    :param label: Label of the model in the model registry.
+    :param incremental_rounds: When positive and the registry holds a model for the user and label, boosting continues
+                               from that model for this many rounds on the data files that are new since it was saved.
+    :param search_budget_seconds: When set, a new model is trained with the parameters selected by a successive
+                                  halving search that runs for at most this many seconds.
+    :param importance_method: Either 'impurity', for the importances of the trees, or 'permutation', for the accuracy
+                              drop on the held-out rows when each feature is shuffled.
+    :param default_data_path: The directory of the raw files the processed files were made from. When set, those are
+                              the files fingerprinted for the model registry, and incremental boosting transforms
+                              their rows with the preprocessing pipeline of the stored model.
     """
     print("Starting data processing...")
-    data_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.csv')]
-    data_frames = [pd.read_csv(f) for f in data_files]
-    combined_data = pd.concat(data_frames, ignore_index=True)
-    combined_data[target_column].fillna(0, inplace=True)
-
-    if excluded_columns:
-        combined_data = combined_data.drop(columns=excluded_columns, errors='ignore')
-    print("Data loaded and processed.")
-
-    print("Evaluating feature significance using Kruskal-Wallis test...")
-    significant_features = perform_kruskal_wallis_test(combined_data, target_column, p_value_threshold)
-    #significant_features = []
-    #for col in combined_data.columns:
-        #if col != target_column:
-            #significant_features.append(col)
-    print(f"Significant features found: {len(significant_features)} - {significant_features}")
+    data_files = loader.list_data_files(data_dir)
+    source_files = loader.list_csv_files(default_data_path) if default_data_path else data_files
+    use_registry = bool(user_id and label)
+    fingerprints = incremental.file_fingerprints(source_files) if use_registry else {}
+
+    retrained, pipeline = None, None
+    if use_registry and incremental_rounds:
+        previous_model, metadata = incremental.load_previous_model(user_id, label, MODEL_ENGINE, target_column)
+        if previous_model is not None:
+            # Processed files are already transformed, by the pipeline fitted in this session
+            pipeline = incremental.model_pipeline(metadata, data_dir) if default_data_path else None
+            retrained = retrain_incrementally(previous_model, metadata, source_files, fingerprints, pipeline,
+                                              target_column, incremental_rounds, max_depth, random_state)
+
+    if retrained is not None:
+        feature_importances_df, model, test_data, combined_data, significant_features, trained_files = retrained
+        # A grown model keeps the pipeline its stored trees were trained with, not the one fitted in this session
+        pipeline_state = pipeline.to_dict() if pipeline is not None else metadata.get('pipeline')
+    else:
+        trained_files = list(fingerprints.values())
+        pipeline_state = _pipeline_state(data_dir)
+        data_frames = [loader.read_data_file(f) for f in data_files]
+        combined_data = pd.concat(data_frames, ignore_index=True)
+        combined_data[target_column].fillna(0, inplace=True)
+
+        if excluded_columns:
+            combined_data = combined_data.drop(columns=excluded_columns, errors='ignore')
+        print("Data loaded and processed.")
+
+        print("Evaluating feature significance using Kruskal-Wallis test...")
+        significant_features = perform_kruskal_wallis_test(combined_data, target_column, p_value_threshold)
+        #significant_features = []
+        #for col in combined_data.columns:
+            #if col != target_column:
+                #significant_features.append(col)
+        print(f"Significant features found: {len(significant_features)} - {significant_features}")
+
+        if significant_features:
+            parameters = None
+            if search_budget_seconds:
+                print(f"Searching hyperparameters for at most {search_budget_seconds} seconds...")
+                parameters, leaderboard = hyperparameter_search.successive_halving(
+                    MODEL_ENGINE, combined_data, target_column, significant_features, search_budget_seconds,
+                    random_state, {'max_depth': max_depth, 'n_estimators': 100, 'num_leaves': 31})
+                hyperparameter_search.save_leaderboard(output_dir, parameters, leaderboard)
+                print(f"Selected hyperparameters: {parameters}")
+
+            print("Training LightGBM model on significant features only...")
+            feature_importances_df, model, test_data = train_lightgbm_model(combined_data, target_column, significant_features, max_depth, random_state,
+                                                                            parameters=parameters)
 
     if significant_features:
-        print("Training LightGBM model on significant features only...")
-        feature_importances_df, model, test_data = train_lightgbm_model(combined_data, target_column, significant_features, max_depth, random_state)
+        if importance_method == 'permutation' and sparse_columns(test_data, significant_features):
+            print("Permutation importances need dense features, keeping the impurity importances of the sparse model.")
+        elif importance_method == 'permutation':
+            print("Computing permutation importances on the held-out rows...")
+            feature_importances_df = permutation_importance.permutation_importances(model, test_data, target_column,
+                                                                                    significant_features)
+
+        if use_registry:
+            model_registry.get_registry().save(user_id, label, MODEL_ENGINE, significant_features, model,
+                                               {'target_column': target_column, 'max_depth': max_depth,
+                                                'random_state': random_state, 'trained_files': trained_files,
+                                                'pipeline': pipeline_state})
+            print("Model saved to the model registry.")
+
         save_results(output_dir, 'feature_importances.txt', feature_importances_df)
         print("Feature importances and model accuracy saved.")
 
         print("Creating violin plots for significant features...")
-        create_violin_plots(combined_data, target_column, significant_features, output_dir)
+        # Sparse one-hot indicators have no distribution worth plotting and would have to be densified
+        sparse_features = sparse_columns(combined_data, significant_features)
+        plotted_features = [feature for feature in significant_features if feature not in sparse_features]
+        create_violin_plots(combined_data, target_column, plotted_features, output_dir, render_artifacts)
         print("Violin plots saved.")
 
         print("Applying SHAP for model explanation...")
-        apply_shap_explanations(model, test_data, significant_features, output_dir)
+        apply_shap_explanations(model, test_data, significant_features, output_dir, render_artifacts, target_column)
         print("SHAP explanations saved.")
 
     print("Analysis complete. Results and plots are saved.")
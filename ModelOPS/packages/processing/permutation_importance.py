@@ -0,0 +1,142 @@
+import os
+import shutil
+import warnings
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+from sklearn.metrics import accuracy_score
+from concurrent.futures import ProcessPoolExecutor
+from packages.processing.config import PERMUTATION_CONFIG
+from packages.processing.sparse_features import sparse_columns
+
+_worker_state = None
+
+
+def permutation_importances(model,
+                            test_data: pd.DataFrame,
+                            target_column: str,
+                            features: List[str],
+                            max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Measures how much the accuracy on the held-out rows drops when each feature is shuffled, which unlike the impurity
+    importance of the trees does not favour features with many distinct values. Blocks of features are permuted in
+    parallel on a process pool that shares one contiguous float32 copy of the test matrix. Repeats are added in rounds
+    until the 95% confidence interval of every feature's mean drop is narrower than the configured tolerance.
+    Sparse features are rejected, since the test matrix would have to be densified to permute them.
+
+    :param model: The trained model.
+    :param test_data: The held-out rows, containing the features and the target column.
+    :param target_column: The name of the target variable column.
+    :param features: The features used in the model.
+    :param max_workers: Number of permuting processes. Defaults to PERMUTATION_CONFIG; 1 permutes in this process.
+    :return: A DataFrame containing each feature's importance as a percentage and the accuracy of the model, in the
+             format written by save_results.
+    :raises ValueError: If some of the features are sparse.
+    """
+    sparse_features = sparse_columns(test_data, features)
+    if sparse_features:
+        raise ValueError(f"Permutation importances need dense features, but {len(sparse_features)} features are "
+                         f"sparse, e.g. {sparse_features[0]}. Use the impurity importances or dense encoding instead.")
+
+    matrix = np.ascontiguousarray(test_data[features].to_numpy(dtype=np.float32))
+    target = test_data[target_column].to_numpy()
+    baseline = accuracy_score(target, _predict(model, matrix))
+
+    block_size = PERMUTATION_CONFIG['block_size']
+    blocks = [list(range(start, min(start + block_size, len(features))))
+              for start in range(0, len(features), block_size)]
+    drops = [[] for _ in features]
+    active = list(range(len(features)))
+    max_workers = min(max_workers or PERMUTATION_CONFIG['max_workers'], len(blocks))
+
+    matrix_directory = tempfile.mkdtemp()
+    executor = None
+    try:
+        if max_workers > 1:
+            np.save(os.path.join(matrix_directory, 'matrix.npy'), matrix)
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_initialize_worker,
+                                           initargs=(model, os.path.join(matrix_directory, 'matrix.npy'), target,
+                                                     baseline))
+
+        round_number = 0
+        while active and len(drops[active[0]]) < PERMUTATION_CONFIG['max_repeats']:
+            active_blocks = [[position for position in block if position in active] for block in blocks]
+            active_blocks = [block for block in active_blocks if block]
+            seeds = [PERMUTATION_CONFIG['random_state'] + round_number * len(features) + block[0]
+                     for block in active_blocks]
+            repeats = PERMUTATION_CONFIG['repeats_per_round']
+
+            if executor is None:
+                results = [_score_block(model, matrix, target, baseline, block, repeats, seed)
+                           for block, seed in zip(active_blocks, seeds)]
+            else:
+                results = list(executor.map(_worker_score_block, active_blocks, [repeats] * len(active_blocks),
+                                            seeds))
+
+            for block, block_drops in zip(active_blocks, results):
+                for position, feature_drops in zip(block, block_drops):
+                    drops[position].extend(feature_drops)
+
+            active = [position for position in active if not _converged(drops[position])]
+            round_number += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        shutil.rmtree(matrix_directory, ignore_errors=True)
+
+    mean_drops = np.clip(np.array([np.mean(feature_drops) for feature_drops in drops]), 0.0, None)
+    total = mean_drops.sum()
+    importances_percentage = 100 * mean_drops / total if total > 0 else np.zeros(len(features))
+    print(f"Permutation importances computed with up to {max(len(d) for d in drops)} repeats per feature.")
+
+    feature_importances_df = pd.DataFrame({'Feature': features, 'Importance (%)': importances_percentage})
+    feature_importances_df = feature_importances_df.sort_values(by='Importance (%)', ascending=False)
+    feature_importances_df.loc[len(feature_importances_df)] = ['Accuracy', round(baseline, 2) * 100]
+    return feature_importances_df
+
+
+def _converged(feature_drops: List[float]) -> bool:
+    if len(feature_drops) < 2:
+        return False
+    half_width = 1.96 * np.std(feature_drops, ddof=1) / np.sqrt(len(feature_drops))
+    return half_width < PERMUTATION_CONFIG['confidence_tolerance']
+
+
+def _score_block(model, matrix: np.ndarray, target: np.ndarray, baseline: float, positions: List[int],
+                 repeats: int, seed: int) -> List[List[float]]:
+    """
+    Accuracy drops of each feature of a block over several permutations. The matrix is permuted one column at a time
+    in place and every column is restored before the next one is permuted.
+    """
+    rng = np.random.default_rng(seed)
+    block_drops = []
+    for position in positions:
+        original = matrix[:, position].copy()
+        feature_drops = []
+        for _ in range(repeats):
+            matrix[:, position] = rng.permutation(original)
+            feature_drops.append(baseline - accuracy_score(target, _predict(model, matrix)))
+        matrix[:, position] = original
+        block_drops.append(feature_drops)
+    return block_drops
+
+
+def _predict(model, matrix: np.ndarray) -> np.ndarray:
+    # The model was fitted on a DataFrame; the matrix holds the same columns in the same order
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        return model.predict(matrix)
+
+
+def _initialize_worker(model, matrix_path: str, target: np.ndarray, baseline: float) -> None:
+    global _worker_state
+    # The pool already runs one process per core, so each model predicts on a single thread
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=1)
+    _worker_state = (model, np.array(np.load(matrix_path, mmap_mode='r')), target, baseline)
+
+
+def _worker_score_block(positions: List[int], repeats: int, seed: int) -> List[List[float]]:
+    model, matrix, target, baseline = _worker_state
+    return _score_block(model, matrix, target, baseline, positions, repeats, seed)
@@ -0,0 +1,213 @@
+import os
+import time
+import shap
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from packages.processing.config import PLOT_CONFIG
+from packages.artifact_handler import artifacts
+
+import matplotlib
+matplotlib.use('Agg')
+
+FigureTask = Tuple[Callable[..., str], tuple]
+
+
+def render_figures(figure_tasks: List[FigureTask], max_workers: Optional[int] = None) -> Dict[str, float]:
+    """
+    Renders figures on a process pool, each task drawing and saving a single figure with the Agg backend.
+
+    :param figure_tasks: Pairs of a module-level render function returning the saved file path and its arguments.
+    :param max_workers: Number of rendering processes. Defaults to PLOT_CONFIG; 1 renders in the current process.
+    :return: The time in seconds each figure took, keyed by the path of the saved file.
+    """
+    max_workers = min(max_workers or PLOT_CONFIG['max_workers'], len(figure_tasks))
+    if max_workers <= 1:
+        results = [_timed_render(function, args) for function, args in figure_tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_timed_render, function, args) for function, args in figure_tasks]
+            results = [future.result() for future in futures]
+
+    timings = {}
+    for path, seconds in results:
+        print(f"Rendered {path} in {seconds:.2f}s")
+        timings[path] = seconds
+    return timings
+
+
+def _timed_render(function: Callable[..., str], args: tuple) -> Tuple[str, float]:
+    start = time.perf_counter()
+    path = function(*args)
+    return path, time.perf_counter() - start
+
+
+def downsample_strips(data: pd.DataFrame, target_column: str, max_points: Optional[int] = None) -> pd.DataFrame:
+    """
+    Keeps at most max_points rows per category of the target column, for the scatter overlays of the distribution
+    plots. The first row of every category is always kept, so the categories appear in the same order as in the data.
+
+    :param data: The data to plot.
+    :param target_column: The column whose categories form the strips.
+    :param max_points: Maximum number of rows per category. Defaults to PLOT_CONFIG.
+    :return: The downsampled data, in the original row order.
+    """
+    max_points = max_points or PLOT_CONFIG['max_points_per_strip']
+    rng = np.random.default_rng(PLOT_CONFIG['random_state'])
+
+    positions = []
+    for group_positions in data.groupby(target_column).indices.values():
+        if len(group_positions) > max_points:
+            sampled = rng.choice(group_positions[1:], max_points - 1, replace=False)
+            group_positions = np.concatenate([group_positions[:1], sampled])
+        positions.append(group_positions)
+
+    if not positions:
+        return data
+    return data.iloc[np.sort(np.concatenate(positions))]
+
+
+def _annotate_groups(data: pd.DataFrame, target_column: str, feature: str) -> None:
+    grouped = data.groupby(target_column)[feature]
+    means = grouped.mean()
+    stds = grouped.std()
+    counts = grouped.count()
+
+    for i, (mean, std, count) in enumerate(zip(means, stds, counts)):
+        plt.text(i, data[feature].max(), f'Mean: {mean:.2f}\nSD: {std:.2f}\nCount: {count}',
+                 color='red', ha='center', va='top')
+
+
+def box_plot(data: pd.DataFrame, target_column: str, feature: str, plots_dir: str) -> str:
+    """
+    Box plot of a feature by target category with a downsampled strip overlay, or a count plot for categorical features.
+    """
+    plt.figure(figsize=(12, 8))
+    if pd.api.types.is_numeric_dtype(data[feature]):
+        sns.boxplot(x=target_column, y=feature, data=data)
+        sns.stripplot(x=target_column, y=feature, data=downsample_strips(data, target_column), color='k', alpha=0.5,
+                      size=3)
+        _annotate_groups(data, target_column, feature)
+        plt.ylabel(f'{feature} Measurement')
+    else:
+        sns.countplot(x=target_column, hue=feature, data=data)
+        plt.ylabel('Count')
+
+    plt.title(f'{feature} by {target_column}')
+    plt.xlabel(target_column)
+    path = os.path.join(plots_dir, f'plot_{feature}.png')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def violin_plot(data: pd.DataFrame, target_column: str, feature: str, plots_dir: str) -> str:
+    """
+    Violin plot of a feature by target category with a downsampled swarm overlay.
+    """
+    plt.figure(figsize=(12, 8))
+    sns.violinplot(x=target_column, y=feature, data=data, inner=None)
+    swarm_data = downsample_strips(data, target_column, PLOT_CONFIG['max_points_per_swarm'])
+    sns.swarmplot(x=target_column, y=feature, data=swarm_data, color='k', alpha=0.5)
+    _annotate_groups(data, target_column, feature)
+
+    plt.title(f'Violin Plot for {feature} by {target_column}')
+    plt.xlabel('Disease Stage')
+    plt.ylabel(f'{feature} Measurement')
+    path = os.path.join(plots_dir, f'violin_plot_{feature}.png')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def shap_importance_bar_plot(features: List[str], mean_abs_shap_values: np.ndarray, title: str, path: str) -> str:
+    plt.figure()
+    plt.bar(features, mean_abs_shap_values)
+    plt.title(title)
+    plt.xlabel('Features')
+    plt.ylabel('Mean Absolute SHAP Value')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def shap_summary_plot(shap_values: np.ndarray, data: pd.DataFrame, features: List[str], plot_type: Optional[str],
+                      path: str) -> str:
+    shap.summary_plot(shap_values, data, plot_type=plot_type, feature_names=features, show=False, plot_size=(20, 15))
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def shap_force_plot(expected_value: Any, shap_values: np.ndarray, instance: pd.Series, path: str) -> str:
+    shap.force_plot(expected_value, shap_values, features=instance, show=False, matplotlib=True, figsize=(40, 10))
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def shap_figure_tasks(shap_values: np.ndarray, mean_abs_shap_values: np.ndarray, data: pd.DataFrame,
+                      features: List[str], expected_value: Any, output_dir: str, title: str) -> List[FigureTask]:
+    """
+    Builds the render tasks of the SHAP figures shared by the models: the mean absolute SHAP value per feature, the dot
+    and bar summary plots, and the force plot of the first instance.
+
+    :param shap_values: SHAP values of shape (samples, features).
+    :param mean_abs_shap_values: Mean absolute SHAP value of every feature.
+    :param data: The explained rows, restricted to the features.
+    :param features: List of feature names used in the model.
+    :param expected_value: Expected value of the explainer for the explained output.
+    :param output_dir: Directory where the SHAP plots will be saved.
+    :param title: Title of the mean absolute SHAP value plot.
+    :return: The render tasks, to be passed to render_figures.
+    """
+    return [
+        (shap_importance_bar_plot, (features, mean_abs_shap_values, title,
+                                    os.path.join(output_dir, 'consolidated_shap_summary_plot.png'))),
+        (shap_summary_plot, (shap_values, data, features, None, os.path.join(output_dir, 'shap_summary_dot_plot.png'))),
+        (shap_summary_plot, (shap_values, data, features, 'bar', os.path.join(output_dir, 'shap_summary_bar_plot.png'))),
+        (shap_force_plot, (expected_value, shap_values[0, :], data.iloc[0, :],
+                           os.path.join(output_dir, 'force_plot_instance.png')))
+    ]
+
+
+def defer_distribution_plots(data: pd.DataFrame, target_column: str, features: List[str], output_dir: str,
+                             renderer: str) -> None:
+    """
+    Saves the plotted columns and their per-category statistics as artifacts and registers one box or violin plot per
+    feature, so that the figures are rendered on demand instead of during training.
+
+    :param data: The dataset containing the features and the target column.
+    :param target_column: The name of the target variable column in the dataset.
+    :param features: The features to plot.
+    :param output_dir: Directory where the training outputs are saved.
+    :param renderer: Either 'box_plot' or 'violin_plot'.
+    """
+    file_prefix = 'plot' if renderer == 'box_plot' else 'violin_plot'
+    artifacts.save_frame(output_dir, artifacts.PLOT_DATA_FILE, data[[target_column] + features])
+    artifacts.save_group_statistics(output_dir, data, target_column, features)
+    for feature in features:
+        artifacts.register(output_dir, f'graphics/{file_prefix}_{feature}.png', renderer,
+                           target_column=target_column, feature=feature)
+
+
+def defer_shap_figures(shap_values: np.ndarray, mean_abs_shap_values: np.ndarray, data: pd.DataFrame,
+                       features: List[str], expected_value: Any, output_dir: str, title: str) -> None:
+    """
+    Saves the SHAP values and the explained rows as artifacts and registers the figures built by shap_figure_tasks,
+    so that they are rendered on demand instead of during training.
+    """
+    artifacts.save_array(output_dir, artifacts.SHAP_VALUES_FILE, shap_values)
+    artifacts.save_array(output_dir, artifacts.MEAN_ABS_SHAP_VALUES_FILE, mean_abs_shap_values)
+    artifacts.save_frame(output_dir, artifacts.SHAP_DATA_FILE, data)
+
+    artifacts.register(output_dir, 'shap/consolidated_shap_summary_plot.png', 'shap_importance',
+                       features=features, title=title)
+    artifacts.register(output_dir, 'shap/shap_summary_dot_plot.png', 'shap_summary', features=features, plot_type=None)
+    artifacts.register(output_dir, 'shap/shap_summary_bar_plot.png', 'shap_summary', features=features, plot_type='bar')
+    artifacts.register(output_dir, 'shap/force_plot_instance.png', 'shap_force', expected_value=float(expected_value))
@@ -1,21 +1,24 @@
 import os
-import shap
-import joblib
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import scipy.stats as stats
 from pandas import DataFrame
-import matplotlib.pyplot as plt
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from sklearn.metrics import accuracy_score
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
+from packages.data_access import loader
+from packages.preprocessing.pipeline import PreprocessingPipeline, find_pipeline
+from packages.processing.sparse_features import model_input, sparse_columns
+from packages.model_handler import incremental, registry as model_registry
+from packages.processing import feature_screening, hyperparameter_search, permutation_importance, plotting, \
+    shap_engine
 
 
 import matplotlib
 matplotlib.use('Agg')
 
+MODEL_ENGINE = 'random_forest'
+
 
 def perform_kruskal_wallis_test(data: pd.DataFrame, target_column: str, p_value_threshold: float = 0.05) -> List[str]:
     """
@@ -27,48 +30,133 @@ def perform_kruskal_wallis_test(data: pd.DataFrame, target_column: str, p_value_
 
     :return: A list of significant features based on the Kruskal-Wallis test.
     """
-    significant_features = []
-    for feature in data.columns:
-        if feature == target_column or data[feature].dtype == 'object':
-            continue
-        grouped_data = [group.dropna() for _, group in data.groupby(target_column)[feature]]
-        if len(grouped_data) > 1:
-            stat, p_value = stats.kruskal(*grouped_data)
-            if p_value < p_value_threshold:
-                significant_features.append(feature)
-    return significant_features
-
-
-def train_random_forest_model(combined_data: pd.DataFrame, target_column: str, features: List[str], max_depth: int, random_state: int) -> tuple[DataFrame, RandomForestClassifier, Any]:
+    return feature_screening.kruskal_wallis_screening(data, target_column, p_value_threshold)
+
+
+def train_random_forest_model(combined_data: pd.DataFrame, target_column: str, features: List[str], max_depth: int, random_state: int,
+                              parameters: Optional[dict] = None) -> tuple[DataFrame, RandomForestClassifier, Any]:
     """
     Trains a RandomForestClassifier using specified features, returns feature importances as percentages, and evaluates the model's accuracy on a test set.
+    Sparse feature columns are passed to fit as a CSR matrix, see sparse_features.model_input.
 
     :param combined_data: The dataset to train the model on.
     :param target_column: The name of the target variable column.
     :param features: The list of feature names to be used in the model.
     :param max_depth: The maximum depth of the trees in the model.
     :param random_state: Seed for the random number generator to ensure reproducibility.
+    :param parameters: Optional model parameters, e.g. from the hyperparameter search, overriding max_depth.
 
     :return: A DataFrame containing each feature's importance as a percentage and the accuracy of the model on the test set.
     """
     train_data, test_data = train_test_split(combined_data, test_size=0.2, random_state=random_state)
 
-    model = RandomForestClassifier(n_jobs=-1, class_weight='balanced', max_depth=max_depth, random_state=random_state)
-    model.fit(train_data[features], train_data[target_column])
+    model = hyperparameter_search.build_model(MODEL_ENGINE, {'max_depth': max_depth, **(parameters or {})},
+                                              random_state)
+    model.fit(model_input(train_data, features, accepts_missing_values=False), train_data[target_column])
+
+    return evaluate_model(model, test_data, target_column, features), model, test_data
+
 
+def evaluate_model(model: RandomForestClassifier, test_data: pd.DataFrame, target_column: str,
+                   features: List[str]) -> DataFrame:
+    """
+    Reports the feature importances of a trained model as percentages, followed by its accuracy on the test set.
+
+    :param model: The trained model.
+    :param test_data: The held-out rows.
+    :param target_column: The name of the target variable column.
+    :param features: The list of feature names used in the model.
+    :return: A DataFrame containing each feature's importance as a percentage and the accuracy of the model.
+    """
     importances = model.feature_importances_
     importances_percentage = 100 * importances / importances.sum()
     feature_importances_df = pd.DataFrame({'Feature': features, 'Importance (%)': importances_percentage})
 
     feature_importances_df = feature_importances_df.sort_values(by='Importance (%)', ascending=False)
 
-    predictions = model.predict(test_data[features])
+    predictions = model.predict(model_input(test_data, features, accepts_missing_values=False))
     accuracy = accuracy_score(test_data[target_column], predictions)
 
     accuracy = round(accuracy, 2)
     feature_importances_df.loc[len(feature_importances_df)] = ['Accuracy', accuracy * 100]
 
-    return feature_importances_df, model, test_data
+    return feature_importances_df
+
+
+def retrain_incrementally(model: RandomForestClassifier,
+                          metadata: dict,
+                          source_files: List[str],
+                          fingerprints: Dict[str, str],
+                          pipeline: Optional[PreprocessingPipeline],
+                          target_column: str,
+                          added_trees: int,
+                          random_state: int,
+                          chunk_size: Optional[int] = None) -> Optional[tuple]:
+    """
+    Grows a stored model with warm_start, training only the added trees and only on the raw files that are new since
+    the model was saved, so that the cost of retraining depends on the new data rather than on all of it. The model
+    keeps the features it was trained on, and the new rows are transformed with its preprocessing pipeline, see
+    incremental.load_rows.
+
+    :param model: The stored model.
+    :param metadata: The metadata saved with the model in the model registry.
+    :param source_files: Paths of all the raw files.
+    :param fingerprints: Fingerprints of the raw files, keyed by path.
+    :param pipeline: The pipeline of the model, see incremental.model_pipeline, or None if it was trained on the raw
+                     columns.
+    :param target_column: The name of the target variable column.
+    :param added_trees: Number of trees to add.
+    :param random_state: Seed used to split the new data into training and test rows.
+    :param chunk_size: When set, the files are read in chunks of this many rows.
+    :return: The feature importances, the model, the test rows, the features and the fingerprints of every file the
+             model has been trained on, or None if the new data calls for training a new model.
+    """
+    features = metadata['features']
+    new_files = incremental.new_data_files(source_files, fingerprints, metadata)
+    if new_files:
+        print(f"Found {len(new_files)} new data files since the model was saved.")
+    else:
+        print("No new data files since the model was saved. Evaluating the stored model...")
+
+    data = incremental.load_rows(new_files or source_files, features, target_column, pipeline, chunk_size)
+    train_data, test_data = train_test_split(data, test_size=0.2, random_state=random_state)
+
+    if new_files:
+        # Trees of a forest must agree on the classes, so new data with other classes needs a new model
+        if not np.array_equal(np.unique(train_data[target_column]), model.classes_):
+            print("The new data does not hold the classes of the stored model. Retraining a new model...")
+            return None
+
+        print(f"Adding {added_trees} trees trained on the new data to the stored model...")
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + added_trees)
+        model.fit(model_input(train_data, features, accepts_missing_values=False), train_data[target_column])
+
+    trained_files = sorted(set(metadata.get('trained_files', [])) | set(fingerprints.values()))
+    return evaluate_model(model, test_data, target_column, features), model, test_data, features, trained_files
+
+
+def load_columns(paths: List[str], columns: List[str], target_column: str,
+                 chunk_size: Optional[int] = None) -> DataFrame:
+    """
+    Loads the given columns of several files, filling the columns a file lacks with NaN and missing targets with 0.
+    """
+    if chunk_size:
+        data = loader.read_files_in_chunks(paths, chunk_size, columns)
+    else:
+        data = pd.concat([loader.read_data_file(path) for path in paths], ignore_index=True).reindex(columns=columns)
+    data[target_column] = data[target_column].fillna(0)
+    return data
+
+
+def raw_columns(paths: List[str], features: List[str]) -> List[str]:
+    """
+    The features that are columns of at least one of the raw files. Encoded features, such as one-hot columns, are not,
+    and reading them from the raw files would only give columns of missing values.
+    """
+    header_columns = set()
+    for path in paths:
+        header_columns.update(loader.read_header(path))
+    return [feature for feature in features if feature in header_columns]
 
 
 def save_results(directory: str, filename: str, data: pd.DataFrame) -> None:
@@ -86,41 +174,33 @@ def save_results(directory: str, filename: str, data: pd.DataFrame) -> None:
             file.write(f"{row['Feature']}:{row['Importance (%)']}\n")
 
 
-def create_box_plots(data: pd.DataFrame, target_column: str, features: List[str], output_dir: str) -> None:
-    plots_dir = os.path.join(output_dir, 'graphics')
-    os.makedirs(plots_dir, exist_ok=True)
+def create_box_plots(data: pd.DataFrame, target_column: str, features: List[str], output_dir: str,
+                     render: bool = True) -> Dict[str, float]:
+    """
+    Renders a box plot of every feature by target category on the plot rendering pool.
 
+    :param data: The dataset containing the features and the target column.
+    :param target_column: The name of the target variable column in the dataset.
+    :param features: The features to plot.
+    :param output_dir: Directory under which the 'graphics' folder is created.
+    :param render: Whether to render the plots now. When False, the plotted data is saved for on-demand rendering.
+    :return: The time in seconds each figure took, keyed by file path.
+    """
     if not pd.api.types.is_numeric_dtype(data[target_column]):
         data[target_column] = data[target_column].astype(str)
 
-    for feature in features:
-        plt.figure(figsize=(12, 8))
-        if pd.api.types.is_numeric_dtype(data[feature]):
-            sns.boxplot(x=target_column, y=feature, data=data)
-
-            sns.stripplot(x=target_column, y=feature, data=data, color='k', alpha=0.5, size=3)  # Smaller markers
-
-            grouped = data.groupby(target_column)[feature]
-            means = grouped.mean()
-            stds = grouped.std()
-            counts = grouped.count()
+    if not render:
+        plotting.defer_distribution_plots(data, target_column, features, output_dir, 'box_plot')
+        return {}
 
-            for i, (mean, std, count) in enumerate(zip(means, stds, counts)):
-                plt.text(i, data[feature].max(), f'Mean: {mean:.2f}\nSD: {std:.2f}\nCount: {count}',
-                         color='red', ha='center', va='top')
-
-            plt.ylabel(f'{feature} Measurement')
-        else:
-            sns.countplot(x=target_column, hue=feature, data=data)
-            plt.ylabel('Count')
-
-        plt.title(f'{feature} by {target_column}')
-        plt.xlabel(target_column)
-        plt.savefig(os.path.join(plots_dir, f'plot_{feature}.png'))
-        plt.close()
+    plots_dir = os.path.join(output_dir, 'graphics')
+    os.makedirs(plots_dir, exist_ok=True)
+    return plotting.render_figures([(plotting.box_plot, (data[[target_column, feature]], target_column, feature,
+                                                         plots_dir)) for feature in features])
 
 
-def apply_shap_explanations(model, test_data: pd.DataFrame, features: List[str], output_dir: str) -> None:
+def apply_shap_explanations(model, test_data: pd.DataFrame, features: List[str], output_dir: str,
+                            render: bool = True, target_column: Optional[str] = None) -> None:
     """
     Apply SHAP to explain the model's predictions for each class in a multi-class model
     and save the results in separate bar plots for each class.
@@ -129,49 +209,89 @@ def apply_shap_explanations(model, test_data: pd.DataFrame, features: List[str],
     :param test_data: The dataset containing the features.
     :param features: List of feature names used in the model.
     :param output_dir: Directory where the SHAP plots will be saved.
+    :param render: Whether to render the plots now. When False, the SHAP values are saved for on-demand rendering.
+    :param target_column: Optional target column of test_data, used to stratify the rows sampled for SHAP.
     """
+    results_dir = output_dir
     output_dir = os.path.join(output_dir, "shap")
-    os.makedirs(output_dir, exist_ok=True)
-
-    filtered_test_data = test_data[features]
+    if render:
+        os.makedirs(output_dir, exist_ok=True)
 
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(filtered_test_data)
+    target = test_data[target_column] if target_column else None
+    shap_values, filtered_test_data, expected_value = shap_engine.explain(model, test_data[features], target,
+                                                                          os.path.join(results_dir, 'model'))
 
     if isinstance(shap_values, np.ndarray) and len(shap_values.shape) == 3:
         mean_abs_shap_values = np.mean(np.abs(shap_values), axis=(0, 2))
 
         shap_values_mean = np.mean(shap_values, axis=2)
 
-        plt.figure()
-        plt.bar(features, mean_abs_shap_values)
-        plt.title('Average Impact of Features Across All Classes')
-        plt.xlabel('Features')
-        plt.ylabel('Mean Absolute SHAP Value')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, 'consolidated_shap_summary_plot.png'))
-        plt.close()
-
-        shap.summary_plot(shap_values_mean, filtered_test_data, feature_names=features, show=False, plot_size=(20, 15))
-        plt.savefig(os.path.join(output_dir, 'shap_summary_dot_plot.png'))
-        plt.close()
-
-        shap.summary_plot(shap_values_mean, filtered_test_data, plot_type="bar", feature_names=features, show=False, plot_size=(20, 15))
-        plt.savefig(os.path.join(output_dir, 'shap_summary_bar_plot.png'))
-        plt.close()
-
-        instance_index = 0
-        shap_values_instance = np.mean(shap_values[instance_index, :, :], axis=1)
-        shap.force_plot(explainer.expected_value[0], shap_values_instance,
-                        features=filtered_test_data.iloc[instance_index, :], show=False, matplotlib=True,
-                        figsize=(40, 10))
-        plt.savefig(os.path.join(output_dir, 'force_plot_instance.png'))
-        plt.close()
+        if not render:
+            plotting.defer_shap_figures(shap_values_mean, mean_abs_shap_values, filtered_test_data, features,
+                                        expected_value[0], results_dir,
+                                        'Average Impact of Features Across All Classes')
+            return
+
+        plotting.render_figures(plotting.shap_figure_tasks(shap_values_mean, mean_abs_shap_values, filtered_test_data,
+                                                           features, expected_value[0], output_dir,
+                                                           'Average Impact of Features Across All Classes'))
     else:
         print("Unexpected structure of SHAP values. Check the SHAP values calculation.")
 
 
+def load_data_in_chunks(data_files: List[str],
+                        default_data_files: List[str],
+                        target_column: str,
+                        p_value_threshold: float,
+                        excluded_columns: Optional[List[str]],
+                        chunk_size: int) -> tuple[DataFrame, DataFrame, List[str]]:
+    """
+    Screens the features while streaming the data files in chunks, then loads only the significant features and the
+    target column, so that the peak memory does not depend on the width of the raw data.
+
+    :param data_files: Paths of the files used for training.
+    :param default_data_files: Paths of the raw files used for plotting, from which only the significant features
+                               that are raw columns are read.
+    :param target_column: The name of the target variable column in the dataset.
+    :param p_value_threshold: The significance level used to determine feature importance.
+    :param excluded_columns: Optional list of column names to exclude from processing.
+    :param chunk_size: Number of rows read at a time.
+    :return: The training data, the plotting data and the list of significant features.
+    """
+    if excluded_columns is None:
+        excluded_columns = []
+
+    columns = []
+    for path in data_files:
+        for column in loader.read_header(path):
+            if column not in excluded_columns and column not in columns:
+                columns.append(column)
+
+    print("Evaluating feature significance in chunks using a streaming ANOVA F-test...")
+    if len(columns) > 30:
+        significant_features = feature_screening.screen_features_in_chunks(data_files, target_column, chunk_size,
+                                                                           p_value_threshold, excluded_columns)
+    else:
+        significant_features = [column for column in columns if column != target_column]
+
+    selected_columns = significant_features + [target_column]
+    combined_data = loader.read_files_in_chunks(data_files, chunk_size, selected_columns)
+    combined_data[target_column] = combined_data[target_column].fillna(0)
+
+    default_data = loader.read_files_in_chunks(default_data_files, chunk_size,
+                                               raw_columns(default_data_files, significant_features) + [target_column])
+    default_data[target_column] = default_data[target_column].fillna(0)
+    print("Data loaded and processed in chunks.")
+
+    return combined_data, default_data, significant_features
+
+
+def _pipeline_state(data_dir: str) -> Optional[dict]:
+    # Saved with the model, so that /predict can transform raw rows into the features the model was trained on
+    pipeline = find_pipeline(data_dir)
+    return pipeline.to_dict() if pipeline is not None else None
+
+
 def run(data_dir: str,
         default_data_path: str,
         output_dir: str,
@@ -179,83 +299,140 @@ def run(data_dir: str,
         max_depth: int = 15,
         random_state: int = 42,
         p_value_threshold: float = 0.05,
-        excluded_columns: Optional[List[str]] = None) -> None:
+        excluded_columns: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        render_artifacts: bool = True,
+        user_id: Optional[str] = None,
+        label: Optional[str] = None,
+        incremental_trees: int = 0,
+        search_budget_seconds: Optional[float] = None,
+        importance_method: str = 'impurity') -> None:
     """
     Main function to execute the feature selection, model training, and model evaluation pipeline.
 
-    :param data_dir: The directory containing the data files.
+    :param data_dir: The directory containing the data files, either local or a minio:// prefix.
+    :param default_data_path: The directory containing the raw data files used for plotting, either local or a minio:// prefix.
     :param output_dir: The directory where all outputs will be saved.
     :param target_column: The name of the target variable for model training.
     :param max_depth: Maximum depth of trees in the RandomForest model.
     :param random_state: Random seed for model reproducibility.
     :param p_value_threshold: Threshold for determining feature significance via Kruskal-Wallis test.
     :param excluded_columns: Optional list of column names to exclude from processing.
+    :param chunk_size: When set, the files are read in chunks of this many rows, features are screened from streaming
+                       statistics and only the selected columns are kept in memory.
+    :param render_artifacts: Whether to render the box plots and SHAP figures. When False, only the importances, the
+                             plotted data, the group statistics and the SHAP values are saved, and the figures are
+                             rendered on demand.
+    :param user_id: When set together with the label, the trained model is saved to the model registry, along with
+                    the fingerprints of the raw files it was trained on.
+    :param label: Label of the model in the model registry.
+    :param incremental_trees: When positive and the registry holds a model for the user and label, that model is kept
+                              with its features and preprocessing pipeline and this many trees are added, trained on
+                              the raw files of default_data_path that are new since it was saved. Otherwise a new
+                              model is trained on every file.
+    :param search_budget_seconds: When set, a new model is trained with the parameters selected by a successive
+                                  halving search over depth, tree count and leaf count that runs for at most this many
+                                  seconds.
+    :param importance_method: Either 'impurity', for the importances of the trees, or 'permutation', for the accuracy
+                              drop on the held-out rows when each feature is shuffled.
     """
-    model_dir = os.path.join(output_dir, "model")
-    model_path = os.path.join(model_dir, 'trained_random_forest_model.joblib')
 
     print("Starting data processing...")
-    data_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.csv')]
-    default_data_files = [os.path.join(default_data_path, f) for f in os.listdir(default_data_path) if
-                          f.endswith('.csv')]
-    data_frames = [pd.read_csv(f) for f in data_files]
-    default_data_frames = [pd.read_csv(f) for f in default_data_files]
-
-    combined_data = pd.concat(data_frames, ignore_index=True)
-    combined_data[target_column].fillna(0, inplace=True)
-
-    default_data = pd.concat(default_data_frames, ignore_index=True)
-    default_data[target_column].fillna(0, inplace=True)
-
-    if excluded_columns:
-        combined_data = combined_data.drop(columns=excluded_columns, errors='ignore')
-        default_data = default_data.drop(columns=excluded_columns, errors='ignore')
-    print("Data loaded and processed.")
-
-    print("Evaluating feature significance using Kruskal-Wallis test...")
-    if len(combined_data.columns) > 30:
-        significant_features = perform_kruskal_wallis_test(combined_data, target_column, p_value_threshold)
+    data_files = loader.list_data_files(data_dir)
+    default_data_files = loader.list_csv_files(default_data_path)
+    use_registry = bool(user_id and label)
+    fingerprints = incremental.file_fingerprints(default_data_files) if use_registry else {}
+
+    retrained, pipeline = None, None
+    if use_registry and incremental_trees:
+        previous_model, metadata = incremental.load_previous_model(user_id, label, MODEL_ENGINE, target_column)
+        if previous_model is not None:
+            pipeline = incremental.model_pipeline(metadata, data_dir)
+            retrained = retrain_incrementally(previous_model, metadata, default_data_files, fingerprints, pipeline,
+                                              target_column, incremental_trees, random_state, chunk_size)
+
+    if retrained is not None:
+        feature_importances_df, model, test_data, significant_features, trained_files = retrained
+        # A grown model keeps the pipeline its stored trees were trained with, not the one fitted in this session
+        pipeline_state = pipeline.to_dict() if pipeline is not None else None
+        default_data = load_columns(default_data_files,
+                                    raw_columns(default_data_files, significant_features) + [target_column],
+                                    target_column, chunk_size)
     else:
-        significant_features = []
-        for col in combined_data.columns:
-            if col != target_column:
-                significant_features.append(col)
-    print(f"Significant features found: {len(significant_features)} - {significant_features}")
+        trained_files = list(fingerprints.values())
+        pipeline_state = _pipeline_state(data_dir)
+        if chunk_size:
+            combined_data, default_data, significant_features = load_data_in_chunks(data_files, default_data_files,
+                                                                                    target_column, p_value_threshold,
+                                                                                    excluded_columns, chunk_size)
+        else:
+            data_frames = [loader.read_data_file(f) for f in data_files]
+            default_data_frames = [loader.read_data_file(f) for f in default_data_files]
 
-    if significant_features:
-        if os.path.exists(model_dir) and os.path.exists(model_path):
-            print(f"Loading existing model from {model_path}...")
-            model = joblib.load(model_path)
-            if hasattr(model, 'feature_importances_') and len(model.feature_importances_) == len(significant_features):
-                print("Incrementally training the existing model with new data...")
-                train_data, test_data = train_test_split(combined_data, test_size=0.2, random_state=random_state)
-                model.fit(train_data[significant_features], train_data[target_column])
-                importances_percentage = 100 * model.feature_importances_ / model.feature_importances_.sum()
-                feature_importances_df = pd.DataFrame(
-                    {'Feature': significant_features, 'Importance (%)': importances_percentage})
+            combined_data = pd.concat(data_frames, ignore_index=True)
+            combined_data[target_column].fillna(0, inplace=True)
+
+            default_data = pd.concat(default_data_frames, ignore_index=True)
+            default_data[target_column].fillna(0, inplace=True)
+
+            if excluded_columns:
+                combined_data = combined_data.drop(columns=excluded_columns, errors='ignore')
+                default_data = default_data.drop(columns=excluded_columns, errors='ignore')
+            print("Data loaded and processed.")
+
+            print("Evaluating feature significance using Kruskal-Wallis test...")
+            if len(combined_data.columns) > 30:
+                significant_features = perform_kruskal_wallis_test(combined_data, target_column, p_value_threshold)
             else:
-                print(
-                    "The loaded model's features do not match the current significant features. Retraining a new model...")
-                feature_importances_df, model, test_data = train_random_forest_model(combined_data, target_column,
-                                                                                     significant_features, max_depth,
-                                                                                     random_state)
-        else:
+                significant_features = []
+                for col in combined_data.columns:
+                    if col != target_column:
+                        significant_features.append(col)
+        print(f"Significant features found: {len(significant_features)} - {significant_features}")
+
+        if significant_features:
+            parameters = None
+            if search_budget_seconds:
+                print(f"Searching hyperparameters for at most {search_budget_seconds} seconds...")
+                parameters, leaderboard = hyperparameter_search.successive_halving(
+                    MODEL_ENGINE, combined_data, target_column, significant_features, search_budget_seconds,
+                    random_state, {'max_depth': max_depth, 'n_estimators': 100, 'max_leaf_nodes': None})
+                hyperparameter_search.save_leaderboard(output_dir, parameters, leaderboard)
+                print(f"Selected hyperparameters: {parameters}")
+
             print("Training RandomForest model on significant features only...")
             feature_importances_df, model, test_data = train_random_forest_model(combined_data, target_column,
                                                                                  significant_features, max_depth,
-                                                                                 random_state)
-            os.makedirs(model_dir, exist_ok=True)
+                                                                                 random_state, parameters)
+
+    if significant_features:
+        if importance_method == 'permutation' and sparse_columns(test_data, significant_features):
+            print("Permutation importances need dense features, keeping the impurity importances of the sparse model.")
+        elif importance_method == 'permutation':
+            print("Computing permutation importances on the held-out rows...")
+            feature_importances_df = permutation_importance.permutation_importances(model, test_data, target_column,
+                                                                                    significant_features)
+
+        if use_registry:
+            model_registry.get_registry().save(user_id, label, MODEL_ENGINE, significant_features, model,
+                                               {'target_column': target_column, 'max_depth': max_depth,
+                                                'random_state': random_state, 'trained_files': trained_files,
+                                                'pipeline': pipeline_state})
+            print("Model saved to the model registry.")
 
         feature_importances_df = feature_importances_df.sort_values(by='Importance (%)', ascending=False)
         save_results(output_dir, 'feature_importances.txt', feature_importances_df)
         print("Feature importances and model accuracy saved.")
 
         print("Creating box plots for significant features...")
-        create_box_plots(default_data, target_column, significant_features, output_dir)
+        # Encoded features, such as one-hot columns, have no values in the raw files the plots are drawn from
+        plotted_features = [feature for feature in significant_features
+                            if feature in default_data.columns and default_data[feature].notna().any()]
+        create_box_plots(default_data, target_column, plotted_features, output_dir, render_artifacts)
         print("Box plots saved.")
 
         print("Applying SHAP for model explanation...")
-        apply_shap_explanations(model, test_data, significant_features, output_dir)
+        apply_shap_explanations(model, test_data, significant_features, output_dir, render_artifacts, target_column)
         print("SHAP explanations saved.")
 
     print("Analysis complete. Results and plots are saved.")
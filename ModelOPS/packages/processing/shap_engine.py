@@ -0,0 +1,129 @@
+import os
+import json
+import shap
+import joblib
+import numpy as np
+import pandas as pd
+from typing import Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.model_selection import train_test_split
+from packages.processing.config import SHAP_CONFIG
+from packages.processing.sparse_features import to_dense
+
+SHAP_VALUES_FILE = 'shap_values.npy'
+SHAP_ROWS_FILE = 'shap_rows.parquet'
+SHAP_METADATA_FILE = 'shap_metadata.json'
+
+_worker_explainer = None
+
+
+def explain(model,
+            data: pd.DataFrame,
+            target: Optional[pd.Series] = None,
+            cache_dir: Optional[str] = None,
+            sample_size: Optional[int] = None,
+            max_workers: Optional[int] = None) -> Tuple[np.ndarray, pd.DataFrame, Any]:
+    """
+    Computes the SHAP values of a tree model on a stratified sample of the rows, splitting the sample into chunks that
+    are explained on a process pool. The values are saved in cache_dir and reused as long as the model and the sampled
+    rows are unchanged.
+
+    :param model: The trained tree model.
+    :param data: The rows to explain, restricted to the model features.
+    :param target: Optional target values of the rows, used to stratify the sample.
+    :param cache_dir: Directory where the SHAP values are saved next to the model. Nothing is saved when None.
+    :param sample_size: Maximum number of rows to explain. Defaults to SHAP_CONFIG; 0 explains every row.
+    :param max_workers: Number of processes explaining chunks. Defaults to SHAP_CONFIG; 1 explains in this process.
+    :return: The SHAP values, of shape (rows, features) or (rows, features, classes), the explained rows and the
+             expected value of the explainer.
+    """
+    sample = to_dense(sample_rows(data, target, SHAP_CONFIG['sample_size'] if sample_size is None else sample_size))
+    fingerprint = joblib.hash((model, sample))
+
+    if cache_dir:
+        cached = load_shap_values(cache_dir, fingerprint)
+        if cached is not None:
+            print(f"Reused SHAP values saved in {cache_dir}")
+            return cached
+
+    explainer = shap.TreeExplainer(model)
+    chunk_count = max(1, int(np.ceil(len(sample) / SHAP_CONFIG['chunk_size'])))
+    chunks = np.array_split(np.arange(len(sample)), chunk_count)
+    workers = min(max_workers or SHAP_CONFIG['max_workers'], chunk_count)
+
+    if workers <= 1:
+        chunk_values = [explainer.shap_values(sample.iloc[positions]) for positions in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(model,)) as executor:
+            chunk_values = list(executor.map(_explain_chunk, [sample.iloc[positions] for positions in chunks]))
+
+    shap_values = _concatenate(chunk_values)
+    print(f"Computed SHAP values for {len(sample)} of {len(data)} rows in {chunk_count} chunks")
+
+    if cache_dir:
+        save_shap_values(cache_dir, fingerprint, shap_values, sample, explainer.expected_value)
+    return shap_values, sample, explainer.expected_value
+
+
+def sample_rows(data: pd.DataFrame, target: Optional[pd.Series], sample_size: int) -> pd.DataFrame:
+    """
+    Draws at most sample_size rows, keeping the proportion of every target category when the target is given.
+    The sampled rows keep their original order.
+    """
+    if not sample_size or len(data) <= sample_size:
+        return data
+
+    stratify = None
+    if target is not None and target.value_counts().min() >= 2 and target.nunique() <= sample_size:
+        stratify = target.to_numpy()
+    positions, _ = train_test_split(np.arange(len(data)), train_size=sample_size, stratify=stratify,
+                                    random_state=SHAP_CONFIG['random_state'])
+    return data.iloc[np.sort(positions)]
+
+
+def save_shap_values(cache_dir: str, fingerprint: str, shap_values: np.ndarray, sample: pd.DataFrame,
+                     expected_value: Any) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, SHAP_VALUES_FILE), np.asarray(shap_values))
+    sample.to_parquet(os.path.join(cache_dir, SHAP_ROWS_FILE))
+    with open(os.path.join(cache_dir, SHAP_METADATA_FILE), 'w') as file:
+        json.dump({'fingerprint': fingerprint, 'expected_value': np.asarray(expected_value).tolist()}, file)
+
+
+def load_shap_values(cache_dir: str, fingerprint: str) -> Optional[Tuple[np.ndarray, pd.DataFrame, Any]]:
+    """
+    Load the SHAP values saved by save_shap_values if they were computed for the same model and rows.
+
+    :param cache_dir: Directory where the SHAP values were saved.
+    :param fingerprint: Hash of the model and the sampled rows.
+    :return: The SHAP values, the explained rows and the expected value, or None if nothing matching is saved.
+    """
+    metadata_path = os.path.join(cache_dir, SHAP_METADATA_FILE)
+    if not os.path.exists(metadata_path):
+        return None
+
+    with open(metadata_path) as file:
+        metadata = json.load(file)
+    if metadata['fingerprint'] != fingerprint:
+        return None
+
+    shap_values = np.load(os.path.join(cache_dir, SHAP_VALUES_FILE))
+    sample = pd.read_parquet(os.path.join(cache_dir, SHAP_ROWS_FILE))
+    expected_value = metadata['expected_value']
+    return shap_values, sample, np.asarray(expected_value) if isinstance(expected_value, list) else expected_value
+
+
+def _initialize_worker(model) -> None:
+    global _worker_explainer
+    _worker_explainer = shap.TreeExplainer(model)
+
+
+def _explain_chunk(chunk: pd.DataFrame):
+    return _worker_explainer.shap_values(chunk)
+
+
+def _concatenate(chunk_values: list) -> np.ndarray:
+    # Older shap releases return one array per class, newer ones a single (rows, features, classes) array
+    if isinstance(chunk_values[0], list):
+        chunk_values = [np.stack(values, axis=-1) for values in chunk_values]
+    return np.concatenate(chunk_values)
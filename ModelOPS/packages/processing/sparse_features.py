@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from typing import List
+
+
+def sparse_columns(data: pd.DataFrame, columns: List[str]) -> List[str]:
+    return [column for column in columns if isinstance(data[column].dtype, pd.SparseDtype)]
+
+
+def model_input(data: pd.DataFrame, features: List[str], accepts_missing_values: bool = True):
+    """
+    The feature matrix passed to fit and predict. Without sparse columns this is the DataFrame itself. When some
+    features are sparse, e.g. after sparse one-hot encoding, the features are combined into a float32 CSR matrix in
+    which the sparse columns are never densified.
+
+    :param data: The rows, holding the features.
+    :param features: The features of the model, in the order the model expects them.
+    :param accepts_missing_values: Whether the model accepts missing values in a sparse matrix. RandomForestClassifier
+                                   only handles them in dense input, so it is given the DataFrame when a dense feature
+                                   holds a missing value.
+    :return: The DataFrame restricted to the features, or a CSR matrix with the features as its columns.
+    """
+    sparse_features = sparse_columns(data, features)
+    if not sparse_features:
+        return data[features]
+
+    dense_features = [feature for feature in features if feature not in sparse_features]
+    dense_values = data[dense_features].to_numpy(dtype=np.float32)
+    if not accepts_missing_values and np.isnan(dense_values).any():
+        print("Missing values in the dense features cannot be passed in a sparse matrix, using a dense one instead.")
+        return data[features]
+
+    matrix = sp.hstack([sp.csr_matrix(dense_values), data[sparse_features].sparse.to_coo()], format='csr',
+                       dtype=np.float32)
+    positions = {feature: position for position, feature in enumerate(dense_features + sparse_features)}
+    order = [positions[feature] for feature in features]
+    if order != list(range(len(features))):
+        matrix = matrix[:, order]
+    return matrix
+
+
+def to_dense(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the sparse columns of a DataFrame to dense ones, for the few rows handed to SHAP and the plots.
+    """
+    columns = sparse_columns(data, data.columns.tolist())
+    if not columns:
+        return data
+    return data.astype({column: data[column].dtype.subtype for column in columns})
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from packages.processing import feature_screening
+from packages.processing.config import SCREENING_CONFIG
+
+
+def _screening_data(row_count: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(4)
+    target = rng.integers(0, 3, row_count)
+    data = pd.DataFrame({'shifted': rng.normal(target, 1.0),
+                         'noise': rng.normal(size=row_count),
+                         'tied': rng.integers(0, 4, row_count) + (target == 2),
+                         'constant': np.ones(row_count),
+                         'missing': np.where(rng.random(row_count) < 0.2, np.nan, rng.normal(size=row_count)),
+                         'target': target})
+    data.loc[data.index[:5], 'target'] = np.nan
+    return data
+
+
+def test_p_values_match_scipy_kruskal(monkeypatch):
+    monkeypatch.setitem(SCREENING_CONFIG, 'max_bytes', 2 * 10 * 8 * 300 * 2)
+    data = _screening_data()
+
+    p_values = feature_screening.kruskal_wallis_p_values(data, 'target', max_workers=2)
+
+    labelled = data[data['target'].notna()]
+    for feature in ['shifted', 'noise', 'tied', 'missing']:
+        samples = [group[feature].dropna() for _, group in labelled.groupby('target')]
+        assert np.isclose(p_values[feature], stats.kruskal(*samples).pvalue, rtol=1e-9, atol=1e-12), feature
+    # scipy raises on a feature whose values are all equal
+    assert np.isnan(p_values['constant'])
+    assert feature_screening.kruskal_wallis_screening(data, 'target') == ['shifted', 'tied']
+
+
+def test_block_size_follows_the_row_count(monkeypatch):
+    monkeypatch.setitem(SCREENING_CONFIG, 'max_bytes', 80 * 1000 * 4 * 8)
+
+    assert feature_screening._block_size(1000, 4) == 8
+    assert feature_screening._block_size(4000, 4) == 2
+    assert feature_screening._block_size(10 ** 7, 4) == 1
+    assert feature_screening._block_size(10, 1) == SCREENING_CONFIG['max_block_size']
+
+
+def test_chunked_screening_matches_scipy_f_oneway(tmp_path):
+    data = _screening_data().drop(columns=['constant'])
+    data['target'] = data['target'].fillna(0)
+    data.iloc[:150].to_csv(tmp_path / 'first.csv', index=False)
+    data.iloc[150:].to_csv(tmp_path / 'second.csv', index=False)
+
+    selected = feature_screening.screen_features_in_chunks([str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')],
+                                                           'target', chunk_size=40)
+
+    expected = [feature for feature in ['shifted', 'noise', 'tied', 'missing']
+                if stats.f_oneway(*[group[feature].dropna() for _, group in data.groupby('target')]).pvalue < 0.05]
+    assert selected == expected
@@ -0,0 +1,47 @@
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from packages.processing import hyperparameter_search, random_forest
+
+
+def _search_data(row_count: int) -> pd.DataFrame:
+    rng = np.random.default_rng(6)
+    data = pd.DataFrame(rng.normal(size=(row_count, 8)), columns=[f"f{index}" for index in range(8)])
+    data['target'] = (data['f0'] + rng.normal(scale=0.5, size=row_count) > 0).astype(int)
+    return data
+
+
+def test_search_leaves_out_the_test_rows_of_training():
+    data = _search_data(500)
+
+    train_data, validation_data = hyperparameter_search.search_rows(data, random_state=7)
+    _, _, test_data = random_forest.train_random_forest_model(data, 'target', ['f0', 'f1'], 4, random_state=7)
+
+    assert not set(test_data.index) & (set(train_data.index) | set(validation_data.index))
+    assert len(train_data) + len(validation_data) + len(test_data) == len(data)
+
+
+def test_fits_running_at_the_deadline_are_stopped():
+    data = _search_data(20000)
+
+    start = time.monotonic()
+    parameters, _ = hyperparameter_search.successive_halving('random_forest', data, 'target', list(data.columns[:-1]),
+                                                             budget_seconds=1.0, max_workers=2,
+                                                             initial_parameters={'n_estimators': 400})
+
+    assert time.monotonic() - start < 10
+    assert not multiprocessing.active_children()
+    assert parameters
+
+
+def test_search_keeps_sparse_features_sparse():
+    data = _search_data(600)
+    data['f1'] = pd.arrays.SparseArray((data['f1'] > 1).astype(np.float32), fill_value=0.0)
+
+    for engine in ['random_forest', 'lightgbm']:
+        assert sp.issparse(hyperparameter_search._feature_matrix(engine, data, ['f0', 'f1']))
+        parameters, leaderboard = hyperparameter_search.successive_halving(engine, data, 'target', ['f0', 'f1'],
+                                                                           budget_seconds=30.0, max_workers=1)
+        assert parameters and leaderboard
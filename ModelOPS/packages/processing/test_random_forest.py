@@ -0,0 +1,36 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from packages.processing import random_forest
+from packages.preprocessing.preprocess_data import preprocess_files
+
+
+def _write_cohort(directory: str, row_count: int = 600) -> None:
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({'pid': np.arange(row_count),
+                         'age': rng.integers(18, 90, row_count),
+                         'bmi': rng.normal(27, 4, row_count).round(1),
+                         'sex': rng.choice(['M', 'F'], row_count),
+                         'smoker': rng.choice(['yes', 'no', 'former'], row_count)})
+    data['target'] = ((data['age'] > 60) | (data['smoker'] == 'yes')).astype(int)
+    data.to_csv(os.path.join(directory, 'cohort.csv'), index=False)
+
+
+@pytest.mark.parametrize('encode_method, importance_method', [('one_hot_encoding', 'impurity'),
+                                                               ('sparse_one_hot_encoding', 'permutation')])
+def test_chunked_training_on_one_hot_encoded_files(tmp_path, encode_method, importance_method):
+    raw_directory, cleaned_directory, output_directory = tmp_path / 'raw', tmp_path / 'cleaned', tmp_path / 'output'
+    raw_directory.mkdir()
+    _write_cohort(str(raw_directory))
+    preprocess_files(str(raw_directory), str(cleaned_directory), 'pid', encode_method, 'standardize',
+                     exclude_columns=['target'], chunk_size=200)
+
+    random_forest.run(str(cleaned_directory), str(raw_directory), str(output_directory), 'target',
+                      excluded_columns=['pid'], chunk_size=200, importance_method=importance_method)
+
+    with open(output_directory / 'feature_importances.txt') as file:
+        features = [line.split(':')[0] for line in file]
+    assert any(feature.startswith('smoker_') for feature in features)
+    # Only the features that are raw columns are plotted, never the one-hot columns
+    assert sorted(os.listdir(output_directory / 'graphics')) == ['plot_age.png', 'plot_bmi.png']
@@ -4,6 +4,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from typing import List, Optional
+from packages.data_access import loader
+from packages.data_access.dedup import RowDeduplicator
+from packages.data_access.config import DEDUPLICATION_CONFIG
+from packages.artifact_handler import artifacts
 
 
 age_aliases = ['age', 'age_patient', 'age_number']
@@ -28,32 +32,33 @@ def find_column_name(columns: List[str], aliases: List[str]) -> Optional[str]:
 
 def aggregate_patient_data(files: List[str], id_col_name: str) -> pd.DataFrame:
     """
-    Aggregate data from multiple files to get unique patient data.
+    Aggregate data from multiple files to get unique patient data. The files are read in chunks and the first row of
+    each patient is kept, so only the unique patients are held in memory rather than every row of every file. The
+    chunks are read with loader.iter_chunks, which reuses the files of the dataset registry and applies the cached
+    schema inside their scopes.
 
-    :param files: List of file paths to CSV files containing patient data.
+    :param files: List of file paths to CSV files containing patient data, either local or minio:// paths.
     :param id_col_name: The column name representing patient IDs.
     :return: A DataFrame with unique patient data aggregated from all files.
     """
-    all_data = []
+    deduplicator = RowDeduplicator(key_columns=[id_col_name])
+    unique_chunks = []
     for file_path in files:
-        data = pd.read_csv(file_path)
-        all_data.append(data)
-
-    combined_data = pd.concat(all_data, ignore_index=True)
-    unique_patients = combined_data.drop_duplicates(subset=[id_col_name])
+        for chunk in loader.iter_chunks(file_path, DEDUPLICATION_CONFIG['chunk_size']):
+            unique_chunks.append(deduplicator.drop_duplicates(chunk))
 
-    return unique_patients
+    return loader.concat_chunks(unique_chunks)
 
 
-def process_files(files: List[str], target_column: str, id_col_name: str, output_dir: str) -> None:
+def prepare_statistics_data(files: List[str], target_column: str, id_col_name: str) -> Optional[pd.DataFrame]:
     """
-    Process the files to generate various insights and plots.
+    Aggregate the patients of the files and keep the columns used by the statistics charts.
 
     :param files: List of file paths to CSV files containing patient data.
     :param target_column: The name of the target variable column in the dataset.
     :param id_col_name: The column name representing patient IDs.
-    :param output_dir: Directory where the output plots will be saved.
-    :return: None
+    :return: A DataFrame with the target, 'Health Status', age and optional gender columns, or None if the required
+             columns are not found.
     """
     combined_data = aggregate_patient_data(files, id_col_name)
 
@@ -62,12 +67,18 @@ def process_files(files: List[str], target_column: str, id_col_name: str, output
 
     if not target_column or not age_col:
         print(f"Required columns not found in the provided files.")
-        return
+        return None
 
-    if combined_data[target_column].dtype == object:
+    if not pd.api.types.is_numeric_dtype(combined_data[target_column]):
         combined_data[target_column] = combined_data[target_column].str.lower().map({'yes': 1, 'no': 0})
 
     combined_data['Health Status'] = combined_data[target_column].apply(lambda x: 'Healthy' if x == 0 else 'Unhealthy')
+
+    columns = [target_column, 'Health Status', age_col] + ([gender_col] if gender_col else [])
+    return combined_data[columns]
+
+
+def plot_health_counts(combined_data: pd.DataFrame, path: str) -> str:
     health_counts = combined_data['Health Status'].value_counts()
 
     plt.figure(figsize=(12, 8))
@@ -82,45 +93,109 @@ def process_files(files: List[str], target_column: str, id_col_name: str, output
     textstr = f'Total Patients: {total_patients}\nHealthy: {healthy_patients}\nUnhealthy: {unhealthy_patients}'
     plt.gcf().text(0.15, 0.85, textstr, fontsize=12, bbox=dict(facecolor='white', alpha=0.5))
 
-    plt.savefig(os.path.join(output_dir, 'health_counts_pie.png'))
+    plt.savefig(path)
     plt.close()
+    return path
+
+
+def plot_distribution_by_gender(combined_data: pd.DataFrame, gender_col: str, path: str) -> str:
+    distribution_by_gender = combined_data.groupby(['Health Status', gender_col]).size().unstack(fill_value=0)
+    distribution_by_gender.plot(kind='bar', stacked=True, figsize=(12, 8), colormap='viridis')
+    plt.title('Disease Distribution by Health Status and Gender')
+    plt.xlabel('Health Status')
+    plt.ylabel('Number of Patients')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def plot_age_distribution(combined_data: pd.DataFrame, target_column: str, age_col: str, path: str) -> str:
+    plt.figure(figsize=(12, 8))
+    sns.histplot(data=combined_data[combined_data[target_column] != 0], x=age_col, bins=20, kde=True,
+                 color=sns.color_palette("viridis")[0])
+    plt.title('Disease Distribution Across Age')
+    plt.xlabel('Age')
+    plt.ylabel('Number of Patients')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def process_files(files: List[str], target_column: str, id_col_name: str, output_dir: str) -> None:
+    """
+    Process the files to generate various insights and plots.
+
+    :param files: List of file paths to CSV files containing patient data.
+    :param target_column: The name of the target variable column in the dataset.
+    :param id_col_name: The column name representing patient IDs.
+    :param output_dir: Directory where the output plots will be saved.
+    :return: None
+    """
+    combined_data = prepare_statistics_data(files, target_column, id_col_name)
+    if combined_data is None:
+        return
+
+    age_col = find_column_name(combined_data.columns, age_aliases)
+    gender_col = find_column_name(combined_data.columns, gender_aliases)
+
+    plot_health_counts(combined_data, os.path.join(output_dir, 'health_counts_pie.png'))
 
     if gender_col:
-        distribution_by_gender = combined_data.groupby(['Health Status', gender_col]).size().unstack(fill_value=0)
-        distribution_by_gender.plot(kind='bar', stacked=True, figsize=(12, 8), colormap='viridis')
-        plt.title('Disease Distribution by Health Status and Gender')
-        plt.xlabel('Health Status')
-        plt.ylabel('Number of Patients')
-        plt.savefig(os.path.join(output_dir, 'distribution_by_gender.png'))
-        plt.close()
+        plot_distribution_by_gender(combined_data, gender_col, os.path.join(output_dir, 'distribution_by_gender.png'))
 
     if age_col:
-        plt.figure(figsize=(12, 8))
-        sns.histplot(data=combined_data[combined_data[target_column] != 0], x=age_col, bins=20, kde=True,
-                     color=sns.color_palette("viridis")[0])
-        plt.title('Disease Distribution Across Age')
-        plt.xlabel('Age')
-        plt.ylabel('Number of Patients')
-        plt.savefig(os.path.join(output_dir, 'age_distribution.png'))
-        plt.close()
+        plot_age_distribution(combined_data, target_column, age_col, os.path.join(output_dir, 'age_distribution.png'))
 
 
-def analyze(input_dir: str, output_dir: str, target_column: str, id_col_name: str) -> None:
+def defer_files(files: List[str], target_column: str, id_col_name: str, output_dir: str) -> None:
+    """
+    Persist the aggregated patient data and register the statistics charts, so that they are rendered on demand.
+
+    :param files: List of file paths to CSV files containing patient data.
+    :param target_column: The name of the target variable column in the dataset.
+    :param id_col_name: The column name representing patient IDs.
+    :param output_dir: Directory where the training outputs are saved.
+    :return: None
+    """
+    combined_data = prepare_statistics_data(files, target_column, id_col_name)
+    if combined_data is None:
+        return
+
+    age_col = find_column_name(combined_data.columns, age_aliases)
+    gender_col = find_column_name(combined_data.columns, gender_aliases)
+
+    artifacts.save_frame(output_dir, artifacts.STATISTICS_DATA_FILE, combined_data)
+    artifacts.register(output_dir, 'stats/health_counts_pie.png', 'health_counts')
+    if gender_col:
+        artifacts.register(output_dir, 'stats/distribution_by_gender.png', 'distribution_by_gender',
+                           gender_col=gender_col)
+    if age_col:
+        artifacts.register(output_dir, 'stats/age_distribution.png', 'age_distribution',
+                           target_column=target_column, age_col=age_col)
+
+
+def analyze(input_dir: str, output_dir: str, target_column: str, id_col_name: str, render: bool = True) -> None:
     """
     Main function to execute the analysis.
 
-    :param input_dir: Directory containing the input CSV files.
+    :param input_dir: Directory containing the input CSV files, either local or a minio:// prefix.
     :param output_dir: Directory where the output plots and analysis will be saved.
     :param target_column: The name of the target variable column in the dataset.
     :param id_col_name: The column name representing patient IDs.
+    :param render: Whether to render the plots now. When False, only the aggregated data is saved as artifacts.
     :return: None
     """
     print("Starting dataset analysis")
+    files = loader.list_csv_files(input_dir)
+
+    if not render:
+        defer_files(files, target_column, id_col_name, output_dir)
+        print("Analysis complete. Results are saved for on-demand rendering.")
+        return
+
     save_dir = os.path.join(output_dir, "stats")
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
 
-    files = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith('.csv')]
-
     process_files(files, target_column, id_col_name, save_dir)
     print("Analysis complete. Results and plots are saved.")
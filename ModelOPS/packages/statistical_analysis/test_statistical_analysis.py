@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from packages.data_access import registry, schema
+from packages.data_access.config import DEDUPLICATION_CONFIG
+from packages.statistical_analysis.statistical_analysis import aggregate_patient_data
+
+
+def test_aggregation_reads_through_the_registry_and_schema(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(registry, '_shared_registry', registry.DatasetRegistry())
+    monkeypatch.setitem(registry.REGISTRY_CONFIG, 'register_chunked_reads', True)
+    monkeypatch.setattr(schema, '_shared_cache', schema.SchemaCache(str(tmp_path / 'schemas')))
+    monkeypatch.setitem(DEDUPLICATION_CONFIG, 'chunk_size', 70)
+    rng = np.random.default_rng(3)
+    files = []
+    for index in range(2):
+        data = pd.DataFrame({'pid': rng.integers(0, 300, 250), 'age': rng.integers(18, 90, 250),
+                             'sex': rng.choice(['M', 'F'], 250)})
+        files.append(str(tmp_path / f"cohort_{index}.csv"))
+        data.to_csv(files[-1], index=False)
+
+    with registry.session_scope(str(tmp_path)), schema.schema_scope('user/label'):
+        aggregated = aggregate_patient_data(files, 'pid')
+        aggregate_patient_data(files, 'pid')
+
+    expected = pd.concat([pd.read_csv(path) for path in files], ignore_index=True).drop_duplicates(subset=['pid'])
+    assert aggregated['pid'].tolist() == expected['pid'].tolist()
+    assert aggregated['sex'].astype(str).tolist() == expected['sex'].tolist()
+    assert isinstance(aggregated['sex'].dtype, pd.CategoricalDtype) and aggregated['age'].dtype == np.int8
+    assert capsys.readouterr().out.count('from the dataset registry') == len(files)
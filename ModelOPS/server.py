@@ -1,18 +1,34 @@
+import json
+import time
 import asyncio
 import os.path
-import shutil
 import tempfile
-from fastapi import FastAPI, HTTPException
-from packages.processing import random_forest
+import mimetypes
+import numpy as np
+import pandas as pd
+from pydantic import ValidationError
+from fastapi import FastAPI, HTTPException, Request, Response
+from packages.data_access import session
 from packages.minio_file_handler import client
-from packages.statistical_analysis import statistical_analysis
-from packages.preprocessing.preprocess_data import preprocess_files
+from packages.job_handler import manager, tasks
+from packages.artifact_handler import artifacts
+from packages.prediction_handler import batcher, predictor
+from packages.helpers.PredictRequestModel import PredictRequest
 from packages.helpers.TrainModelRequestModel import TrainModelRequest
 from packages.helpers.FileDownloadRequestModel import FileDownloadRequest
 from packages.helpers.FileCleaningRequestModel import FileCleaningRequest
 
 app = FastAPI()
 minio_client = client.MinioClient()
+job_manager = manager.JobManager()
+prediction_batcher = batcher.MicroBatcher(predictor.predict_probabilities)
+prediction_latency = batcher.LatencyTracker()
+
+
+@app.on_event("shutdown")
+def shutdown_job_manager():
+    job_manager.shutdown()
+    prediction_batcher.shutdown()
 
 
 @app.post("/download_files")
@@ -21,78 +37,149 @@ async def download_files(request: FileDownloadRequest):
 
     try:
         output_path = os.path.join(temporary_directory, 'data')
-
-        await asyncio.get_event_loop().run_in_executor(
-            None,
-            minio_client.get_files_by_user_label,
-            request.bucket_name, request.user_id, request.label, output_path
-        )
-
-        return {"message": "Files retrieved successfully.", "file_path": temporary_directory}
+        session.write_session_info(temporary_directory, request.bucket_name, request.user_id, request.label, request.stream)
+
+        download_summary = None
+        if not request.stream:
+            download_summary = await asyncio.get_event_loop().run_in_executor(
+                None,
+                minio_client.get_files_by_user_label,
+                request.bucket_name, request.user_id, request.label, output_path, request.max_workers
+            )
+
+        return {"message": "Files retrieved successfully.",
+                "file_path": temporary_directory,
+                "download_summary": download_summary}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/clean_files")
 async def clean_files(request: FileCleaningRequest):
-    try:
-        if not os.path.exists(request.input_path):
-            raise HTTPException(status_code=404, detail="Input path not found")
-
-        input_path = os.path.join(request.input_path, 'data')
-        output_path = os.path.join(request.input_path, 'cleaned')
-
-        preprocess_files(input_path,
-                         output_path,
-                         request.patient_identifier,
-                         request.encoding_method,
-                         request.scale_method,
-                         request.row_threshold,
-                         request.column_threshold,
-                         request.excluded_columns)
-        return {"message": "Files cleaned successfully", "cleaned_files_path": request.input_path}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not os.path.exists(request.input_path):
+        raise HTTPException(status_code=404, detail="Input path not found")
+
+    job_id = job_manager.submit('clean_files', tasks.run_cleaning_job, request, session_key=request.input_path)
+    return {"message": "File cleaning queued.", "job_id": job_id}
 
 
 @app.post("/train_model")
 async def train_model(request: TrainModelRequest):
-    temporary_directory = tempfile.mkdtemp()
-    minio_client.get_files_by_user_label(request.bucket_name, request.user_id, request.label, temporary_directory)
+    if not os.path.exists(request.input_path):
+        raise HTTPException(status_code=404, detail="Input path not found")
 
-    try:
-        if request.excluded_columns is None:
-            request.excluded_columns = []
+    job_id = job_manager.submit('train_model', tasks.run_training_job, request, session_key=request.input_path)
+    return {"message": "Model training queued.", "job_id": job_id}
+
+
+async def read_artifact_manifest(bucket_name: str, user_id: str, label: str):
+    manifest_object = f"{user_id}/{label}/{artifacts.ARTIFACT_DIRECTORY}/{artifacts.MANIFEST_FILE_NAME}"
+    content = await asyncio.get_event_loop().run_in_executor(None, minio_client.get_object_content, bucket_name,
+                                                             manifest_object)
+    return None if content is None else json.loads(content)
 
-        if request.patient_identifier not in request.excluded_columns:
-            request.excluded_columns.append(request.patient_identifier)
 
-        default_directory = os.path.join(request.input_path, 'data')
-        cleaned_directory = os.path.join(request.input_path, 'cleaned')
+@app.get("/artifacts/{bucket_name}/{user_id}/{label}")
+async def list_artifacts(bucket_name: str, user_id: str, label: str):
+    manifest = await read_artifact_manifest(bucket_name, user_id, label)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="No artifacts found")
 
-        if os.path.exists(cleaned_directory):
-            input_path = cleaned_directory
+    return {"artifacts": sorted(manifest)}
+
+
+@app.get("/artifacts/{bucket_name}/{user_id}/{label}/{artifact_name:path}")
+async def get_artifact(bucket_name: str, user_id: str, label: str, artifact_name: str):
+    # Only registered artifacts and rendered figures are served, never the saved data or other training outputs
+    if not artifacts.is_served(artifact_name, await read_artifact_manifest(bucket_name, user_id, label)):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+
+    object_name = f"{user_id}/{label}/{artifact_name}"
+    loop = asyncio.get_event_loop()
+
+    content = await loop.run_in_executor(None, minio_client.get_object_content, bucket_name, object_name)
+    if content is None:
+        job_id = job_manager.submit('render_artifact', tasks.run_artifact_job, bucket_name, user_id, label,
+                                    artifact_name)
+        try:
+            result = await asyncio.wrap_future(job_manager.get_future(job_id))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if result is None:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+
+        content = await loop.run_in_executor(None, minio_client.get_object_content, bucket_name, object_name)
+
+    if content is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    media_type = mimetypes.guess_type(artifact_name)[0] or 'application/octet-stream'
+    return Response(content=content, media_type=media_type)
+
+
+@app.post("/predict")
+async def predict(request: Request):
+    start = time.perf_counter()
+    loop = asyncio.get_event_loop()
+
+    try:
+        if request.headers.get('content-type', '').startswith(predictor.ARROW_STREAM_MEDIA_TYPE):
+            prediction_request = PredictRequest(**request.query_params)
+            rows = predictor.read_arrow_rows(await request.body())
         else:
-            input_path = default_directory
-
-        random_forest.run(input_path,
-                          default_directory,
-                          temporary_directory,
-                          request.target_column,
-                          request.max_depth,
-                          request.random_state,
-                          request.chunk_size,
-                          request.excluded_columns)
-
-        statistical_analysis.analyze(default_directory,
-                                     temporary_directory,
-                                     request.target_column,
-                                     request.patient_identifier)
-        minio_client.upload_directory(request.bucket_name, request.user_id, request.label, temporary_directory)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        shutil.rmtree(request.input_path)
+            prediction_request = PredictRequest(**await request.json())
+            rows = pd.DataFrame.from_records(prediction_request.rows)
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    key = (prediction_request.user_id, prediction_request.label, prediction_request.engine)
+    loaded = await loop.run_in_executor(None, predictor.load_model, key)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    model, features, _ = loaded
+
+    response = {"classes": model.classes_.tolist(), "predictions": [], "probabilities": []}
+    if len(rows):
+        probabilities = await prediction_batcher.submit(key, rows)
+        class_positions = np.argmax(probabilities, axis=1)
+        response["predictions"] = model.classes_[class_positions].tolist()
+        response["probabilities"] = probabilities.tolist()
+
+        if prediction_request.explain:
+            contributions = await loop.run_in_executor(prediction_batcher.executor, predictor.explain_rows, key, rows,
+                                                       class_positions)
+            response["features"] = features
+            response["shap_values"] = contributions.tolist()
+
+    prediction_latency.record(time.perf_counter() - start, len(rows))
+    response["latency"] = prediction_latency.summary()
+    return response
+
+
+@app.get("/predict/latency")
+async def get_prediction_latency():
+    return prediction_latency.summary()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    status = job_manager.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return status
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    result = job_manager.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if result['status'] == 'failed':
+        raise HTTPException(status_code=500, detail=result['error'])
+    if result['status'] != 'completed':
+        raise HTTPException(status_code=409, detail=f"Job is {result['status']}")
+
+    return result['result']
 
 if __name__ == "__main__":
     import uvicorn